@@ -0,0 +1,210 @@
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from app.config import (
+	ADMISSION_ENABLED,
+	ADMISSION_USER_RPS,
+	ADMISSION_USER_BURST,
+	ADMISSION_ROUTE_LIMITS,
+	ADMISSION_MAX_CONCURRENCY,
+	ADMISSION_MAX_QUEUE,
+	ADMISSION_QUEUE_TIMEOUT_MS,
+	ADMISSION_MAX_KEYS,
+)
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED_TEXT = "Você enviou muitas mensagens em sequência. Aguarde alguns segundos e tente novamente."
+OVERLOADED_TEXT = "Estamos com muitas solicitações no momento. Tente novamente em alguns segundos."
+
+
+class Overloaded(Exception):
+	"""The global concurrency cap and its wait queue are full (or the wait timed out)."""
+
+
+class _Bucket:
+	__slots__ = ("tokens", "stamp")
+
+	def __init__(self, tokens: float, stamp: float) -> None:
+		self.tokens = tokens
+		self.stamp = stamp
+
+
+class RateLimiter:
+	"""Token buckets keyed by string with O(1) updates and an LRU bound on keys.
+
+	Buckets refill lazily on access (no timers). A key evicted by the LRU bound
+	comes back with a full bucket, so ``max_keys`` should exceed the number of
+	users active within ``burst / rate`` seconds. ``rate <= 0`` disables limiting.
+	"""
+
+	def __init__(self, rate: float, burst: float, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic) -> None:
+		self.rate = rate
+		self.burst = max(burst, 1.0)
+		self.max_keys = max_keys
+		self._clock = clock
+		self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+
+	def __len__(self) -> int:
+		return len(self._buckets)
+
+	def _bucket(self, key: str, now: float) -> _Bucket:
+		bucket = self._buckets.get(key)
+		if bucket is None:
+			bucket = self._buckets[key] = _Bucket(self.burst, now)
+			if len(self._buckets) > self.max_keys:
+				self._buckets.popitem(last=False)
+		else:
+			self._buckets.move_to_end(key)
+			tokens = bucket.tokens + (now - bucket.stamp) * self.rate
+			bucket.tokens = tokens if tokens < self.burst else self.burst
+			bucket.stamp = now
+		return bucket
+
+	def allow(self, key: str, cost: float = 1.0) -> bool:
+		if self.rate <= 0:
+			return True
+		bucket = self._bucket(key, self._clock())
+		if bucket.tokens >= cost:
+			bucket.tokens -= cost
+			return True
+		return False
+
+	def retry_after(self, key: str, cost: float = 1.0) -> float:
+		"""Seconds until ``key`` could spend ``cost`` tokens."""
+		if self.rate <= 0:
+			return 0.0
+		bucket = self._bucket(key, self._clock())
+		return max(0.0, (cost - bucket.tokens) / self.rate)
+
+
+class ConcurrencyGate:
+	"""Caps in-flight requests; extra ones wait FIFO in a bounded queue, then get shed.
+
+	A released slot is handed directly to the oldest live waiter, so ``active``
+	never exceeds ``limit``. ``limit <= 0`` disables the cap.
+	"""
+
+	def __init__(self, limit: int, max_queue: int = 0, queue_timeout_s: float = 1.0) -> None:
+		self.limit = limit
+		self.max_queue = max_queue
+		self.queue_timeout_s = queue_timeout_s
+		self.active = 0
+		self.waiting = 0
+		self._waiters: Deque["asyncio.Future[None]"] = deque()
+
+	async def acquire(self) -> None:
+		if self.limit <= 0 or (self.active < self.limit and not self.waiting):
+			self.active += 1
+			return
+		if self.waiting >= self.max_queue:
+			raise Overloaded()
+		fut: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+		self._waiters.append(fut)
+		self.waiting += 1
+		started = time.perf_counter()
+		try:
+			await asyncio.wait_for(fut, timeout=self.queue_timeout_s)
+		except asyncio.TimeoutError:
+			# The cancelled future stays queued; release() skips it
+			raise Overloaded()
+		except asyncio.CancelledError:
+			if fut.done() and not fut.cancelled():
+				# A slot was handed over just as we were cancelled: pass it on
+				self.release()
+			raise
+		finally:
+			self.waiting -= 1
+			metrics.observe("admission.queue_wait_ms", (time.perf_counter() - started) * 1000.0)
+
+	def release(self) -> None:
+		while self._waiters:
+			fut = self._waiters.popleft()
+			if not fut.done():
+				fut.set_result(None)
+				return
+		self.active -= 1
+
+	@asynccontextmanager
+	async def slot(self) -> AsyncIterator[None]:
+		await self.acquire()
+		try:
+			yield
+		finally:
+			self.release()
+
+
+class AdmissionController:
+	"""Per-user and per-(user, route) token buckets plus the global concurrency gate."""
+
+	def __init__(
+		self,
+		enabled: bool = True,
+		user_rps: float = 0.0,
+		user_burst: float = 1.0,
+		route_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+		max_concurrency: int = 0,
+		max_queue: int = 0,
+		queue_timeout_ms: float = 1000.0,
+		max_keys: int = 100_000,
+	) -> None:
+		self.enabled = enabled
+		self.users = RateLimiter(user_rps, user_burst, max_keys)
+		self.routes: Dict[str, RateLimiter] = {
+			route: RateLimiter(rate, burst, max_keys) for route, (rate, burst) in (route_limits or {}).items()
+		}
+		self.gate = ConcurrencyGate(max_concurrency, max_queue, queue_timeout_ms / 1000.0)
+
+	def check_user(self, user_id: str) -> float:
+		"""0.0 if the request is admitted, else the suggested Retry-After in seconds."""
+		if not self.enabled or self.users.allow(user_id):
+			return 0.0
+		metrics.incr("admission.rate_limited.user")
+		return self.users.retry_after(user_id)
+
+	def allow_route(self, user_id: str, route: str) -> bool:
+		limiter = self.routes.get(route)
+		if not self.enabled or limiter is None or limiter.allow(user_id):
+			return True
+		metrics.incr(f"admission.rate_limited.{route}")
+		return False
+
+	@asynccontextmanager
+	async def slot(self) -> AsyncIterator[None]:
+		"""Hold a global concurrency slot; raises Overloaded when shedding."""
+		if not self.enabled:
+			yield
+			return
+		try:
+			await self.gate.acquire()
+		except Overloaded:
+			metrics.incr("admission.shed")
+			raise
+		try:
+			yield
+		finally:
+			self.gate.release()
+
+
+_default: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+	global _default
+	if _default is None:
+		_default = AdmissionController(
+			ADMISSION_ENABLED,
+			ADMISSION_USER_RPS,
+			ADMISSION_USER_BURST,
+			ADMISSION_ROUTE_LIMITS,
+			ADMISSION_MAX_CONCURRENCY,
+			ADMISSION_MAX_QUEUE,
+			ADMISSION_QUEUE_TIMEOUT_MS,
+			ADMISSION_MAX_KEYS,
+		)
+	return _default
@@ -1,12 +1,10 @@
 import os
-import json
-import uuid
-import datetime as dt
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional
 import logging
 
 from app.config import DATA_DIR
 from app.agents.base import Agent
+from app.tickets import TicketStore, current_idempotency_key, get_ticket_store
 
 logger = logging.getLogger(__name__)
 
@@ -14,19 +12,14 @@ logger = logging.getLogger(__name__)
 TICKETS_FILEPATH = os.path.join(DATA_DIR, "tickets.jsonl")
 
 
-def create_support_ticket(user_id: str, message: str, route_hint: str) -> Dict[str, str]:
-	os.makedirs(DATA_DIR, exist_ok=True)
-	ticket_id = f"T-{uuid.uuid4().hex[:8].upper()}"
-	record = {
-		"ticket_id": ticket_id,
-		"user_id": user_id,
-		"message": message,
-		"route_hint": route_hint,
-		"created_at": dt.datetime.utcnow().isoformat() + "Z",
-	}
-	with open(TICKETS_FILEPATH, "a", encoding="utf-8") as f:
-		f.write(json.dumps(record, ensure_ascii=False) + "\n")
-	return record
+def ticket_store() -> TicketStore:
+	return get_ticket_store(TICKETS_FILEPATH)
+
+
+def create_support_ticket(user_id: str, message: str, route_hint: str, idempotency_key: Optional[str] = None) -> Dict[str, str]:
+	"""Append a ticket to the indexed store; retries with the request's Idempotency-Key reuse the ticket."""
+	key = idempotency_key or current_idempotency_key()
+	return ticket_store().create(user_id, message, route_hint, idempotency_key=key)
 
 
 class HumanHandoffAgent(Agent):
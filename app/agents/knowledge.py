@@ -1,18 +1,22 @@
-from typing import List, Tuple
+from functools import lru_cache
+from typing import FrozenSet, List, Sequence, Tuple
 import logging
 import os
 import glob
 import re
 
-from rank_bm25 import BM25Okapi
-from bs4 import BeautifulSoup
-import requests
-
-from app.config import KNOWLEDGE_DIR, RAG_USE_WEB, INFINITEPAY_URLS
+from app.config import KNOWLEDGE_DIR, RAG_USE_WEB, INFINITEPAY_URLS, BM25_SNAPSHOT_PATH, KNOWLEDGE_SHARDS, KNOWLEDGE_SHARD_MODE
 from app.agents.base import Agent
+from app.analysis import analyze, analyze_query
+from app.executor import ExecutorTimeout, get_executor, register, unregister
+from app.memory import current_turn
+from app.tools.html_extract import decode_html, visible_text
 
 logger = logging.getLogger(__name__)
 
+# Documents whose analyzed lines `_analyzed_lines` keeps
+LINE_TERMS_CACHE_DOCS = 1024
+
 
 def _simple_clean(text: str) -> str:
 	# Normalize whitespace but preserve single line breaks to keep sentence/line boundaries
@@ -26,22 +30,80 @@ def _simple_clean(text: str) -> str:
 	return text.strip()
 
 
-def _tokenize(text: str) -> List[str]:
-	# Simple alphanumeric tokenizer for better BM25 behavior across languages
-	return [t for t in re.split(r"\W+", text.lower()) if t]
+@lru_cache(maxsize=LINE_TERMS_CACHE_DOCS)
+def _analyzed_lines(doc: str) -> Tuple[Tuple[str, FrozenSet[str]], ...]:
+	"""Non-empty stripped lines of ``doc`` with their analyzed terms.
+
+	The corpus is fixed, so the analyzer (folding, stemming, synonyms) runs once
+	per document rather than on every line of every match on every request.
+	"""
+	out = []
+	for raw in doc.splitlines():
+		line = raw.strip()
+		if line:
+			out.append((line, frozenset(analyze(line))))
+	return tuple(out)
+
+
+def load_knowledge_docs(knowledge_dir: str = KNOWLEDGE_DIR, clean: bool = True) -> List[str]:
+	"""Whitespace-normalized knowledge files; ``clean`` also strips boilerplate and near-duplicates."""
+	if not os.path.isdir(knowledge_dir):
+		return []
+	paths = sorted(glob.glob(os.path.join(knowledge_dir, "*.txt")))
+	docs: List[str] = []
+	for p in paths:
+		try:
+			with open(p, "r", encoding="utf-8") as f:
+				docs.append(_simple_clean(f.read()))
+		except Exception:
+			continue
+	if not clean:
+		return docs
+	# Deferred like app.bm25: cleaning pulls in numpy
+	from app.dedup import clean_documents
+
+	return clean_documents(docs)
+
+
+_BUSINESS_TERMS = "infinitepay maquininha pix débito crédito taxa fee 12x"
 
 
 class BM25RAG:
-	def __init__(self, documents: List[str]) -> None:
-		self.documents = documents
-		self.tokenized_corpus = [_tokenize(doc) for doc in documents]
-		self.bm25 = BM25Okapi(self.tokenized_corpus)
+	def __init__(self, documents: Sequence[str], index=None) -> None:
+		# Deferred: app.bm25 and app.corpus pull in numpy
+		from app.bm25 import BM25Index
+		from app.corpus import CorpusStore
+
+		# One UTF-8 buffer with document/line/chunk offsets instead of a str per document
+		self.documents = documents if isinstance(documents, CorpusStore) else CorpusStore.from_documents(documents)
+		self.bm25 = index if index is not None else BM25Index.from_corpus([analyze(doc) for doc in documents])
+
+	@classmethod
+	def from_snapshot(cls, path: str, knowledge_dir: str = KNOWLEDGE_DIR) -> "BM25RAG | None":
+		"""Memory-mapped index from ``python -m app.bm25 build``; None if missing or stale."""
+		from app.bm25 import knowledge_paths, load_snapshot, source_fingerprint
+
+		paths = knowledge_paths(knowledge_dir)
+		if not paths:
+			return None
+		loaded = load_snapshot(path, source_fingerprint(paths))
+		if loaded is None:
+			return None
+		documents, index = loaded
+		return cls(documents, index)
+
+	def search_ids(self, query: str, k: int = 5) -> List[int]:
+		from app.bm25 import top_k
+
+		tokens = list(analyze_query(query))
+		return top_k(self.bm25.get_scores(tokens), k).tolist()
 
 	def search(self, query: str, k: int = 5) -> List[str]:
-		tokens = _tokenize(query)
-		scores = self.bm25.get_scores(tokens)
-		indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-		return [self.documents[i] for i in indices]
+		return [self.documents[i] for i in self.search_ids(query, k)]
+
+	def search_chunks(self, query: str, k: int = 5) -> List[List[str]]:
+		"""Top ``k`` documents as their precomputed chunks (see `app.context_packer.split_chunks`)."""
+		return [self.documents.chunks(i) for i in self.search_ids(query, k)]
 
 
 class KnowledgeAgent(Agent):
@@ -51,45 +113,99 @@ class KnowledgeAgent(Agent):
 	configured. Applies heuristics to extract concise, actionable summaries.
 	"""
 	def __init__(self) -> None:
-		docs = self._load_local_knowledge()
-		# Avoid unnecessary network calls if local knowledge is present
-		if RAG_USE_WEB and not docs:
-			web_docs = self._fetch_web_pages()
-			docs.extend(web_docs)
-		self.rag = BM25RAG(docs)
+		if KNOWLEDGE_SHARDS > 1:
+			# Deferred: shards are only used for corpora too large for one index
+			from app.sharding import ShardedRAG
+
+			self.rag = ShardedRAG.from_snapshots(BM25_SNAPSHOT_PATH, KNOWLEDGE_SHARDS, KNOWLEDGE_SHARD_MODE) if BM25_SNAPSHOT_PATH else None
+			if self.rag is None:
+				self.rag = ShardedRAG.from_documents(self._load_documents(), KNOWLEDGE_SHARDS, KNOWLEDGE_SHARD_MODE)
+		else:
+			self.rag = BM25RAG.from_snapshot(BM25_SNAPSHOT_PATH) if BM25_SNAPSHOT_PATH else None
+			if self.rag is None:
+				self.rag = BM25RAG(self._load_documents())
+		self.executor = get_executor()
+		self._target = register(f"knowledge:{id(self)}", self)
+
+	def close(self) -> None:
+		unregister(self._target)
 
 	def retrieve(self, query: str, k: int = 5) -> List[str]:
 		return self.rag.search(query, k=k)
 
-	def _load_local_knowledge(self) -> List[str]:
-		if not os.path.isdir(KNOWLEDGE_DIR):
+	async def aretrieve(self, query: str, k: int = 5) -> List[str]:
+		"""`retrieve` through the CPU executor; returns [] on timeout."""
+		try:
+			return await self.executor.call(self._target, "retrieve", query, k)
+		except ExecutorTimeout:
 			return []
-		paths = sorted(glob.glob(os.path.join(KNOWLEDGE_DIR, "*.txt")))
-		docs: List[str] = []
-		for p in paths:
-			try:
-				with open(p, "r", encoding="utf-8") as f:
-					docs.append(_simple_clean(f.read()))
-			except Exception:
-				continue
+
+	def retrieve_chunks(self, query: str, k: int = 5) -> List[List[str]]:
+		return self.rag.search_chunks(query, k=k)
+
+	async def aretrieve_chunks(self, query: str, k: int = 5) -> List[List[str]]:
+		"""`retrieve_chunks` through the CPU executor; returns [] on timeout."""
+		try:
+			return await self.executor.call(self._target, "retrieve_chunks", query, k)
+		except ExecutorTimeout:
+			return []
+
+	def _load_local_knowledge(self) -> List[str]:
+		return load_knowledge_docs(KNOWLEDGE_DIR)
+
+	def _load_documents(self) -> List[str]:
+		docs = self._load_local_knowledge()
+		# Avoid unnecessary network calls if local knowledge is present
+		if RAG_USE_WEB and not docs:
+			web_docs = self._fetch_web_pages()
+			from app.dedup import clean_documents
+
+			docs.extend(clean_documents(web_docs))
 		return docs
 
 	def _fetch_web_pages(self) -> List[str]:
+		import requests
+
 		docs: List[str] = []
 		for url in INFINITEPAY_URLS:
 			try:
 				r = requests.get(url, timeout=10)
 				r.raise_for_status()
-				# Use raw bytes so BeautifulSoup can detect the correct charset
-				soup = BeautifulSoup(r.content, "html.parser")
-				text = _simple_clean(soup.get_text(separator=" "))
+				# Decode from raw bytes so a missing header charset falls back to <meta charset>
+				html = decode_html(r.content, r.headers.get("content-type", ""))
+				text = _simple_clean(visible_text(html))
 				docs.append(text)
 			except Exception:
 				continue
 		return docs
 
 	async def handle(self, message: str, user_id: str) -> Tuple[str, str]:
-		matches = self.rag.search(message, k=5)
+		# A follow-up re-reads the documents the previous turn answered from
+		turn = current_turn()
+		prior = turn.followup_of.doc_ids if turn.followup_of is not None else ()
+		# Terms are looked up in the router's typo-corrected query
+		query = turn.query or message
+		try:
+			route, answer, doc_ids = await self.executor.call(self._target, "answer_turn", query, prior)
+		except ExecutorTimeout:
+			logger.debug("KnowledgeAgent fallback: executor timeout")
+			return ("knowledge:fallback", "Desculpe, não consegui consultar os materiais a tempo. Pode tentar novamente?")
+		turn.doc_ids = tuple(doc_ids)
+		return (route, answer)
+
+	def answer(self, message: str) -> Tuple[str, str]:
+		"""Synchronous retrieval + summarization; runs wherever the executor puts it."""
+		route, answer, _ = self.answer_turn(message)
+		return (route, answer)
+
+	def answer_turn(self, message: str, doc_ids: Sequence[int] = ()) -> Tuple[str, str, List[int]]:
+		"""`answer` plus the ids of the documents used; given ``doc_ids`` skips retrieval."""
+		ids = [i for i in doc_ids if 0 <= i < len(self.rag.documents)] or self.rag.search_ids(message, k=5)
+		# Only the matched documents are decoded from the corpus buffer
+		route, answer = self._answer_from(message, [self.rag.documents[i] for i in ids])
+		return (route, answer, ids)
+
+	def _answer_from(self, message: str, matches: List[str]) -> Tuple[str, str]:
 		if not matches:
 			logger.debug("KnowledgeAgent fallback: no retrieval matches found")
 			return ("knowledge", "Desculpe, não encontrei informações relevantes nos materiais disponíveis.")
@@ -281,34 +397,18 @@ class KnowledgeAgent(Agent):
 		return ""
 
 	def _extract_snippets(self, query: str, docs: List[str], max_chars_total: int = 800) -> str:
-		keywords = set([w for w in re.split(r"\W+", query.lower()) if w])
-		# English→Portuguese mapping to improve recall
-		mapping = {
-			"fees": ["taxa", "taxas", "tarifa", "tarifas"],
-			"rates": ["taxa", "taxas"],
-			"debit": ["débito", "debito"],
-			"credit": ["crédito", "credito"],
-			"price": ["preço", "preco", "custa"],
-			"cost": ["preço", "preco", "custa"],
-			"card": ["cartão", "cartao"],
-			"phone": ["celular"],
-			"machine": ["maquininha"],
-		}
-		for k, vals in mapping.items():
-			if k in keywords:
-				keywords.update(vals)
+		# Query terms are analyzed into synonym/translation classes (see app.analysis),
+		# so "fees"/"taxas"/"tarifa" or "credit"/"crédito" match the same lines
+		keywords = set(analyze_query(query))
 		# Augment with common business terms to increase recall
-		keywords.update(["infinitepay", "maquininha", "pix", "débito", "debito", "crédito", "credito", "taxa", "taxas", "fee", "fees", "12x"])  # noqa: E501
+		keywords.update(analyze_query(_BUSINESS_TERMS))
 		selected: List[str] = []
 		seen = set()
 		total = 0
 		for doc in docs:
-			for raw in doc.splitlines():
-				line = raw.strip()
+			for line, terms in _analyzed_lines(doc):
 				low = line.lower()
-				if not line:
-					continue
-				if any(k in low for k in keywords):
+				if not keywords.isdisjoint(terms):
 					# Skip extremely long lines
 					if len(line) > 280:
 						line = line[:280].rstrip() + "..."
@@ -1,15 +1,14 @@
-from typing import Tuple, List
+from typing import Awaitable, List, Optional, Tuple
 import logging
-import os
-
-try:
-    from openai import OpenAI  # type: ignore
-except Exception:  # pragma: no cover
-    OpenAI = None  # type: ignore
 
 from app.agents.base import Agent
 from app.agents.knowledge import KnowledgeAgent
-from app.config import LLM_MODEL, LLM_MAX_TOKENS, LLM_TEMPERATURE
+from app.config import LLM_MODEL, LLM_MAX_TOKENS, LLM_TEMPERATURE, LLM_CONTEXT_TOKENS, LLM_INPUT_COST_PER_1K
+from app.context_packer import PackedContext, count_tokens, pack_context
+from app.metrics import metrics
+from app.deadline import current_deadline
+from app.memory import current_turn
+from app.llm_backends import InflightCoalescer, LLMBackend, create_backend
 from app.prompts import build_system_prompt, build_user_prompt
 
 
@@ -17,56 +16,71 @@ logger = logging.getLogger(__name__)
 
 
 class LLMAgent(Agent):
-    """Agent that composes RAG context and queries an external LLM service.
+    """Agent that composes RAG context and queries an LLM backend.
 
-    Falls back to `KnowledgeAgent` when the LLM client is unavailable or on
-    runtime errors. Designed to keep responses grounded by passing retrieved
+    The backend is pluggable (remote OpenAI or an offline local model, see
+    `app.llm_backends`). Falls back to `KnowledgeAgent` when no backend is
+    available or on runtime errors. Designed to keep responses grounded by passing retrieved
     context and instructing citations/refusals via prompt templates.
     """
-    def __init__(self) -> None:
-        self.knowledge = KnowledgeAgent()
-        self.client = None
-        if OpenAI is not None and os.environ.get("OPENAI_API_KEY"):
-            try:
-                self.client = OpenAI()
-            except Exception:  # pragma: no cover
-                logger.debug("LLMAgent could not initialize OpenAI client; running in fallback mode")
-                self.client = None
+    def __init__(self, backend: Optional[LLMBackend] = None, knowledge: Optional[KnowledgeAgent] = None) -> None:
+        # Share the router's KnowledgeAgent instead of building a second BM25 index
+        self.knowledge = knowledge if knowledge is not None else KnowledgeAgent()
+        self.backend = backend if backend is not None else create_backend()
+        self.context_tokens = LLM_CONTEXT_TOKENS
+        # Precompiled once: the system prompt is the cacheable prefix of every call
+        self.system_prompt = build_system_prompt()
+        self._system_tokens = count_tokens(self.system_prompt, LLM_MODEL)
+        self.coalescer = InflightCoalescer()
+
+    def _log_prompt_stats(self, user_prompt: str, packed: PackedContext) -> None:
+        prompt_tokens = self._system_tokens + count_tokens(user_prompt, LLM_MODEL)
+        cost = prompt_tokens / 1000.0 * LLM_INPUT_COST_PER_1K
+        metrics.observe("llm.prompt_tokens", prompt_tokens)
+        metrics.observe("llm.cached_prefix_ratio", self._system_tokens / prompt_tokens)
+        metrics.observe("llm.context_tokens", packed.tokens)
+        metrics.observe("llm.prompt_cost_usd", cost)
+        logger.info(
+            "LLMAgent prompt: %d tokens (context %d/%d from %d chunks, %d duplicates dropped), est. $%.6f",
+            prompt_tokens, packed.tokens, packed.budget, packed.candidates, packed.duplicates_dropped, cost,
+        )
 
     async def handle(self, message: str, user_id: str) -> Tuple[str, str]:
         """Return (route, answer) using LLM with RAG context or safe fallback."""
-        # Retrieve top-k chunks as context
-        chunks: List[str] = self.knowledge.retrieve(message, k=5)
-        # Truncate context to a safe character budget to avoid overly long prompts
-        budget = 4000
-        trimmed: List[str] = []
-        total = 0
-        for ch in chunks:
-            if total + len(ch) > budget:
-                break
-            trimmed.append(ch)
-            total += len(ch)
-        system_prompt = build_system_prompt()
+        # Retrieval and packing match the router's typo-corrected query; the
+        # prompt keeps the user's own words
+        query = current_turn().query or message
+        # Retrieve the top-k documents as their index-time chunks
+        docs: List[List[str]] = await self.knowledge.aretrieve_chunks(query, k=5)
+        # Pack the most relevant, de-duplicated sentences into a model-token budget
+        packed = pack_context(query, docs, budget_tokens=self.context_tokens, model=LLM_MODEL)
+        trimmed: List[str] = packed.chunks
         user_prompt = build_user_prompt(query=message, chunks=trimmed)
 
-        if self.client is None:
+        if self.backend is None:
             # Fallback: delegate to KnowledgeAgent to craft a concise answer
-            logger.debug("LLMAgent fallback: no client; delegating to KnowledgeAgent")
+            logger.debug("LLMAgent fallback: no backend; delegating to KnowledgeAgent")
             route, answer = await self.knowledge.handle(message, user_id)
             # Preserve that this came from LLM fallback for observability
             return ("llm:fallback", answer)
 
-        try:
-            chat = self.client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
+        backend = self.backend
+        timeout = current_deadline().timeout()
+
+        def send() -> Awaitable[str]:
+            # Prompt stats count completions actually sent, not coalesced waiters
+            self._log_prompt_stats(user_prompt, packed)
+            return backend.complete(
+                self.system_prompt,
+                user_prompt,
                 max_tokens=LLM_MAX_TOKENS,
                 temperature=LLM_TEMPERATURE,
+                timeout=timeout,
             )
-            answer = chat.choices[0].message.content or ""
+
+        try:
+            # Identical prompts in flight at the same time share one completion
+            answer = await self.coalescer.run((self.system_prompt, user_prompt), send)
             return ("llm", answer)
         except Exception:
             logger.exception("LLMAgent completion error; falling back to concatenated RAG context")
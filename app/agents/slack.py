@@ -4,10 +4,9 @@ import datetime as dt
 from typing import Tuple, Dict
 import logging
 
-import httpx
-
 from app.config import DATA_DIR
 from app.agents.base import Agent
+from app.deadline import current_deadline
 
 logger = logging.getLogger(__name__)
 
@@ -17,8 +16,10 @@ OUTBOX_FILEPATH = os.path.join(DATA_DIR, "slack_outbox.jsonl")
 
 def _send_webhook(text: str, webhook_url: str, timeout_seconds: float = 5.0) -> bool:
 	try:
-		if not webhook_url:
+		if not webhook_url or timeout_seconds <= 0:
 			return False
+		import httpx
+
 		with httpx.Client(timeout=timeout_seconds) as client:
 			resp = client.post(webhook_url, json={"text": text})
 			return 200 <= resp.status_code < 300
@@ -42,7 +43,7 @@ class SlackAgent(Agent):
 			"created_at": dt.datetime.utcnow().isoformat() + "Z",
 		}
 		text = f"[AgentSwarm] From {user_id}: {message}"
-		sent = _send_webhook(text, webhook_url)
+		sent = _send_webhook(text, webhook_url, timeout_seconds=current_deadline().timeout(5.0))
 		if not sent:
 			logger.debug("SlackAgent fallback: webhook missing or failed; writing to outbox")
 			_write_outbox(payload)
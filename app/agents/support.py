@@ -1,10 +1,19 @@
-from typing import Tuple, Dict, List
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
 import logging
 import random
+import time
 from app.agents.base import Agent
+from app.config import SUPPORT_BACKEND_LATENCY_MS, SUPPORT_TOOL_TIMEOUT_MS
+from app.deadline import current_deadline
+from app.memory import current_turn
+from app.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+UNAVAILABLE_TEXT = "Não consegui consultar sua conta agora. Pode tentar novamente em instantes?"
 
 _FAKE_DB: Dict[str, Dict[str, object]] = {}
 
@@ -31,75 +40,224 @@ def _ensure_user(user_id: str) -> Dict[str, object]:
 	return _FAKE_DB[user_id]
 
 
-def tool_account_status(user_id: str) -> str:
-	data = _ensure_user(user_id)
-	return f"Account status: {data['status']}, failed sign-ins: {data['failed_signins']}"
-
-
-def tool_reset_password(user_id: str) -> str:
-	_ensure_user(user_id)
-	return "Password reset link sent to your registered email."
+def _format_user_info(account: Dict[str, Any], limits: Dict[str, Any]) -> str:
+	return (
+		f"Usuário: {account['name']} ({account['email']}). "
+		f"Status: {account['status']}. "
+		f"Saldo: R${limits['account_balance']:.2f}. "
+		f"Limite de transferência: R${limits['available_transfer_limit']:.2f}/R${limits['daily_transfer_limit']:.2f}."
+	)
 
 
-def tool_recent_transactions(user_id: str, limit: int = 3) -> List[Dict[str, object]]:
-	data = _ensure_user(user_id)
-	return data["transactions"][:limit]
+def _format_transfer(transfers: List[Dict[str, Any]]) -> str:
+	if not transfers:
+		return "Nenhuma transferência encontrada para este usuário."
+	last = transfers[-1]
+	return f"Transferência {last['id']} de R${last['amount']:.2f}: {last['status']}."
 
 
 def get_user_info(user_id: str) -> str:
 	data = _ensure_user(user_id)
-	return (
-		f"Usuário: {data['name']} ({data['email']}). "
-		f"Status: {data['status']}. "
-		f"Saldo: R${data['account_balance']:.2f}. "
-		f"Limite de transferência: R${data['available_transfer_limit']:.2f}/R${data['daily_transfer_limit']:.2f}."
-	)
+	return _format_user_info(data, data)
 
 
 def check_transfer_status(user_id: str) -> str:
-	data = _ensure_user(user_id)
-	transfers = data.get("transfers", [])
-	if not transfers:
-		return "Nenhuma transferência encontrada para este usuário."
-	last = transfers[-1]
-	return f"Transferência {last['id']} de R${last['amount']:.2f}: {last['status']}."
+	return _format_transfer(_ensure_user(user_id).get("transfers", []))
+
+
+class SupportBackend:
+	"""Account backend behind the support tools; every method stands for one remote call.
+
+	This stub serves `_FAKE_DB`. ``latency_ms`` is slept on every call to
+	model a real service, and ``calls`` counts calls per method.
+	"""
+
+	def __init__(self, latency_ms: float = 0.0) -> None:
+		self.latency_ms = latency_ms
+		self.calls: Counter = Counter()
+
+	async def _fetch(self, call: str, user_id: str) -> Dict[str, object]:
+		self.calls[call] += 1
+		if self.latency_ms > 0:
+			await asyncio.sleep(self.latency_ms / 1000.0)
+		return _ensure_user(user_id)
+
+	async def account(self, user_id: str) -> Dict[str, Any]:
+		data = await self._fetch("account", user_id)
+		return {k: data[k] for k in ("name", "email", "status", "failed_signins")}
+
+	async def limits(self, user_id: str) -> Dict[str, Any]:
+		data = await self._fetch("limits", user_id)
+		return {k: data[k] for k in ("account_balance", "daily_transfer_limit", "available_transfer_limit")}
+
+	async def transfers(self, user_id: str) -> List[Dict[str, Any]]:
+		return list((await self._fetch("transfers", user_id)).get("transfers") or [])
+
+	async def transactions(self, user_id: str, limit: int = 3) -> List[Dict[str, Any]]:
+		return list((await self._fetch("transactions", user_id))["transactions"][:limit])
+
+	async def reset_password(self, user_id: str, email: str) -> str:
+		await self._fetch("reset_password", user_id)
+		return "Password reset link sent to your registered email."
+
+
+@dataclass(frozen=True)
+class Tool:
+	"""A backend call ``fn(backend, user_id, **dependency_results)``.
+
+	A tool starts once all of ``deps`` are done; if any of them failed it is
+	skipped and its result is None as well.
+	"""
+
+	name: str
+	fn: Callable[..., Awaitable[Any]]
+	deps: Tuple[str, ...] = ()
+	timeout_ms: Optional[float] = None
+
+
+class ToolSet:
+	"""Registry of tools; a tool's dependencies must be registered first, so there are no cycles."""
+
+	def __init__(self, tools: Iterable[Tool] = ()) -> None:
+		self.tools: Dict[str, Tool] = {}
+		for tool in tools:
+			self.register(tool)
+
+	def register(self, tool: Tool) -> None:
+		missing = [d for d in tool.deps if d not in self.tools]
+		if missing:
+			raise ValueError(f"tool {tool.name!r} depends on unregistered {missing}")
+		self.tools[tool.name] = tool
+
+	def run(self, backend: "SupportBackend", user_id: str, timeout_ms: float = 0.0) -> "ToolRun":
+		return ToolRun(self, backend, user_id, timeout_ms)
+
+
+class ToolRun:
+	"""Tool calls of one request: each tool runs at most once and independent tools overlap.
+
+	``get`` starts the requested tools and their dependencies as tasks and
+	returns their results in order; a tool asked for again (directly or as a
+	dependency) reuses its task. Each call is bounded by the tool's timeout
+	(else the run's) and the request deadline; a failed or timed-out tool
+	yields None. Leaving the ``async with`` block cancels what is still running.
+	"""
+
+	def __init__(self, toolset: ToolSet, backend: "SupportBackend", user_id: str, timeout_ms: float = 0.0) -> None:
+		self.toolset = toolset
+		self.backend = backend
+		self.user_id = user_id
+		self.timeout_ms = timeout_ms
+		self._tasks: Dict[str, "asyncio.Task[Any]"] = {}
+
+	async def __aenter__(self) -> "ToolRun":
+		return self
+
+	async def __aexit__(self, *exc) -> None:
+		for task in self._tasks.values():
+			task.cancel()
+
+	def _start(self, name: str) -> "asyncio.Task[Any]":
+		task = self._tasks.get(name)
+		if task is None:
+			tool = self.toolset.tools[name]
+			for dep in tool.deps:
+				self._start(dep)
+			task = self._tasks[name] = asyncio.ensure_future(self._call(tool))
+		return task
+
+	async def _call(self, tool: Tool) -> Any:
+		deps = {dep: await self._tasks[dep] for dep in tool.deps}
+		if any(v is None for v in deps.values()):
+			return None
+		budget_ms = tool.timeout_ms or self.timeout_ms
+		started = time.perf_counter()
+		try:
+			result = await asyncio.wait_for(
+				tool.fn(self.backend, self.user_id, **deps),
+				timeout=current_deadline().timeout(budget_ms / 1000.0 if budget_ms and budget_ms > 0 else None),
+			)
+		except asyncio.TimeoutError:
+			metrics.incr(f"support.tool_timeout.{tool.name}")
+			logger.warning("Support tool %s timed out", tool.name)
+			return None
+		except Exception:
+			metrics.incr(f"support.tool_error.{tool.name}")
+			logger.exception("Support tool %s failed", tool.name)
+			return None
+		metrics.observe(f"support.tool_ms.{tool.name}", (time.perf_counter() - started) * 1000.0)
+		return result
+
+	async def get(self, *names: str) -> Tuple[Any, ...]:
+		return tuple(await asyncio.gather(*(self._start(name) for name in names)))
+
+
+async def _reset_if_failed_signins(backend: SupportBackend, user_id: str, account: Dict[str, Any]) -> Optional[str]:
+	# Only users with recent failed sign-ins get a reset link
+	if not account["failed_signins"]:
+		return ""
+	return await backend.reset_password(user_id, account["email"])
+
+
+SUPPORT_TOOLS = ToolSet([
+	Tool("account", lambda backend, user_id: backend.account(user_id)),
+	Tool("limits", lambda backend, user_id: backend.limits(user_id)),
+	Tool("transfers", lambda backend, user_id: backend.transfers(user_id)),
+	Tool("transactions", lambda backend, user_id: backend.transactions(user_id)),
+	Tool("reset_password", _reset_if_failed_signins, deps=("account",)),
+])
 
 
 class CustomerSupportAgent(Agent):
-	"""Handles basic support intents using lightweight tools over a fake DB."""
+	"""Handles basic support intents with backend tools, run concurrently per message."""
+
+	def __init__(self, backend: Optional[SupportBackend] = None, tools: Optional[ToolSet] = None, tool_timeout_ms: float = SUPPORT_TOOL_TIMEOUT_MS) -> None:
+		self.backend = backend or SupportBackend(SUPPORT_BACKEND_LATENCY_MS)
+		self.tools = tools or SUPPORT_TOOLS
+		self.tool_timeout_ms = tool_timeout_ms
+
 	async def handle(self, message: str, user_id: str) -> Tuple[str, str]:
-		lower = message.lower()
+		async with self.tools.run(self.backend, user_id, self.tool_timeout_ms) as run:
+			# Keywords are matched in the router's typo-corrected query
+			return ("support", await self._answer((current_turn().query or message).lower(), run))
+
+	async def _answer(self, lower: str, run: ToolRun) -> str:
 		if "sign in" in lower or "login" in lower or "signin" in lower:
-			status = tool_account_status(user_id)
+			account, reset = await run.get("account", "reset_password")
+			if account is None:
+				return UNAVAILABLE_TEXT
+			status = f"Account status: {account['status']}, failed sign-ins: {account['failed_signins']}"
 			# If recent failures, proactively include reset + basic tips
-			if "failed" in status and "0" not in status:
-				reset = tool_reset_password(user_id)
-				return ("support", f"{status}. {reset}")
-			# Add concise guidance when no failures are recorded
-			return ("support", status)
+			return f"{status}. {reset}" if reset else status
 		# User profile/info intents
 		if any(k in lower for k in ["user info", "perfil", "cadastro", "meus dados", "dados da conta", "account info"]):
-			return ("support", get_user_info(user_id))
+			account, limits = await run.get("account", "limits")
+			if account is None or limits is None:
+				return UNAVAILABLE_TEXT
+			return _format_user_info(account, limits)
 		# Transfer status intents
 		if "transfer" in lower or "transferir" in lower or "status da transferência" in lower:
+			account, limits, transfers = await run.get("account", "limits", "transfers")
+			if transfers is None:
+				return UNAVAILABLE_TEXT
 			hint_parts: List[str] = []
-			# Provide simple diagnostics based on limits/status
-			data = _ensure_user(user_id)
-			if data.get("status") == "blocked":
+			# Provide simple diagnostics based on limits/status; either lookup may be missing
+			if account is not None and account.get("status") == "blocked":
 				hint_parts.append("Conta bloqueada: verifique documentação e suporte.")
-			avail = float(data.get("available_transfer_limit", 0.0))
-			if avail <= 0:
+			if limits is not None and float(limits.get("available_transfer_limit", 0.0)) <= 0:
 				hint_parts.append("Limite diário de transferência esgotado.")
-			base = check_transfer_status(user_id)
+			base = _format_transfer(transfers)
 			# If transfer is queued/processing, add general guidance
 			if any(s in base for s in ["queued", "processing"]):
 				hint_parts.append("Aguarde o processamento alguns minutos; se persistir, verifique limite diário e status da conta.")
 			if hint_parts:
 				base = f"{base} Dica: " + " ".join(hint_parts)
-			return ("support", base)
+			return base
 		if "transaction" in lower or "transactions" in lower or "extrato" in lower:
-			txs = tool_recent_transactions(user_id)
+			(txs,) = await run.get("transactions")
+			if txs is None:
+				return UNAVAILABLE_TEXT
 			items = ", ".join([f"{t['id']} R${t['amount']} {t['status']}" for t in txs])
-			return ("support", f"Últimas transações: {items}")
+			return f"Últimas transações: {items}"
 		logger.debug("CustomerSupportAgent fallback: no support intent matched; asking for details")
-		return ("support", "Posso ajudar com login, transfers, ou extrato. Pode detalhar?")
+		return "Posso ajudar com login, transfers, ou extrato. Pode detalhar?"
@@ -0,0 +1,200 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import re
+import sys
+import unicodedata
+
+from app.config import ANALYZER_QUERY_CACHE_SIZE, SYNONYMS_PATH
+
+
+# Bump whenever the analyzer output changes so persisted artifacts can detect staleness
+ANALYZER_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _build_fold_table() -> Dict[int, str]:
+	# Precompute accent folding for Latin-1 Supplement + Latin Extended-A/B once;
+	# str.translate is much cheaper than NFKD-normalizing every document
+	table: Dict[int, str] = {}
+	for cp in range(0x00C0, 0x0250):
+		ch = chr(cp)
+		base = "".join(c for c in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(c))
+		if base and base != ch:
+			table[cp] = base
+	return table
+
+
+_FOLD_TABLE = _build_fold_table()
+
+
+def fold_accents(text: str) -> str:
+	return text.translate(_FOLD_TABLE)
+
+
+# Accent-folded Portuguese stopwords plus the handful of English function words
+# that show up in bilingual queries
+STOPWORDS = frozenset(
+	"""
+	a ao aos as ate com como da das de dela dele do dos e ela ele em entre era essa esse esta este eu
+	foi ha isso isto ja la lhe mais mas me meu minha muito na nas nem no nos o os ou para pela pelas
+	pelo pelos por qual quais quando que quem se sem ser seu sua suas seus so tambem te tem ter um uma
+	umas uns voce voces vou
+	an and are at be by can do does for how i in is it me my of on or the this to what when where which
+	with you your
+	""".split()
+)
+
+# Plural suffixes (accent-folded) mapped to their singular replacement, longest first
+_PLURAL_RULES: Tuple[Tuple[str, str], ...] = (
+	("oes", "ao"),
+	("aes", "ao"),
+	("ais", "al"),
+	("eis", "el"),
+	("ois", "ol"),
+	("ns", "m"),
+	("res", "r"),
+	("zes", "z"),
+	("ses", "s"),
+)
+
+
+def _stem(word: str) -> str:
+	# Light stemmer in the spirit of Savoy's Portuguese stemmer: strip plurals,
+	# then drop the final gender/theme vowel. Words of <= 3 chars are kept verbatim
+	if len(word) <= 3 or word.isdigit():
+		return word
+	if word.endswith("s"):
+		for suffix, repl in _PLURAL_RULES:
+			if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+				word = word[: -len(suffix)] + repl
+				break
+		else:
+			if not word.endswith(("ss", "us", "is")):
+				word = word[:-1]
+	if len(word) > 4 and word[-1] in "aeo" and word[-2] not in "aeiou":
+		word = word[:-1]
+	return word
+
+
+# raw word -> interned term ("" for stopwords). Folding and stemming each distinct
+# word once and then doing a plain dict lookup is far cheaper than folding whole
+# documents; interning collapses the repeats of a term across postings into one object
+_TERM_CACHE: Dict[str, str] = {}
+_TERM_CACHE_MAX = 200_000
+
+
+def _analyze_word(word: str) -> str:
+	if len(_TERM_CACHE) >= _TERM_CACHE_MAX:
+		_TERM_CACHE.clear()
+	folded = fold_accents(word)
+	if folded in STOPWORDS:
+		term = ""
+	else:
+		stem = _stem(folded)
+		term = sys.intern(_SYNONYM_CLASSES.get(stem, stem))
+	_TERM_CACHE[word] = term
+	return term
+
+
+# Synonym / translation groups. Each group becomes one term-equivalence class:
+# every member analyzes to the class representative (the first member), so
+# expansion happens once when the analyzer runs instead of per query.
+DEFAULT_SYNONYMS: List[List[str]] = [
+	["taxa", "tarifa", "fee", "rate"],
+	["debito", "debit"],
+	["credito", "credit"],
+	["preco", "custo", "custa", "price", "cost"],
+	["cartao", "card"],
+	["celular", "phone", "smartphone"],
+	["maquininha", "machine"],
+	["transferencia", "transfer"],
+	["emprestimo", "loan"],
+	["conta", "account"],
+]
+
+_SYNONYM_CLASSES: Dict[str, str] = {}
+
+
+def compile_synonyms(groups: Iterable[Iterable[str]]) -> Dict[str, str]:
+	"""Compile synonym groups into a stem -> class representative map."""
+	classes: Dict[str, str] = {}
+	for group in groups:
+		stems = [_stem(fold_accents(w.lower())) for w in group if w.strip()]
+		if not stems:
+			continue
+		rep = sys.intern(stems[0])
+		for stem in stems:
+			classes.setdefault(stem, rep)
+	return classes
+
+
+def load_synonyms(path: str) -> List[List[str]]:
+	"""Read synonym groups from a JSON file: a list of lists or {term: [synonyms]}."""
+	with open(path, "r", encoding="utf-8") as f:
+		data = json.load(f)
+	if isinstance(data, dict):
+		return [[k, *v] for k, v in data.items()]
+	return [list(g) for g in data]
+
+
+def set_synonyms(groups: Optional[Iterable[Iterable[str]]]) -> None:
+	"""Install synonym groups; analyzers built afterwards see the new classes."""
+	global _SYNONYM_CLASSES
+	_SYNONYM_CLASSES = compile_synonyms(groups or [])
+	_TERM_CACHE.clear()
+	analyze_query.cache_clear()
+
+
+def analyzer_fingerprint() -> str:
+	"""Stable digest of analyzer version + synonym classes, for cache/index invalidation."""
+	payload = json.dumps([ANALYZER_VERSION, sorted(_SYNONYM_CLASSES.items())])
+	return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _words(text: str) -> List[str]:
+	if not unicodedata.is_normalized("NFC", text):
+		# Decomposed input (e.g. macOS keyboards) would split words on combining marks
+		text = unicodedata.normalize("NFC", text)
+	return _TOKEN_RE.findall(text.lower())
+
+
+def tokenize(text: str) -> List[str]:
+	"""Lowercase, accent-fold and split into word tokens (no stemming/stopwords)."""
+	return [fold_accents(w) for w in _words(text)]
+
+
+def analyze(text: str) -> List[str]:
+	"""Full analysis chain shared by indexing and querying."""
+	cache = _TERM_CACHE
+	terms: List[str] = []
+	for w in _words(text):
+		term = cache.get(w)
+		if term is None:
+			term = _analyze_word(w)
+		if term:
+			terms.append(term)
+	return terms
+
+
+@lru_cache(maxsize=ANALYZER_QUERY_CACHE_SIZE)
+def analyze_query(text: str) -> Tuple[str, ...]:
+	"""Cached analysis for queries; repeated user questions skip re-tokenizing."""
+	return tuple(analyze(text))
+
+
+def _initial_synonyms() -> List[List[str]]:
+	if SYNONYMS_PATH:
+		try:
+			return load_synonyms(SYNONYMS_PATH)
+		except Exception:
+			logger.exception("Could not load SYNONYMS_PATH=%s; using built-in synonyms", SYNONYMS_PATH)
+	return DEFAULT_SYNONYMS
+
+
+set_synonyms(_initial_synonyms())
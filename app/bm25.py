@@ -0,0 +1,340 @@
+"""NumPy BM25 index with a memory-mappable on-disk snapshot.
+
+Usage: python -m app.bm25 build [--knowledge-dir DIR] [--out PATH]
+       python -m app.bm25 info [PATH]
+
+Scores are identical to ``rank_bm25.BM25Okapi`` (same idf floor, same float
+operations) but postings live in CSR arrays, so an index can be written once
+and memory-mapped by every process instead of being re-cleaned, re-tokenized
+and rebuilt at each start.
+
+Snapshot layout (little-endian): ``MAGIC``, u32 format version, u32 header
+length, a JSON header (fingerprints, parameters, section table) and then
+8-byte aligned sections:
+
+- ``doc_offsets`` int64[n_docs + 1] / ``text`` utf-8: the cleaned documents,
+  with line and chunk offsets (``line_start``, ``line_end``, ``doc_lines``,
+  ``chunk_start``, ``chunk_end``, ``doc_chunks``; see app.corpus)
+- ``term_offsets`` int64[n_terms + 1] / ``terms`` utf-8: sorted vocabulary
+- ``doc_len`` int32[n_docs], ``idf`` float64[n_terms]
+- ``post_ptr`` int64[n_terms + 1], ``post_doc`` int32[nnz], ``post_tf`` int32[nnz]
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from app.analysis import analyze, analyzer_fingerprint
+from app.config import BM25_SNAPSHOT_PATH, KNOWLEDGE_DEDUP, KNOWLEDGE_DIR
+from app.corpus import SECTIONS as CORPUS_SECTIONS, CorpusStore
+from app.dedup import cleaning_fingerprint, get_cleaner
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BM25SNAP"
+FORMAT_VERSION = 2
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGN = 8
+
+
+class BM25Index:
+	"""Okapi BM25 over CSR postings (term -> [(doc, tf)]), sorted by term."""
+
+	def __init__(
+		self,
+		terms: Sequence[str],
+		doc_len: np.ndarray,
+		idf: np.ndarray,
+		post_ptr: np.ndarray,
+		post_doc: np.ndarray,
+		post_tf: np.ndarray,
+		k1: float = 1.5,
+		b: float = 0.75,
+		epsilon: float = 0.25,
+	) -> None:
+		self.terms = terms
+		self.term_ids: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+		self.doc_len = doc_len
+		self.idf = idf
+		self.post_ptr = post_ptr
+		self.post_doc = post_doc
+		self.post_tf = post_tf
+		self.k1 = k1
+		self.b = b
+		self.epsilon = epsilon
+		self.corpus_size = len(doc_len)
+		self.avgdl = float(doc_len.sum()) / self.corpus_size if self.corpus_size else 0.0
+		# k1 * (1 - b + b * |d| / avgdl), evaluated exactly as rank_bm25 does
+		self._norm = self.k1 * (1 - self.b + self.b * doc_len.astype(np.float64) / self.avgdl) if self.corpus_size else np.zeros(0)
+
+	@classmethod
+	def from_corpus(cls, tokenized: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> "BM25Index":
+		postings: Dict[str, List[Tuple[int, int]]] = {}
+		for doc_id, tokens in enumerate(tokenized):
+			tf: Dict[str, int] = {}
+			for t in tokens:
+				tf[t] = tf.get(t, 0) + 1
+			for t, n in tf.items():
+				postings.setdefault(t, []).append((doc_id, n))
+		terms = sorted(postings)
+		n_docs = len(tokenized)
+		post_ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+		for i, t in enumerate(terms):
+			post_ptr[i + 1] = post_ptr[i] + len(postings[t])
+		pairs = [p for t in terms for p in postings[t]]
+		post_doc = np.array([d for d, _ in pairs], dtype=np.int32)
+		post_tf = np.array([n for _, n in pairs], dtype=np.int32)
+		idf_by_term = okapi_idf({t: len(p) for t, p in postings.items()}, n_docs, epsilon)
+		idf = np.array([idf_by_term[t] for t in terms], dtype=np.float64)
+		doc_len = np.array([len(tokens) for tokens in tokenized], dtype=np.int32)
+		return cls(terms, doc_len, idf, post_ptr, post_doc, post_tf, k1, b, epsilon)
+
+	def get_scores(self, query: Iterable[str]) -> np.ndarray:
+		scores = np.zeros(self.corpus_size)
+		for q in query:
+			i = self.term_ids.get(q)
+			if i is None:
+				continue
+			lo, hi = self.post_ptr[i], self.post_ptr[i + 1]
+			docs = self.post_doc[lo:hi]
+			tf = self.post_tf[lo:hi].astype(np.float64)
+			scores[docs] += self.idf[i] * (tf * (self.k1 + 1) / (tf + self._norm[docs]))
+		return scores
+
+	@property
+	def doc_freq(self) -> np.ndarray:
+		"""Documents containing each term, aligned with ``terms``."""
+		return np.diff(self.post_ptr)
+
+	def set_collection_stats(self, idf: np.ndarray, avgdl: float) -> None:
+		"""Score with idf/avgdl of a larger collection this index is a shard of (see app.sharding)."""
+		self.idf = idf
+		self.avgdl = avgdl
+		self._norm = self.k1 * (1 - self.b + self.b * self.doc_len.astype(np.float64) / avgdl) if self.corpus_size else np.zeros(0)
+
+
+def okapi_idf(doc_freq: Dict[str, int], n_docs: int, epsilon: float = 0.25) -> Dict[str, float]:
+	"""Idf (and negative-idf floor) as rank_bm25.BM25Okapi; the floor averages in ``doc_freq`` order."""
+	idf: Dict[str, float] = {}
+	for t, freq in doc_freq.items():
+		idf[t] = math.log(n_docs - freq + 0.5) - math.log(freq + 0.5)
+	average_idf = sum(idf.values()) / len(idf) if idf else 0.0
+	eps = epsilon * average_idf
+	return {t: v if v >= 0 else eps for t, v in idf.items()}
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+	"""Ids of the ``k`` best scores, best first, ties by lower id (a stable sort's order)."""
+	n = len(scores)
+	if k <= 0 or n == 0:
+		return np.zeros(0, dtype=np.int64)
+	if k >= n:
+		return np.argsort(-scores, kind="stable")
+	kth = np.partition(scores, n - k)[n - k]
+	above = np.flatnonzero(scores > kth)
+	tied = np.flatnonzero(scores == kth)[:k - len(above)]
+	candidates = np.concatenate([above, tied])
+	return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def source_fingerprint(paths: Sequence[str]) -> str:
+	"""Digest of (name, size, mtime) of the knowledge files; cheap enough to check at every start."""
+	h = hashlib.sha1()
+	for p in sorted(paths):
+		st = os.stat(p)
+		h.update(f"{os.path.basename(p)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+	return h.hexdigest()[:16]
+
+
+def knowledge_paths(knowledge_dir: str = KNOWLEDGE_DIR) -> List[str]:
+	return sorted(glob.glob(os.path.join(knowledge_dir, "*.txt")))
+
+
+def _string_table(items: Sequence[str]) -> Tuple[np.ndarray, bytes]:
+	encoded = [s.encode("utf-8") for s in items]
+	offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+	if encoded:
+		offsets[1:] = np.cumsum([len(e) for e in encoded])
+	return offsets, b"".join(encoded)
+
+
+def _decode_table(offsets: np.ndarray, buf: memoryview) -> List[str]:
+	raw = bytes(buf)
+	return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def write_snapshot(path: str, documents: Sequence[str], index: BM25Index, source: str, cleaning: Optional[dict] = None) -> None:
+	"""Serialize cleaned documents + index to ``path`` atomically; ``cleaning`` is a report kept in the header."""
+	store = documents if isinstance(documents, CorpusStore) else CorpusStore.from_documents(documents)
+	term_offsets, terms = _string_table(index.terms)
+	sections = [(name, data if isinstance(data, bytes) else data.astype("<i8")) for name, data in store.sections()]
+	sections += [
+		("term_offsets", term_offsets),
+		("terms", terms),
+		("doc_len", index.doc_len.astype("<i4")),
+		("idf", index.idf.astype("<f8")),
+		("post_ptr", index.post_ptr.astype("<i8")),
+		("post_doc", index.post_doc.astype("<i4")),
+		("post_tf", index.post_tf.astype("<i4")),
+	]
+	table = []
+	payload = []
+	offset = 0
+	for name, data in sections:
+		raw = data if isinstance(data, bytes) else np.ascontiguousarray(data).tobytes()
+		dtype = "bytes" if isinstance(data, bytes) else data.dtype.str
+		table.append({"name": name, "dtype": dtype, "offset": offset, "nbytes": len(raw)})
+		pad = (-len(raw)) % _ALIGN
+		payload.append(raw + b"\0" * pad)
+		offset += len(raw) + pad
+	header = {
+		"analyzer": analyzer_fingerprint(),
+		"cleaning": cleaning_fingerprint(),
+		"cleaning_report": cleaning or {},
+		"source": source,
+		"n_docs": len(documents),
+		"n_terms": len(index.terms),
+		"k1": index.k1,
+		"b": index.b,
+		"epsilon": index.epsilon,
+		"sections": table,
+	}
+	head = json.dumps(header, sort_keys=True).encode("utf-8")
+	head += b" " * ((-(_PREAMBLE.size + len(head))) % _ALIGN)
+	os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+	tmp = f"{path}.tmp{os.getpid()}"
+	with open(tmp, "wb") as f:
+		f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(head)))
+		f.write(head)
+		for chunk in payload:
+			f.write(chunk)
+	os.replace(tmp, path)
+
+
+def read_header(path: str) -> Optional[dict]:
+	try:
+		with open(path, "rb") as f:
+			magic, version, head_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+			if magic != MAGIC or version != FORMAT_VERSION:
+				return None
+			header = json.loads(f.read(head_len))
+	except (OSError, ValueError, struct.error):
+		return None
+	header["data_start"] = _PREAMBLE.size + head_len
+	return header
+
+
+def _map_sections(path: str, source: Optional[str] = None) -> Optional[Tuple[dict, Dict[str, object]]]:
+	header = read_header(path)
+	if header is None:
+		return None
+	if (
+		header["analyzer"] != analyzer_fingerprint()
+		or header.get("cleaning") != cleaning_fingerprint()
+		or (source is not None and header["source"] != source)
+	):
+		logger.info("BM25 snapshot %s is stale; rebuilding in memory", path)
+		return None
+	try:
+		mm = np.memmap(path, dtype=np.uint8, mode="r")
+	except (OSError, ValueError):
+		return None
+	base = header["data_start"]
+	arrays: Dict[str, object] = {}
+	for sec in header["sections"]:
+		start = base + sec["offset"]
+		view = mm[start:start + sec["nbytes"]]
+		arrays[sec["name"]] = memoryview(view) if sec["dtype"] == "bytes" else view.view(np.dtype(sec["dtype"]))
+	return header, arrays
+
+
+def _corpus(arrays: Dict[str, object]) -> CorpusStore:
+	return CorpusStore(arrays["text"], {name: arrays[name] for name in CORPUS_SECTIONS if name != "text"})
+
+
+def load_snapshot(path: str, source: Optional[str] = None) -> Optional[Tuple[CorpusStore, BM25Index]]:
+	"""Memory-map a snapshot; None if missing, corrupt or stale.
+
+	Documents come back as a `CorpusStore` over the mapped text, decoded only
+	when read.
+
+	Stale means a different format version, analyzer fingerprint (version +
+	synonyms), corpus cleaning settings or, when ``source`` is given, source
+	fingerprint.
+	"""
+	mapped = _map_sections(path, source)
+	if mapped is None:
+		return None
+	header, arrays = mapped
+	documents = _corpus(arrays)
+	terms = _decode_table(arrays["term_offsets"], arrays["terms"])
+	index = BM25Index(
+		terms, arrays["doc_len"], arrays["idf"], arrays["post_ptr"], arrays["post_doc"], arrays["post_tf"],
+		header["k1"], header["b"], header["epsilon"],
+	)
+	return documents, index
+
+
+def load_corpus(path: str, source: Optional[str] = None) -> Optional[CorpusStore]:
+	"""Only the documents of a snapshot (no vocabulary decoding); None if missing or stale."""
+	mapped = _map_sections(path, source)
+	return _corpus(mapped[1]) if mapped is not None else None
+
+
+def cleaned_knowledge(knowledge_dir: str = KNOWLEDGE_DIR) -> Tuple[List[str], Optional[dict]]:
+	"""Knowledge documents as indexed (cleaned when KNOWLEDGE_DEDUP) and the cleaning report."""
+	from app.agents.knowledge import load_knowledge_docs
+
+	docs = load_knowledge_docs(knowledge_dir, clean=False)
+	if not KNOWLEDGE_DEDUP:
+		return docs, None
+	docs, cleaning = get_cleaner().clean(docs)
+	return docs, cleaning.as_dict()
+
+
+def build_snapshot(knowledge_dir: str = KNOWLEDGE_DIR, out: str = BM25_SNAPSHOT_PATH) -> dict:
+	paths = knowledge_paths(knowledge_dir)
+	docs, report = cleaned_knowledge(knowledge_dir)
+	index = BM25Index.from_corpus([analyze(d) for d in docs])
+	write_snapshot(out, docs, index, source_fingerprint(paths), report)
+	return read_header(out) or {}
+
+
+def main(argv=None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	sub = parser.add_subparsers(dest="cmd", required=True)
+	build = sub.add_parser("build", help="clean, analyze and index the knowledge files into a snapshot")
+	build.add_argument("--knowledge-dir", default=KNOWLEDGE_DIR)
+	build.add_argument("--out", default=BM25_SNAPSHOT_PATH)
+	info = sub.add_parser("info", help="print a snapshot header")
+	info.add_argument("path", nargs="?", default=BM25_SNAPSHOT_PATH)
+	args = parser.parse_args(argv)
+	if args.cmd == "build":
+		if not args.out:
+			parser.error("--out is required when BM25_SNAPSHOT_PATH is empty")
+		started = time.perf_counter()
+		header = build_snapshot(args.knowledge_dir, args.out)
+		print(f"wrote {args.out}: {header.get('n_docs')} docs, {header.get('n_terms')} terms, "
+			f"{os.path.getsize(args.out)} bytes in {(time.perf_counter() - started) * 1000.0:.0f} ms")
+		return 0
+	header = read_header(args.path)
+	if header is None:
+		print(f"{args.path}: missing or not a v{FORMAT_VERSION} snapshot")
+		return 1
+	header["stale_analyzer"] = header["analyzer"] != analyzer_fingerprint()
+	header["stale_cleaning"] = header.get("cleaning") != cleaning_fingerprint()
+	print(json.dumps(header, indent=2))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,253 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+import glob
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+
+try:
+	import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+	fcntl = None  # type: ignore
+
+from app.config import CAPTURE_BACKUPS, CAPTURE_MAX_BYTES, CAPTURE_PATH, CAPTURE_QUEUE_MAX, CAPTURE_SAMPLE, CAPTURE_SECRET
+from app.guardrails import Guardrails
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CAPTURED_PATHS = ("/chat", "/chat/batch")
+# Drawn at import, so pre-forked workers share it with the master
+_KEY = CAPTURE_SECRET.encode("utf-8") or secrets.token_bytes(32)
+
+
+@dataclass
+class Capture:
+	"""Stage timings (ms) of the request being captured."""
+
+	stages: Dict[str, float] = field(default_factory=dict)
+
+
+_current: ContextVar[Optional[Capture]] = ContextVar("capture", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+	"""Time a request stage into the capture record; a no-op for requests not sampled."""
+	capture = _current.get()
+	if capture is None:
+		yield
+		return
+	started = time.perf_counter()
+	try:
+		yield
+	finally:
+		ms = (time.perf_counter() - started) * 1000.0
+		capture.stages[name] = round(capture.stages.get(name, 0.0) + ms, 3)
+
+
+def pseudonym(user_id: str, key: Optional[bytes] = None) -> str:
+	"""Stable stand-in for a user id: replays keep per-user state without the real id.
+
+	Keyed (HMAC-SHA256 with CAPTURE_SECRET), so ids cannot be recovered by
+	hashing guesses such as emails or phone numbers.
+	"""
+	digest = hmac.new(key or _KEY, user_id.encode("utf-8"), hashlib.sha256).hexdigest()
+	return "u-" + digest[:16]
+
+
+class CaptureLog:
+	"""Sampled JSONL log of chat traffic, rotated by size like ``RotatingFileHandler``.
+
+	Messages are scrubbed with `Guardrails.sanitize_output` (emails, phone
+	numbers) and user ids replaced by `pseudonym`. ``path`` rolls over to
+	``path.1`` .. ``path.<backups>`` once it would exceed ``max_bytes``.
+
+	`write` only queues the line: a background thread does the file I/O, so
+	the event loop never blocks on the disk. When the queue is full records are
+	dropped (counted as ``capture.dropped``). Pre-forked workers share the log:
+	the size check, rotation and append happen under an exclusive lock on
+	``path.lock``, which (unlike the log) is never renamed.
+	"""
+
+	def __init__(
+		self, path: str, sample: float = 1.0, max_bytes: int = 50 * 1024 * 1024, backups: int = 3,
+		seed: Optional[int] = None, queue_max: int = CAPTURE_QUEUE_MAX,
+	) -> None:
+		self.path = path
+		self.sample = sample
+		self.max_bytes = max_bytes
+		self.backups = backups
+		self._rng = random.Random(seed)
+		self._guards = Guardrails()
+		self._lock = threading.Lock()
+		self._queue: "queue.Queue[bytes]" = queue.Queue(maxsize=queue_max)
+		self._writer: Optional[threading.Thread] = None
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+	def sampled(self) -> bool:
+		return self.sample >= 1.0 or self._rng.random() < self.sample
+
+	def scrub(self, text: str) -> str:
+		return self._guards.sanitize_output(text)[0]
+
+	def _rotate(self) -> None:
+		for n in range(self.backups - 1, 0, -1):
+			if os.path.exists(f"{self.path}.{n}"):
+				os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+		if self.backups > 0:
+			os.replace(self.path, f"{self.path}.1")
+		else:
+			os.remove(self.path)
+
+	def write(self, record: Dict[str, Any]) -> None:
+		"""Queue ``record`` for the background writer."""
+		line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+		with self._lock:
+			# Threads do not survive fork: a worker starts its own writer and queue
+			# (lines still queued in the parent are the parent's to write)
+			if self._writer is None or not self._writer.is_alive():
+				self._queue = queue.Queue(maxsize=self._queue.maxsize)
+				self._writer = threading.Thread(target=self._drain, name="capture-writer", daemon=True)
+				self._writer.start()
+		try:
+			self._queue.put_nowait(line)
+		except queue.Full:
+			metrics.incr("capture.dropped")
+
+	def flush(self) -> None:
+		"""Block until every queued record is on disk."""
+		self._queue.join()
+
+	def _drain(self) -> None:
+		q = self._queue
+		# Opened by each process's writer: flock is per open file, so a descriptor
+		# inherited across fork would not exclude the parent
+		with open(f"{self.path}.lock", "ab") as lock:
+			while True:
+				line = q.get()
+				try:
+					self._append(line, lock)
+				finally:
+					q.task_done()
+
+	def _append(self, line: bytes, lock) -> None:
+		try:
+			if fcntl is not None:
+				fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+			try:
+				if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+					self._rotate()
+				with open(self.path, "ab") as f:
+					f.write(line)
+			finally:
+				if fcntl is not None:
+					fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+		except OSError:
+			logger.exception("Could not write capture record to %s", self.path)
+			return
+		metrics.incr("capture.records")
+
+	def _item(self, request: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+		return {
+			"user": pseudonym(str(request.get("user_id", ""))),
+			"message": self.scrub(str(request.get("message", ""))),
+			"route": response.get("route"),
+		}
+
+	def record(self, path: str, body: bytes, response: bytes, status: int, started: float, ms: float, capture: Capture) -> Dict[str, Any]:
+		"""The log record for one exchange (request/response bodies are the raw JSON)."""
+		try:
+			request = json.loads(body or b"{}")
+		except ValueError:
+			request = {}
+		try:
+			answer = json.loads(response or b"{}") if status == 200 else {}
+		except ValueError:
+			answer = {}
+		rec: Dict[str, Any] = {"ts": round(started, 3), "path": path, "status": status, "ms": round(ms, 3), "stages": capture.stages}
+		if path == "/chat/batch":
+			items = request.get("items") or []
+			results = answer.get("results") or [{}] * len(items)
+			rec["items"] = [self._item(q, r) for q, r in zip(items, results)]
+		else:
+			rec.update(self._item(request, answer))
+		return rec
+
+
+class CaptureMiddleware:
+	"""ASGI middleware recording sampled `/chat` and `/chat/batch` exchanges to a `CaptureLog`.
+
+	Request and response bodies are observed as they stream through, not
+	re-read, and the handlers add stage timings through `stage`.
+	"""
+
+	def __init__(self, app, log: CaptureLog) -> None:
+		self.app = app
+		self.log = log
+
+	async def __call__(self, scope, receive, send) -> None:
+		if scope["type"] != "http" or scope["path"] not in CAPTURED_PATHS or not self.log.sampled():
+			await self.app(scope, receive, send)
+			return
+		body = bytearray()
+		response = bytearray()
+		status: List[int] = [0]
+
+		async def receive_and_keep():
+			message = await receive()
+			if message["type"] == "http.request":
+				body.extend(message.get("body", b""))
+			return message
+
+		async def send_and_keep(message) -> None:
+			if message["type"] == "http.response.start":
+				status[0] = message["status"]
+			elif message["type"] == "http.response.body":
+				response.extend(message.get("body", b""))
+			await send(message)
+
+		capture = Capture()
+		token = _current.set(capture)
+		started = time.time()
+		t0 = time.perf_counter()
+		try:
+			await self.app(scope, receive_and_keep, send_and_keep)
+		finally:
+			_current.reset(token)
+			ms = (time.perf_counter() - t0) * 1000.0
+			try:
+				self.log.write(self.log.record(scope["path"], bytes(body), bytes(response), status[0] or 500, started, ms, capture))
+			except Exception:
+				logger.exception("Capture failed for %s", scope["path"])
+
+
+def read_capture(path: str) -> List[Dict[str, Any]]:
+	"""Records of a capture log (rotated backups first, so in time order)."""
+	backups = [p for p in glob.glob(f"{glob.escape(path)}.*") if p.rsplit(".", 1)[1].isdigit()]
+	paths = sorted(backups, key=lambda p: -int(p.rsplit(".", 1)[1]))
+	records: List[Dict[str, Any]] = []
+	for p in paths + ([path] if os.path.exists(path) else []):
+		with open(p, encoding="utf-8") as f:
+			records.extend(json.loads(line) for line in f if line.strip())
+	return records
+
+
+_default: Optional[CaptureLog] = None
+
+
+def get_capture_log() -> Optional[CaptureLog]:
+	"""The log at CAPTURE_PATH (None when capture is off)."""
+	global _default
+	if _default is None and CAPTURE_PATH:
+		_default = CaptureLog(CAPTURE_PATH, CAPTURE_SAMPLE, CAPTURE_MAX_BYTES, CAPTURE_BACKUPS)
+	return _default
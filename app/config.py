@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Tuple
 import os
 
 INFINITEPAY_URLS: List[str] = [
@@ -39,3 +39,179 @@ DEFAULT_LANGUAGE = os.environ.get("DEFAULT_LANGUAGE", "pt-BR")
 # Optional redirect policy configuration
 AUTO_REDIRECT_ON_FALLBACK = os.environ.get("AUTO_REDIRECT_ON_FALLBACK", "0") == "1"
 REDIRECT_MAX_CLARIFICATIONS = int(os.environ.get("REDIRECT_MAX_CLARIFICATIONS", "2"))
+
+# CPU-bound agent work (BM25 scoring, summarizers): inline | thread | process
+EXECUTOR_MODE = os.environ.get("EXECUTOR_MODE", "inline")
+EXECUTOR_WORKERS = int(os.environ.get("EXECUTOR_WORKERS", "0"))
+# Wall-clock limit on offloaded work in milliseconds (0 disables): process mode
+# kills the timed-out work, thread mode only stops waiting for it, inline mode
+# ignores it. CPU_BUDGET_MS is the former name, still read when unset
+EXECUTOR_TIMEOUT_MS = float(os.environ.get("EXECUTOR_TIMEOUT_MS", os.environ.get("CPU_BUDGET_MS", "0")))
+
+# Routing mode for ambiguous messages: "sequential" (web search, then clarify) or
+# "fanout" (race knowledge/web/LLM concurrently and keep the first confident answer)
+ROUTER_MODE = os.environ.get("ROUTER_MODE", "sequential")
+FANOUT_AGENT_TIMEOUT_MS = float(os.environ.get("FANOUT_AGENT_TIMEOUT_MS", "3000"))
+FANOUT_CONFIDENCE = float(os.environ.get("FANOUT_CONFIDENCE", "0.6"))
+
+# Intent detection: "keywords" (default) or "classifier" (hashed-feature linear
+# model from `python -m app.intent train`); predictions below the confidence
+# threshold, or a missing model, fall back to the keyword rules
+INTENT_MODE = os.environ.get("INTENT_MODE", "keywords")
+INTENT_MODEL_PATH = os.environ.get("INTENT_MODEL_PATH", os.path.join(DATA_DIR, "index", "intent.npz"))
+INTENT_CONFIDENCE = float(os.environ.get("INTENT_CONFIDENCE", "0.4"))
+CHAT_BATCH_MAX = int(os.environ.get("CHAT_BATCH_MAX", "32"))
+
+# Text analyzer (app.analysis): LRU size for analyzed queries and optional JSON
+# synonym/translation groups replacing the built-in ones
+ANALYZER_QUERY_CACHE_SIZE = int(os.environ.get("ANALYZER_QUERY_CACHE_SIZE", "4096"))
+SYNONYMS_PATH = os.environ.get("SYNONYMS_PATH", "")
+
+# Typo correction before routing and retrieval: unknown words are rewritten to
+# the closest router keyword or corpus word (SymSpell deletion index). Words
+# shorter than SPELL_MIN_LENGTH are kept; up to 7 letters allow one edit
+SPELL_CORRECT = os.environ.get("SPELL_CORRECT", "1") == "1"
+SPELL_MAX_DISTANCE = int(os.environ.get("SPELL_MAX_DISTANCE", "2"))
+SPELL_MIN_LENGTH = int(os.environ.get("SPELL_MIN_LENGTH", "4"))
+SPELL_PREFIX_LENGTH = int(os.environ.get("SPELL_PREFIX_LENGTH", "7"))
+
+# Opt-in traffic capture for replay benchmarks (bench/replay.py): a sampled
+# fraction of /chat and /chat/batch requests, PII-scrubbed, appended as JSONL to
+# CAPTURE_PATH (empty disables) and rotated at CAPTURE_MAX_BYTES
+CAPTURE_PATH = os.environ.get("CAPTURE_PATH", "")
+CAPTURE_SAMPLE = float(os.environ.get("CAPTURE_SAMPLE", "0.1"))
+CAPTURE_MAX_BYTES = int(os.environ.get("CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+CAPTURE_BACKUPS = int(os.environ.get("CAPTURE_BACKUPS", "3"))
+# HMAC key for the pseudonymous user ids in the capture log; set it to keep them
+# stable across restarts (unset: a random key per server start)
+CAPTURE_SECRET = os.environ.get("CAPTURE_SECRET", "")
+# Records waiting for the background capture writer; beyond this they are dropped
+CAPTURE_QUEUE_MAX = int(os.environ.get("CAPTURE_QUEUE_MAX", "10000"))
+
+# Support agent tools: per-call timeout (capped by the request deadline) and a
+# latency injected into every call of the stub account backend (demos/benchmarks)
+SUPPORT_TOOL_TIMEOUT_MS = float(os.environ.get("SUPPORT_TOOL_TIMEOUT_MS", "1500"))
+SUPPORT_BACKEND_LATENCY_MS = float(os.environ.get("SUPPORT_BACKEND_LATENCY_MS", "0"))
+
+# End-to-end /chat deadline in milliseconds (0 disables) and optional per-route
+# budgets, e.g. "llm=6000,websearch=3000,knowledge=1000"
+REQUEST_DEADLINE_MS = float(os.environ.get("REQUEST_DEADLINE_MS", "8000"))
+
+
+def _parse_route_budgets(raw: str) -> Dict[str, float]:
+	budgets: Dict[str, float] = {}
+	for part in raw.split(","):
+		name, _, value = part.partition("=")
+		if name.strip() and value.strip():
+			budgets[name.strip()] = float(value)
+	return budgets
+
+
+ROUTE_DEADLINES_MS = _parse_route_budgets(os.environ.get("ROUTE_DEADLINES_MS", ""))
+
+# SLO-aware routing: per-route p95 latency budgets (same format as above) for
+# routes with a cheaper fallback (llm -> BM25 knowledge). While a route's
+# p95 over the last SLO_WINDOW calls or its error rate is over budget, a growing share of its traffic is
+# shifted to the fallback; SLO_PROBE_FRACTION always goes through to detect recovery
+SLO_ROUTING = os.environ.get("SLO_ROUTING", "1") == "1"
+SLO_LATENCY_MS = _parse_route_budgets(os.environ.get("SLO_LATENCY_MS", "llm=3000"))
+SLO_MAX_ERROR_RATE = float(os.environ.get("SLO_MAX_ERROR_RATE", "0.2"))
+SLO_PROBE_FRACTION = float(os.environ.get("SLO_PROBE_FRACTION", "0.05"))
+SLO_SHIFT_STEP = float(os.environ.get("SLO_SHIFT_STEP", "0.1"))
+SLO_EWMA_ALPHA = float(os.environ.get("SLO_EWMA_ALPHA", "0.1"))
+SLO_WINDOW = int(os.environ.get("SLO_WINDOW", "100"))
+
+# LLM context packing: token budget for retrieved context and the input price
+# used to log an estimated prompt cost per request (USD per 1K tokens)
+LLM_CONTEXT_TOKENS = int(os.environ.get("LLM_CONTEXT_TOKENS", "1200"))
+LLM_INPUT_COST_PER_1K = float(os.environ.get("LLM_INPUT_COST_PER_1K", "0.00015"))
+
+# LLM backend: "openai" (remote API) or "local" (offline CPU model with micro-batching)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openai")
+LOCAL_LLM_MODEL = os.environ.get("LOCAL_LLM_MODEL", "")
+LLM_BATCH_MAX_SIZE = int(os.environ.get("LLM_BATCH_MAX_SIZE", "8"))
+LLM_BATCH_MAX_WAIT_MS = float(os.environ.get("LLM_BATCH_MAX_WAIT_MS", "10"))
+
+# Web search providers, in order of preference, queried as hedged requests: the
+# next provider starts WEBSEARCH_HEDGE_MS after the previous one (0: all at once;
+# negative: only once the previous one failed) or at once when one fails; the
+# first non-empty result wins and the others are cancelled
+WEBSEARCH_PROVIDERS = [p.strip() for p in os.environ.get("WEBSEARCH_PROVIDERS", "ddg_html,ddg_ia").split(",") if p.strip()]
+WEBSEARCH_HEDGE_MS = float(os.environ.get("WEBSEARCH_HEDGE_MS", "300"))
+
+# Optional web search enrichment: fetch top result pages and answer with an
+# extractive summary instead of a list of links
+WEBSEARCH_ENRICH = os.environ.get("WEBSEARCH_ENRICH", "0") == "1"
+ENRICH_TOP_K = int(os.environ.get("ENRICH_TOP_K", "3"))
+ENRICH_MAX_BYTES = int(os.environ.get("ENRICH_MAX_BYTES", "262144"))
+ENRICH_PAGE_TIMEOUT_MS = float(os.environ.get("ENRICH_PAGE_TIMEOUT_MS", "1500"))
+ENRICH_SUMMARY_SENTENCES = int(os.environ.get("ENRICH_SUMMARY_SENTENCES", "3"))
+ENRICH_CACHE_SIZE = int(os.environ.get("ENRICH_CACHE_SIZE", "256"))
+ENRICH_CACHE_TTL_S = float(os.environ.get("ENRICH_CACHE_TTL_S", "600"))
+
+# HTML extraction backend: auto (selectolax > lxml > stdlib) or a specific one
+HTML_PARSER = os.environ.get("HTML_PARSER", "auto")
+
+# Pre-fork server (python -m app.serve): worker processes sharing the warmed-up
+# indices copy-on-write, and how fast crashed workers are replaced
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+SERVE_HOST = os.environ.get("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.environ.get("SERVE_PORT", "8000"))
+WORKER_RESTART_DELAY_S = float(os.environ.get("WORKER_RESTART_DELAY_S", "1.0"))
+
+# Startup warm-up of agents and indices: "background" (serve at once, /readyz
+# reports 503 until done), "eager" (finish before serving) or "lazy" (first request)
+WARMUP_MODE = os.environ.get("WARMUP_MODE", "background")
+
+# Precomputed BM25 snapshot (python -m app.bm25 build), memory-mapped at startup;
+# missing or stale snapshots fall back to indexing the knowledge files. "" disables
+BM25_SNAPSHOT_PATH = os.environ.get("BM25_SNAPSHOT_PATH", os.path.join(DATA_DIR, "index", "bm25.snap"))
+
+# Sharded retrieval for large corpora: above 1, the knowledge corpus is split
+# into this many BM25 shards scored in parallel (global idf, merged top-k), each
+# in its own process ("process") or thread ("thread"). Shard snapshots come from
+# python -m app.sharding build --shards N, else shards index the files themselves
+KNOWLEDGE_SHARDS = int(os.environ.get("KNOWLEDGE_SHARDS", "0"))
+KNOWLEDGE_SHARD_MODE = os.environ.get("KNOWLEDGE_SHARD_MODE", "process")
+
+# Index-time corpus cleaning: collapse near-duplicate documents and chunks
+# (MinHash/LSH, Jaccard threshold) and strip lines repeated across at least
+# the given share of documents (nav, footers, testimonials). Fee/price lines are kept
+KNOWLEDGE_DEDUP = os.environ.get("KNOWLEDGE_DEDUP", "1") == "1"
+DEDUP_BOILERPLATE_RATIO = float(os.environ.get("DEDUP_BOILERPLATE_RATIO", "0.4"))
+DEDUP_BOILERPLATE_MIN_DOCS = int(os.environ.get("DEDUP_BOILERPLATE_MIN_DOCS", "4"))
+DEDUP_JACCARD = float(os.environ.get("DEDUP_JACCARD", "0.8"))
+
+# Admission control on /chat: per-user token bucket, per-(user, route) buckets
+# as "route=rate/burst" (rate in requests per second), and a global in-flight
+# cap with a bounded FIFO wait queue; beyond that requests are shed. 0 disables
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_USER_RPS = float(os.environ.get("ADMISSION_USER_RPS", "2"))
+ADMISSION_USER_BURST = float(os.environ.get("ADMISSION_USER_BURST", "20"))
+
+
+def _parse_rate_limits(raw: str) -> Dict[str, Tuple[float, float]]:
+	limits: Dict[str, Tuple[float, float]] = {}
+	for part in raw.split(","):
+		name, _, value = part.partition("=")
+		rate, _, burst = value.partition("/")
+		if name.strip() and rate.strip():
+			limits[name.strip()] = (float(rate), float(burst or 1))
+	return limits
+
+
+ADMISSION_ROUTE_LIMITS = _parse_rate_limits(os.environ.get("ADMISSION_ROUTE_LIMITS", "handoff=0.1/3,llm=1/10,websearch=1/10"))
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "64"))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_MS", "1000"))
+ADMISSION_MAX_KEYS = int(os.environ.get("ADMISSION_MAX_KEYS", "100000"))
+
+# Conversation memory: recent turns per user (ring buffer), a global LRU cap by
+# conversations and stored characters, and optional SQLite persistence. Short
+# follow-ups within the window reuse the previous knowledge turn's documents
+MEMORY_MAX_TURNS = int(os.environ.get("MEMORY_MAX_TURNS", "6"))
+MEMORY_MAX_CONVERSATIONS = int(os.environ.get("MEMORY_MAX_CONVERSATIONS", "10000"))
+MEMORY_MAX_CHARS = int(os.environ.get("MEMORY_MAX_CHARS", "20000000"))
+MEMORY_MAX_ANSWER_CHARS = int(os.environ.get("MEMORY_MAX_ANSWER_CHARS", "400"))
+MEMORY_SQLITE_PATH = os.environ.get("MEMORY_SQLITE_PATH", "")
+MEMORY_FOLLOWUP_WINDOW_S = float(os.environ.get("MEMORY_FOLLOWUP_WINDOW_S", "900"))
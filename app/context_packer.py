@@ -0,0 +1,194 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+import logging
+import math
+import re
+
+from app.analysis import analyze, analyze_query
+
+logger = logging.getLogger(__name__)
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+_encoder = None
+_encoder_model: Optional[str] = None
+
+
+def _get_encoder(model: str):
+	global _encoder, _encoder_model
+	if _encoder_model != model:
+		_encoder_model = model
+		try:
+			import tiktoken  # type: ignore
+
+			try:
+				_encoder = tiktoken.encoding_for_model(model)
+			except KeyError:
+				_encoder = tiktoken.get_encoding("cl100k_base")
+		except Exception:
+			_encoder = None
+	return _encoder
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+	"""Model tokens via tiktoken when installed, otherwise a BPE-like estimate.
+
+	The estimate charges one token per punctuation mark and one per ~4
+	characters of each word, which tracks cl100k on Portuguese text closely
+	enough for budgeting.
+	"""
+	enc = _get_encoder(model)
+	if enc is not None:
+		return len(enc.encode(text))
+	return sum(1 if len(p) <= 4 else math.ceil(len(p) / 4) for p in _PIECE_RE.findall(text))
+
+
+@dataclass
+class PackedContext:
+	chunks: List[str]
+	tokens: int
+	budget: int
+	candidates: int
+	duplicates_dropped: int
+	sources: List[int] = field(default_factory=list)
+
+
+def chunk_spans(lines: Sequence[str], max_chars: int = 600) -> List[Tuple[int, int]]:
+	"""[start, end) line ranges grouping non-blank lines into chunks of roughly ``max_chars``."""
+	spans: List[Tuple[int, int]] = []
+	start: Optional[int] = None
+	size = 0
+	for i, line in enumerate(lines):
+		n = len(line.strip())
+		if not n:
+			continue
+		if start is not None and size + n > max_chars:
+			spans.append((start, i))
+			start, size = None, 0
+		if start is None:
+			start = i
+		size += n + 1
+	if start is not None:
+		spans.append((start, len(lines)))
+	return spans
+
+
+def join_chunk(lines: Sequence[str]) -> str:
+	return "\n".join(s for s in (line.strip() for line in lines) if s)
+
+
+def split_chunks(doc: str, max_chars: int = 600) -> List[str]:
+	"""Group consecutive lines into chunks of roughly ``max_chars``."""
+	lines = doc.splitlines()
+	return [join_chunk(lines[a:b]) for a, b in chunk_spans(lines, max_chars)]
+
+
+def bm25_scores(corpus: Sequence[Sequence[str]], query_terms: Sequence[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+	"""BM25 over a small ad-hoc corpus with Lucene's always-positive IDF.
+
+	rank_bm25's Okapi IDF is zero or negative for terms in half the documents,
+	which on a handful of chunks/sentences zeroes out exactly the matches we want.
+	"""
+	n = len(corpus)
+	if not n:
+		return []
+	avgdl = sum(len(d) for d in corpus) / n or 1.0
+	tfs = []
+	df: Dict[str, int] = {}
+	for doc in corpus:
+		tf: Dict[str, int] = {}
+		for t in doc:
+			tf[t] = tf.get(t, 0) + 1
+		tfs.append(tf)
+		for t in tf:
+			df[t] = df.get(t, 0) + 1
+	idf = {t: math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5)) for t in set(query_terms) if t in df}
+	scores: List[float] = []
+	for doc, tf in zip(corpus, tfs):
+		norm = k1 * (1 - b + b * len(doc) / avgdl)
+		score = 0.0
+		for t, w in idf.items():
+			f = tf.get(t)
+			if f:
+				score += w * f * (k1 + 1) / (f + norm)
+		scores.append(score)
+	return scores
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+	if not a or not b:
+		return 0.0
+	return len(a & b) / len(a | b)
+
+
+def split_sentences(text: str) -> List[str]:
+	return [s.strip() for s in _SENTENCE_RE.split(text) if s and s.strip()]
+
+
+def _best_sentences(chunk: str, query_terms: Set[str], max_sentences: int) -> str:
+	sentences = split_sentences(chunk)
+	if len(sentences) <= max_sentences:
+		return "\n".join(sentences)
+	scored: List[Tuple[int, int]] = []
+	for i, sent in enumerate(sentences):
+		scored.append((len(query_terms.intersection(analyze(sent))), i))
+	keep = sorted(i for _, i in sorted(scored, key=lambda t: (-t[0], t[1]))[:max_sentences])
+	return "\n".join(sentences[i] for i in keep)
+
+
+def pack_context(
+	query: str,
+	docs: Sequence[Union[str, Sequence[str]]],
+	budget_tokens: int,
+	model: str = "gpt-4o-mini",
+	max_sentences: int = 4,
+	dedup_threshold: float = 0.8,
+) -> PackedContext:
+	"""Select the most relevant, non-redundant sentences that fit ``budget_tokens``.
+
+	Documents are split into chunks (or given already split, as lists of
+	chunks from `CorpusStore.chunks`), chunks are ranked with BM25 against the
+	query, near-duplicate chunks (term Jaccard >= ``dedup_threshold``) are
+	dropped, each chunk is reduced to its best sentences and the result is
+	packed greedily until the token budget is full.
+	"""
+	chunks: List[str] = []
+	sources: List[int] = []
+	for doc_idx, doc in enumerate(docs):
+		for ch in (split_chunks(doc) if isinstance(doc, str) else doc):
+			chunks.append(ch)
+			sources.append(doc_idx)
+	if not chunks:
+		return PackedContext([], 0, budget_tokens, 0, 0)
+	query_terms = set(analyze_query(query))
+	analyzed = [analyze(ch) for ch in chunks]
+	scores = bm25_scores(analyzed, list(query_terms))
+	# Stable tie-break keeps retrieval order for equally scored chunks
+	order = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+	require_match = max(scores) > 0
+
+	selected: List[str] = []
+	selected_sources: List[int] = []
+	selected_terms: List[Set[str]] = []
+	used = 0
+	dropped = 0
+	for i in order:
+		if require_match and scores[i] <= 0:
+			break
+		if budget_tokens - used < 16:
+			break
+		terms = set(analyzed[i])
+		if any(_jaccard(terms, prev) >= dedup_threshold for prev in selected_terms):
+			dropped += 1
+			continue
+		text = _best_sentences(chunks[i], query_terms, max_sentences)
+		cost = count_tokens(text, model)
+		if used + cost > budget_tokens:
+			# Keep scanning: a shorter, lower-ranked chunk may still fit
+			continue
+		selected.append(text)
+		selected_sources.append(sources[i])
+		selected_terms.append(terms)
+		used += cost
+	return PackedContext(selected, used, budget_tokens, len(chunks), dropped, selected_sources)
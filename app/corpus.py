@@ -0,0 +1,123 @@
+from collections.abc import Sequence as SequenceABC
+from typing import Dict, List, Sequence, Tuple, Union
+import logging
+
+import numpy as np
+
+from app.context_packer import chunk_spans, join_chunk
+
+logger = logging.getLogger(__name__)
+
+# Default chunk size, the same as app.context_packer.split_chunks
+CHUNK_CHARS = 600
+# Names of the arrays (and the text buffer) a store is made of, as stored in a BM25 snapshot
+SECTIONS = ("doc_offsets", "text", "line_start", "line_end", "doc_lines", "chunk_start", "chunk_end", "doc_chunks")
+
+Buffer = Union[bytes, memoryview]
+
+
+class CorpusStore(SequenceABC):
+	"""Cleaned documents in one UTF-8 buffer, addressed through offset arrays.
+
+	``doc_offsets`` (byte ranges of documents), ``line_start``/``line_end``
+	(byte ranges of lines, without terminators) with ``doc_lines`` (each
+	document's range of line ids), and ``chunk_start``/``chunk_end`` (line id
+	ranges of `chunk_spans` chunks) with ``doc_chunks``. Indexing decodes one
+	document on demand; ``view``/``line_view`` return zero-copy memoryviews.
+	Loaded from a snapshot the buffer and arrays are slices of one memory map,
+	so no per-document Python object exists until a document is read.
+	"""
+
+	def __init__(self, text: Buffer, arrays: Dict[str, np.ndarray]) -> None:
+		self.text = memoryview(text)
+		self.doc_offsets = arrays["doc_offsets"]
+		self.line_start = arrays["line_start"]
+		self.line_end = arrays["line_end"]
+		self.doc_lines = arrays["doc_lines"]
+		self.chunk_start = arrays["chunk_start"]
+		self.chunk_end = arrays["chunk_end"]
+		self.doc_chunks = arrays["doc_chunks"]
+
+	@classmethod
+	def from_documents(cls, documents: Sequence[str], chunk_chars: int = CHUNK_CHARS) -> "CorpusStore":
+		encoded: List[bytes] = []
+		doc_offsets = [0]
+		line_start: List[int] = []
+		line_end: List[int] = []
+		doc_lines = [0]
+		chunk_start: List[int] = []
+		chunk_end: List[int] = []
+		doc_chunks = [0]
+		pos = 0
+		for doc in documents:
+			# str.splitlines boundaries, so lines match what the summarizers used to split
+			lines = doc.splitlines(keepends=True)
+			stripped: List[str] = []
+			for line in lines:
+				body = line.splitlines()[0]
+				n_line = len(line.encode("utf-8"))
+				line_start.append(pos)
+				line_end.append(pos + len(body.encode("utf-8")))
+				pos += n_line
+				stripped.append(body)
+			first = doc_lines[-1]
+			for a, b in chunk_spans(stripped, chunk_chars):
+				chunk_start.append(first + a)
+				chunk_end.append(first + b)
+			encoded.append(doc.encode("utf-8"))
+			doc_offsets.append(pos)
+			doc_lines.append(first + len(lines))
+			doc_chunks.append(len(chunk_start))
+		arrays = {
+			"doc_offsets": np.array(doc_offsets, dtype=np.int64),
+			"line_start": np.array(line_start, dtype=np.int64),
+			"line_end": np.array(line_end, dtype=np.int64),
+			"doc_lines": np.array(doc_lines, dtype=np.int64),
+			"chunk_start": np.array(chunk_start, dtype=np.int64),
+			"chunk_end": np.array(chunk_end, dtype=np.int64),
+			"doc_chunks": np.array(doc_chunks, dtype=np.int64),
+		}
+		return cls(b"".join(encoded), arrays)
+
+	def sections(self) -> List[Tuple[str, object]]:
+		"""(name, array or bytes) pairs in `SECTIONS` order, for writing to a snapshot."""
+		return [(name, bytes(self.text) if name == "text" else getattr(self, name)) for name in SECTIONS]
+
+	def __len__(self) -> int:
+		return len(self.doc_offsets) - 1
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [self[j] for j in range(*i.indices(len(self)))]
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError(i)
+		return str(self.view(i), "utf-8")
+
+	def view(self, i: int) -> memoryview:
+		"""UTF-8 bytes of document ``i`` without copying."""
+		return self.text[self.doc_offsets[i]:self.doc_offsets[i + 1]]
+
+	def line_view(self, j: int) -> memoryview:
+		return self.text[self.line_start[j]:self.line_end[j]]
+
+	def lines(self, i: int) -> List[str]:
+		"""Lines of document ``i`` (the ``doc_lines`` range), decoding only this document."""
+		# One decode + C-level split beats slicing the buffer line by line
+		return self[i].splitlines()
+
+	def chunks(self, i: int) -> List[str]:
+		"""Chunks of document ``i``, as ``split_chunks(self[i])`` but from the stored line ranges."""
+		lines = self.lines(i)
+		first = int(self.doc_lines[i])
+		lo, hi = int(self.doc_chunks[i]), int(self.doc_chunks[i + 1])
+		return [
+			join_chunk(lines[a - first:b - first])
+			for a, b in zip(self.chunk_start[lo:hi].tolist(), self.chunk_end[lo:hi].tolist())
+		]
+
+	@property
+	def nbytes(self) -> int:
+		"""Bytes held by the buffer and offset arrays."""
+		return self.text.nbytes + sum(getattr(self, name).nbytes for name in SECTIONS if name != "text")
@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+import time
+
+
+class Deadline:
+	"""Absolute, monotonic request deadline. ``budget_ms <= 0`` means unbounded."""
+
+	__slots__ = ("expires_at",)
+
+	def __init__(self, budget_ms: float = 0.0, expires_at: Optional[float] = None) -> None:
+		if expires_at is None and budget_ms and budget_ms > 0:
+			expires_at = time.monotonic() + budget_ms / 1000.0
+		self.expires_at = expires_at
+
+	def remaining(self) -> Optional[float]:
+		"""Seconds left (never negative), or None when unbounded."""
+		if self.expires_at is None:
+			return None
+		return max(0.0, self.expires_at - time.monotonic())
+
+	@property
+	def expired(self) -> bool:
+		return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+	def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+		"""Timeout in seconds for a single call: the remaining budget, capped by ``cap``."""
+		left = self.remaining()
+		if left is None:
+			return cap
+		return left if cap is None else min(left, cap)
+
+	def child(self, budget_ms: Optional[float]) -> "Deadline":
+		"""A deadline that expires at the earlier of this one and ``budget_ms`` from now."""
+		if not budget_ms or budget_ms <= 0:
+			return self
+		candidate = time.monotonic() + budget_ms / 1000.0
+		if self.expires_at is not None and self.expires_at < candidate:
+			return self
+		return Deadline(expires_at=candidate)
+
+
+_UNBOUNDED = Deadline()
+_current: ContextVar[Deadline] = ContextVar("deadline", default=_UNBOUNDED)
+
+
+def current_deadline() -> Deadline:
+	"""Deadline of the request being served (unbounded outside a request)."""
+	return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline) -> Iterator[Deadline]:
+	token = _current.set(deadline)
+	try:
+		yield deadline
+	finally:
+		_current.reset(token)
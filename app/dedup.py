@@ -0,0 +1,282 @@
+from collections import Counter
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import hashlib
+import json
+import logging
+import re
+import zlib
+
+import numpy as np
+
+from app.analysis import fold_accents
+from app.config import (
+	KNOWLEDGE_DEDUP,
+	DEDUP_BOILERPLATE_RATIO,
+	DEDUP_BOILERPLATE_MIN_DOCS,
+	DEDUP_JACCARD,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever cleaning output changes so snapshots built with older rules go stale
+CLEANING_VERSION = 1
+
+# Fee and price lines ("Débito: 0,35%", "12x de R$ 16,58") repeat across product
+# pages but are exactly what the summarizers answer from; never strip them as boilerplate
+_PROTECTED_RE = re.compile(r"%|R\$")
+_PRIME = (1 << 31) - 1
+_WORD_RE = re.compile(r"\w+")
+# Odd 64-bit multiplier for the rolling k-gram hash (wraps mod 2^64)
+_ROLL = np.uint64(0x9E3779B97F4A7C15)
+
+
+@lru_cache(maxsize=65536)
+def _fold_word(word: str) -> str:
+	return fold_accents(word)
+
+
+def _words(text: str) -> List[str]:
+	# Cached per-word folding; str.translate on every line dominated cleaning time
+	return [_fold_word(w) for w in _WORD_RE.findall(text.lower())]
+
+
+def _line_key(line: str) -> str:
+	return " ".join(_words(line))
+
+
+def is_protected(line: str) -> bool:
+	return _PROTECTED_RE.search(line) is not None
+
+
+def shingles(text: str, k: int = 5) -> Set[int]:
+	"""Hashed word k-grams (accent-folded); texts shorter than ``k`` words give one shingle.
+
+	Words hash with crc32 (stable across processes, unlike ``hash``) and
+	k-grams combine them with a vectorized polynomial rolling hash.
+	"""
+	words = _words(text)
+	if not words:
+		return set()
+	h = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+	k = min(k, len(h))
+	n = len(h) - k + 1
+	acc = h[:n].copy()
+	for j in range(1, k):
+		acc = acc * _ROLL + h[j:j + n]
+	return set(acc.tolist())
+
+
+def content_chunks(doc: str, avg_lines: int = 8) -> List[str]:
+	"""Split at "anchor" lines picked by their own hash, not by position.
+
+	A chunk ends after a line whose hash is 0 mod ``avg_lines`` (or at
+	4 x ``avg_lines`` lines), so a passage repeated in two documents is cut at
+	the same lines in both even when what precedes it differs.
+	"""
+	chunks: List[str] = []
+	current: List[str] = []
+	for line in doc.splitlines():
+		current.append(line)
+		if zlib.crc32(_line_key(line).encode("utf-8")) % avg_lines == 0 or len(current) >= 4 * avg_lines:
+			chunks.append("\n".join(current))
+			current = []
+	if current:
+		chunks.append("\n".join(current))
+	return chunks
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+	if not a or not b:
+		return 0.0
+	return len(a & b) / len(a | b)
+
+
+class MinHasher:
+	"""MinHash signatures from ``num_perm`` universal hashes (a*x + b) mod (2^31 - 1).
+
+	The 31-bit prime keeps a*x + b inside int64, so a whole shingle set is
+	hashed in one vectorized NumPy expression.
+	"""
+
+	def __init__(self, num_perm: int = 64, seed: int = 1) -> None:
+		rng = np.random.default_rng(seed)
+		self.num_perm = num_perm
+		self._a = rng.integers(1, _PRIME, size=(num_perm, 1), dtype=np.int64)
+		self._b = rng.integers(0, _PRIME, size=(num_perm, 1), dtype=np.int64)
+
+	def signature(self, shingle_set: Iterable[int]) -> Tuple[int, ...]:
+		x = (np.fromiter(shingle_set, dtype=np.uint64) % np.uint64(_PRIME)).astype(np.int64)
+		if not len(x):
+			return (_PRIME,) * self.num_perm
+		return tuple(((self._a * x + self._b) % _PRIME).min(axis=1).tolist())
+
+
+class LSHIndex:
+	"""Banded LSH over MinHash signatures: items sharing any band are candidates.
+
+	With ``bands`` x ``rows`` = ``num_perm`` the candidate threshold is about
+	(1 / bands) ** (1 / rows); candidates are then verified on exact Jaccard.
+	"""
+
+	def __init__(self, bands: int = 16, rows: int = 4) -> None:
+		self.bands = bands
+		self.rows = rows
+		self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(bands)]
+
+	def _bands(self, sig: Sequence[int]) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+		for band in range(self.bands):
+			yield band, tuple(sig[band * self.rows:(band + 1) * self.rows])
+
+	def candidates(self, sig: Sequence[int]) -> Set[int]:
+		found: Set[int] = set()
+		for band, key in self._bands(sig):
+			found.update(self._buckets[band].get(key, ()))
+		return found
+
+	def insert(self, item: int, sig: Sequence[int]) -> None:
+		for band, key in self._bands(sig):
+			self._buckets[band].setdefault(key, []).append(item)
+
+
+@dataclass
+class CleaningReport:
+	docs_in: int = 0
+	docs_out: int = 0
+	duplicate_docs: int = 0
+	boilerplate_lines: int = 0
+	duplicate_chunks: int = 0
+	lines_in: int = 0
+	lines_out: int = 0
+	chars_in: int = 0
+	chars_out: int = 0
+
+	def as_dict(self) -> Dict[str, int]:
+		return asdict(self)
+
+
+class CorpusCleaner:
+	"""Index-time cleaning of the knowledge corpus, in three passes.
+
+	1. Near-duplicate documents (shingle Jaccard >= ``jaccard``) collapse into
+	   the first one, so the same page scraped twice takes one top-k slot.
+	2. Lines present in at least ``boilerplate_ratio`` of the remaining
+	   documents (and at least ``boilerplate_min_docs``) are dropped as nav,
+	   footer and testimonial boilerplate, except fee/price lines.
+	3. Chunks (``content_chunks``) that near-duplicate an earlier chunk are
+	   dropped; across documents only if they carry no fee/price line, so
+	   every product page keeps its own table.
+	"""
+
+	def __init__(
+		self,
+		boilerplate_ratio: float = 0.4,
+		boilerplate_min_docs: int = 4,
+		jaccard: float = 0.8,
+		shingle_size: int = 5,
+		num_perm: int = 64,
+		bands: int = 16,
+	) -> None:
+		self.boilerplate_ratio = boilerplate_ratio
+		self.boilerplate_min_docs = boilerplate_min_docs
+		self.jaccard = jaccard
+		self.shingle_size = shingle_size
+		self.hasher = MinHasher(num_perm)
+		self.bands = bands
+		self.rows = max(1, num_perm // bands)
+
+	def fingerprint(self) -> str:
+		payload = json.dumps([
+			CLEANING_VERSION, self.boilerplate_ratio, self.boilerplate_min_docs,
+			self.jaccard, self.shingle_size, self.hasher.num_perm, self.bands,
+		])
+		return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+	def _near_duplicates(self, texts: Sequence[str], may_drop=None) -> List[int]:
+		"""Indices of texts that near-duplicate an earlier kept text."""
+		lsh = LSHIndex(self.bands, self.rows)
+		kept: Dict[int, Set[int]] = {}
+		dropped: List[int] = []
+		for i, text in enumerate(texts):
+			sh = shingles(text, self.shingle_size)
+			if not sh:
+				continue
+			sig = self.hasher.signature(sh)
+			dup = any(
+				jaccard(sh, kept[j]) >= self.jaccard and (may_drop is None or may_drop(i, j))
+				for j in lsh.candidates(sig)
+			)
+			if dup:
+				dropped.append(i)
+				continue
+			kept[i] = sh
+			lsh.insert(i, sig)
+		return dropped
+
+	def boilerplate(self, docs: Sequence[str]) -> Set[str]:
+		"""Normalized keys of lines repeated across enough documents to be boilerplate."""
+		df: Counter = Counter()
+		for doc in docs:
+			df.update({_line_key(line) for line in doc.splitlines() if line.strip() and not is_protected(line)})
+		min_docs = max(self.boilerplate_min_docs, int(self.boilerplate_ratio * len(docs) + 0.999))
+		return {key for key, n in df.items() if n >= min_docs}
+
+	def clean(self, docs: Sequence[str]) -> Tuple[List[str], CleaningReport]:
+		report = CleaningReport(docs_in=len(docs))
+		report.lines_in = sum(len(d.splitlines()) for d in docs)
+		report.chars_in = sum(len(d) for d in docs)
+
+		dup_docs = set(self._near_duplicates(docs))
+		report.duplicate_docs = len(dup_docs)
+		unique = [d for i, d in enumerate(docs) if i not in dup_docs]
+
+		boiler = self.boilerplate(unique)
+		report.boilerplate_lines = len(boiler)
+		stripped = [
+			"\n".join(line for line in doc.splitlines() if is_protected(line) or _line_key(line) not in boiler)
+			for doc in unique
+		]
+
+		chunks: List[str] = []
+		owner: List[int] = []
+		for doc_idx, doc in enumerate(stripped):
+			for chunk in content_chunks(doc):
+				chunks.append(chunk)
+				owner.append(doc_idx)
+
+		def may_drop(i: int, j: int) -> bool:
+			return owner[i] == owner[j] or not is_protected(chunks[i])
+
+		dup_chunks = set(self._near_duplicates(chunks, may_drop))
+		report.duplicate_chunks = len(dup_chunks)
+		parts: List[List[str]] = [[] for _ in stripped]
+		for i, chunk in enumerate(chunks):
+			if i not in dup_chunks:
+				parts[owner[i]].append(chunk)
+		cleaned = [doc for doc in ("\n".join(p) for p in parts) if doc]
+
+		report.docs_out = len(cleaned)
+		report.lines_out = sum(len(d.splitlines()) for d in cleaned)
+		report.chars_out = sum(len(d) for d in cleaned)
+		logger.info("Corpus cleaning: %s", report.as_dict())
+		return cleaned, report
+
+
+_default: Optional[CorpusCleaner] = None
+
+
+def get_cleaner() -> CorpusCleaner:
+	global _default
+	if _default is None:
+		_default = CorpusCleaner(DEDUP_BOILERPLATE_RATIO, DEDUP_BOILERPLATE_MIN_DOCS, DEDUP_JACCARD)
+	return _default
+
+
+def cleaning_fingerprint() -> str:
+	"""Identifies the cleaning applied to indexed documents ("off" when disabled)."""
+	return get_cleaner().fingerprint() if KNOWLEDGE_DEDUP else "off"
+
+
+def clean_documents(docs: Sequence[str]) -> List[str]:
+	return get_cleaner().clean(docs)[0] if KNOWLEDGE_DEDUP else list(docs)
@@ -0,0 +1,160 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+
+from app.config import EXECUTOR_MODE, EXECUTOR_WORKERS, EXECUTOR_TIMEOUT_MS
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorTimeout(Exception):
+	"""Raised when a request waited longer than its timeout for offloaded work."""
+
+
+# Objects whose methods can be invoked in workers, held weakly so a dropped
+# agent (and its index) is freed. Process workers are forked after
+# registration, so they inherit the already-built indices copy-on-write
+# instead of unpickling them per call.
+_TARGETS: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+_generation = 0
+
+
+def register(name: str, obj: Any) -> str:
+	"""Make ``obj`` callable by ``name``; process workers are re-forked only for new targets."""
+	global _generation
+	if _TARGETS.get(name) is not obj:
+		_TARGETS[name] = obj
+		_generation += 1
+	return name
+
+
+def unregister(name: str) -> None:
+	# Forked workers keep their copy until the pool is next re-forked; that is harmless
+	_TARGETS.pop(name, None)
+
+
+def _invoke(name: str, method: str, args: tuple) -> Any:
+	start = time.process_time()
+	result = getattr(_TARGETS[name], method)(*args)
+	return result, (time.process_time() - start) * 1000.0
+
+
+class CPUExecutor:
+	"""Runs CPU-bound agent work off the event loop.
+
+	Modes: ``inline`` (call on the loop thread, the historical behavior),
+	``thread`` (thread pool) and ``process`` (fork-based process pool). What
+	the per-call wall-clock timeout bounds depends on the mode:
+
+	- ``process``: the work itself. The pool is recycled (its workers killed)
+	  so a runaway call stops using CPU; calls it took down with it are
+	  retried once on the fresh pool.
+	- ``thread``: only the wait. Threads cannot be killed, so timed-out work
+	  runs to completion and its result is dropped.
+	- ``inline``: nothing; the timeout is ignored (a warning is logged).
+	"""
+
+	def __init__(self, mode: str = "inline", workers: int = 0, timeout_ms: float = 0.0) -> None:
+		if mode == "process" and "fork" not in multiprocessing.get_all_start_methods():
+			logger.warning("CPUExecutor: fork start method unavailable; using thread mode")
+			mode = "thread"
+		self.mode = mode
+		self.workers = workers or (os.cpu_count() or 1)
+		self.timeout_ms = timeout_ms
+		self._pool: Optional[Executor] = None
+		self._pool_generation = -1
+		if mode == "inline" and timeout_ms > 0:
+			logger.warning("CPUExecutor: EXECUTOR_TIMEOUT_MS has no effect in inline mode")
+
+	def _get_pool(self) -> Executor:
+		if self.mode == "thread":
+			if self._pool is None:
+				self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="agent-cpu")
+			return self._pool
+		# Re-fork when new targets were registered so children see them; calls
+		# already queued on the old pool still run there before it exits
+		if self._pool is None or self._pool_generation != _generation:
+			if self._pool is not None:
+				self._pool.shutdown(wait=False, cancel_futures=False)
+			self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"))
+			self._pool_generation = _generation
+		return self._pool
+
+	async def call(self, name: str, method: str, *args: Any, timeout_ms: Optional[float] = None) -> Any:
+		"""Invoke ``_TARGETS[name].<method>(*args)`` according to the configured mode."""
+		timeout = self.timeout_ms if timeout_ms is None else timeout_ms
+		if self.mode == "inline":
+			result, cpu_ms = _invoke(name, method, args)
+			metrics.observe("executor.cpu_ms", cpu_ms)
+			return result
+		loop = asyncio.get_running_loop()
+		deadline = loop.time() + timeout / 1000.0 if timeout and timeout > 0 else None
+		for attempt in (0, 1):
+			pool = self._get_pool()
+			future = loop.run_in_executor(pool, _invoke, name, method, args)
+			try:
+				if deadline is not None:
+					result, cpu_ms = await asyncio.wait_for(future, timeout=max(0.0, deadline - loop.time()))
+				else:
+					result, cpu_ms = await future
+				break
+			except asyncio.TimeoutError:
+				metrics.incr("executor.timeout")
+				logger.debug("CPUExecutor: %s.%s exceeded its %.0f ms timeout", name, method, timeout)
+				if self.mode == "process":
+					self._recycle(pool)
+				raise ExecutorTimeout(f"{name}.{method} exceeded {timeout:.0f} ms")
+			except BrokenProcessPool:
+				# Another call's timeout killed this pool's workers
+				if attempt:
+					raise
+				metrics.incr("executor.retried")
+		metrics.observe("executor.cpu_ms", cpu_ms)
+		return result
+
+	def _recycle(self, pool: Executor) -> None:
+		"""Kill ``pool``'s workers, stopping timed-out work; the next call forks a fresh pool."""
+		if self._pool is pool:
+			self._pool = None
+		metrics.incr("executor.recycled")
+		if hasattr(pool, "terminate_workers"):  # Python 3.14+
+			pool.terminate_workers()
+			return
+		for process in list((getattr(pool, "_processes", None) or {}).values()):
+			process.terminate()
+		# Reap the dead pool off the event loop
+		threading.Thread(target=pool.shutdown, name="agent-cpu-reaper", daemon=True).start()
+
+	def shutdown(self) -> None:
+		if self._pool is not None:
+			self._pool.shutdown(wait=False, cancel_futures=True)
+			self._pool = None
+
+
+_default: Optional[CPUExecutor] = None
+
+
+def _reset_after_fork() -> None:
+	# Pool threads/processes belong to the parent; a forked server worker must
+	# lazily build its own instead of submitting to a pool with no workers
+	if _default is not None:
+		_default._pool = None
+
+
+if hasattr(os, "register_at_fork"):
+	os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_executor() -> CPUExecutor:
+	global _default
+	if _default is None:
+		_default = CPUExecutor(EXECUTOR_MODE, EXECUTOR_WORKERS, EXECUTOR_TIMEOUT_MS)
+	return _default
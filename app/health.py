@@ -0,0 +1,41 @@
+from typing import Dict
+import threading
+
+_ready = threading.Event()
+
+
+def mark_ready() -> None:
+	_ready.set()
+
+
+def mark_not_ready() -> None:
+	_ready.clear()
+
+
+def is_ready() -> bool:
+	return _ready.is_set()
+
+
+def process_memory(pid: int = 0) -> Dict[str, int]:
+	"""RSS/PSS/shared memory in KiB for ``pid`` (default: this process), Linux only.
+
+	PSS splits shared pages between the processes mapping them, so summing PSS
+	across pre-forked workers gives the real footprint; RSS double counts.
+	"""
+	base = f"/proc/{pid or 'self'}"
+	out: Dict[str, int] = {}
+	try:
+		with open(f"{base}/smaps_rollup", "r") as f:
+			for line in f:
+				key, _, rest = line.partition(":")
+				if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+					out[key.lower() + "_kb"] = int(rest.split()[0])
+	except OSError:
+		try:
+			with open(f"{base}/status", "r") as f:
+				for line in f:
+					if line.startswith("VmRSS:"):
+						out["rss_kb"] = int(line.split()[1])
+		except OSError:
+			pass
+	return out
@@ -0,0 +1,248 @@
+"""Hashed-feature linear intent classifier for RouterAgent.
+
+Usage: python -m app.intent train [--data data/intent/train.jsonl] [--replay FILE] [--out PATH]
+       python -m app.intent eval [--data data/intent/eval.jsonl] [--model PATH]
+
+Messages are turned into signed hashed features (analyzed terms and bigrams
+plus raw folded words and bigrams, so function words like "talk to" still
+count) and scored by a linear model: one weight row per hashed feature, one
+column per route. Training uses scikit-learn's LogisticRegression when it is
+installed and a small NumPy softmax regression otherwise; serving only needs
+NumPy and the saved ``.npz``, so scikit-learn is never imported by the API.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from app.analysis import analyze, analyzer_fingerprint, tokenize
+from app.config import DATA_DIR, INTENT_MODEL_PATH
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the features change so saved models are rejected instead of misread
+FEATURE_VERSION = 1
+LABELS = ("knowledge", "support", "handoff", "slack", "other")
+TRAIN_PATH = os.path.join(DATA_DIR, "intent", "train.jsonl")
+EVAL_PATH = os.path.join(DATA_DIR, "intent", "eval.jsonl")
+
+
+def _feature_names(message: str) -> List[str]:
+	terms = analyze(message)
+	words = tokenize(message)
+	names = [f"t:{t}" for t in terms]
+	names += [f"tt:{a} {b}" for a, b in zip(terms, terms[1:])]
+	names += [f"w:{w}" for w in words]
+	names += [f"ww:{a} {b}" for a, b in zip(words, words[1:])]
+	return names
+
+
+def featurize(messages: Sequence[str], n_features: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+	"""CSR (indptr, indices, values) of L2-normalized signed hashed features."""
+	indptr = [0]
+	indices: List[int] = []
+	values: List[float] = []
+	mask = n_features - 1
+	for message in messages:
+		row: Dict[int, float] = {}
+		for name in _feature_names(message):
+			h = zlib.crc32(name.encode("utf-8"))
+			# The sign bit keeps colliding features from only ever adding up
+			j = h & mask
+			row[j] = row.get(j, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+		norm = sum(v * v for v in row.values()) ** 0.5 or 1.0
+		indices.extend(row)
+		values.extend(v / norm for v in row.values())
+		indptr.append(len(indices))
+	return np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64), np.array(values, dtype=np.float32)
+
+
+class IntentModel:
+	"""Linear model over hashed features; ``predict`` scores a whole batch with NumPy."""
+
+	def __init__(self, classes: Sequence[str], coef: np.ndarray, intercept: np.ndarray, n_features: int) -> None:
+		if n_features & (n_features - 1):
+			raise ValueError("n_features must be a power of two")
+		self.classes = list(classes)
+		self.coef = np.asarray(coef, dtype=np.float32)  # (n_features, n_classes)
+		self.intercept = np.asarray(intercept, dtype=np.float32)
+		self.n_features = n_features
+
+	def predict_proba(self, messages: Sequence[str]) -> np.ndarray:
+		indptr, indices, values = featurize(messages, self.n_features)
+		scores = np.tile(self.intercept, (len(messages), 1))
+		rows = np.repeat(np.arange(len(messages)), np.diff(indptr))
+		np.add.at(scores, rows, self.coef[indices] * values[:, None])
+		scores -= scores.max(axis=1, keepdims=True)
+		np.exp(scores, out=scores)
+		scores /= scores.sum(axis=1, keepdims=True)
+		return scores
+
+	def predict(self, messages: Sequence[str]) -> List[Tuple[str, float]]:
+		"""(label, probability) per message."""
+		if not messages:
+			return []
+		proba = self.predict_proba(messages)
+		best = proba.argmax(axis=1)
+		return [(self.classes[j], float(proba[i, j])) for i, j in enumerate(best)]
+
+	def save(self, path: str) -> None:
+		meta = {"feature_version": FEATURE_VERSION, "analyzer": analyzer_fingerprint(), "classes": self.classes, "n_features": self.n_features}
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+		tmp = f"{path}.tmp{os.getpid()}.npz"
+		np.savez(tmp, coef=self.coef, intercept=self.intercept, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8))
+		os.replace(tmp, path)
+
+	@classmethod
+	def load(cls, path: str) -> Optional["IntentModel"]:
+		"""None if missing, unreadable or trained with other features/analyzer."""
+		try:
+			with np.load(path) as data:
+				meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+				coef, intercept = data["coef"], data["intercept"]
+		except (OSError, ValueError, KeyError):
+			return None
+		if meta.get("feature_version") != FEATURE_VERSION or meta.get("analyzer") != analyzer_fingerprint():
+			logger.warning("Intent model %s was trained with other features; retrain with `python -m app.intent train`", path)
+			return None
+		return cls(meta["classes"], coef, intercept, meta["n_features"])
+
+
+def _train_numpy(X: np.ndarray, y: np.ndarray, n_classes: int, l2: float = 1e-4, epochs: int = 1000, lr: float = 4.0) -> Tuple[np.ndarray, np.ndarray]:
+	# Full-batch softmax regression; the labelled sets are a few hundred messages
+	n = X.shape[0]
+	W = np.zeros((X.shape[1], n_classes), dtype=np.float64)
+	b = np.zeros(n_classes, dtype=np.float64)
+	Y = np.eye(n_classes)[y]
+	for _ in range(epochs):
+		z = X @ W + b
+		z -= z.max(axis=1, keepdims=True)
+		p = np.exp(z)
+		p /= p.sum(axis=1, keepdims=True)
+		g = (p - Y) / n
+		W -= lr * (X.T @ g + l2 * W)
+		b -= lr * g.sum(axis=0)
+	return W, b
+
+
+def train(messages: Sequence[str], labels: Sequence[str], n_features: int = 1 << 16, C: float = 30.0) -> IntentModel:
+	classes = sorted(set(labels), key=lambda c: LABELS.index(c) if c in LABELS else len(LABELS))
+	y = np.array([classes.index(label) for label in labels])
+	indptr, indices, values = featurize(messages, n_features)
+	try:
+		from scipy.sparse import csr_matrix
+		from sklearn.linear_model import LogisticRegression
+	except ImportError:
+		logger.info("scikit-learn not installed; training with the NumPy fallback")
+		# Only the columns that occur are materialized
+		used, inverse = np.unique(indices, return_inverse=True)
+		X = np.zeros((len(messages), len(used)))
+		X[np.repeat(np.arange(len(messages)), np.diff(indptr)), inverse] = values
+		W_used, b = _train_numpy(X, y, len(classes))
+		coef = np.zeros((n_features, len(classes)), dtype=np.float32)
+		coef[used] = W_used
+		return IntentModel(classes, coef, b, n_features)
+	X = csr_matrix((values, indices, indptr), shape=(len(messages), n_features))
+	clf = LogisticRegression(C=C, max_iter=2000)
+	clf.fit(X, y)
+	if len(classes) == 2:
+		# Binary models keep one weight column; expand to one per class
+		coef = np.stack([-clf.coef_[0], clf.coef_[0]], axis=1) / 2
+		intercept = np.array([-clf.intercept_[0], clf.intercept_[0]]) / 2
+	else:
+		coef, intercept = clf.coef_.T, clf.intercept_
+	return IntentModel(classes, coef, intercept, n_features)
+
+
+def load_labelled(path: str) -> Tuple[List[str], List[str]]:
+	messages: List[str] = []
+	labels: List[str] = []
+	with open(path, encoding="utf-8") as f:
+		for line in f:
+			if line.strip():
+				rec = json.loads(line)
+				messages.append(rec["message"])
+				labels.append(rec["label"])
+	return messages, labels
+
+
+def load_replay(path: str) -> Tuple[List[str], List[str]]:
+	"""Messages from a replay/capture log, weakly labelled by the keyword router."""
+	from app.router import keyword_intent
+
+	messages: List[str] = []
+	labels: List[str] = []
+	with open(path, encoding="utf-8") as f:
+		for line in f:
+			if line.strip():
+				message = json.loads(line).get("message")
+				if message:
+					messages.append(message)
+					labels.append(keyword_intent(message.lower()) or "other")
+	return messages, labels
+
+
+_model: Optional[IntentModel] = None
+_loaded = False
+
+
+def get_intent_model() -> Optional[IntentModel]:
+	"""The model at INTENT_MODEL_PATH, loaded once per process (None if unavailable)."""
+	global _model, _loaded
+	if not _loaded:
+		_model = IntentModel.load(INTENT_MODEL_PATH) if INTENT_MODEL_PATH else None
+		_loaded = True
+		if _model is None:
+			logger.warning("No intent model at %r; routing with keywords only", INTENT_MODEL_PATH)
+	return _model
+
+
+def main(argv=None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	sub = parser.add_subparsers(dest="cmd", required=True)
+	tr = sub.add_parser("train", help="train from labelled (and optionally replayed) messages")
+	tr.add_argument("--data", default=TRAIN_PATH)
+	tr.add_argument("--replay", help="JSONL with a 'message' field, labelled by the keyword router")
+	tr.add_argument("--out", default=INTENT_MODEL_PATH)
+	tr.add_argument("--n-features", type=int, default=1 << 16)
+	ev = sub.add_parser("eval", help="accuracy of the keyword router and the model on labelled messages")
+	ev.add_argument("--data", default=EVAL_PATH)
+	ev.add_argument("--model", default=INTENT_MODEL_PATH)
+	args = parser.parse_args(argv)
+	if args.cmd == "train":
+		if not args.out:
+			parser.error("--out is required when INTENT_MODEL_PATH is empty")
+		messages, labels = load_labelled(args.data)
+		if args.replay:
+			extra, extra_labels = load_replay(args.replay)
+			messages += extra
+			labels += extra_labels
+		started = time.perf_counter()
+		model = train(messages, labels, args.n_features)
+		model.save(args.out)
+		print(f"wrote {args.out}: {len(messages)} messages, classes {model.classes}, "
+			f"{os.path.getsize(args.out)} bytes in {(time.perf_counter() - started) * 1000.0:.0f} ms")
+		return 0
+	from app.router import keyword_intent
+
+	model = IntentModel.load(args.model)
+	if model is None:
+		print(f"{args.model}: missing or stale; run `python -m app.intent train`")
+		return 1
+	messages, labels = load_labelled(args.data)
+	keywords = [keyword_intent(m.lower()) or "other" for m in messages]
+	predicted = [label for label, _ in model.predict(messages)]
+	n = len(labels)
+	print(f"keywords accuracy {sum(a == b for a, b in zip(keywords, labels)) / n:.3f} on {n} messages")
+	print(f"model accuracy    {sum(a == b for a, b in zip(predicted, labels)) / n:.3f}")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,263 @@
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from app.config import (
+    LLM_BACKEND,
+    LLM_MODEL,
+    LOCAL_LLM_MODEL,
+    LLM_BATCH_MAX_SIZE,
+    LLM_BATCH_MAX_WAIT_MS,
+)
+from app.context_packer import count_tokens
+from app.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend(ABC):
+    """Completion backend used by `LLMAgent`."""
+
+    name = "base"
+
+    @abstractmethod
+    async def complete(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        *,
+        max_tokens: int,
+        temperature: float,
+        timeout: Optional[float] = None,
+    ) -> str:
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """Remote OpenAI chat completions (requires `openai` and OPENAI_API_KEY)."""
+
+    name = "openai"
+
+    def __init__(self, client: Any, model: str = LLM_MODEL) -> None:
+        self.client = client
+        self.model = model
+
+    async def complete(self, system_prompt, user_prompt, *, max_tokens, temperature, timeout=None) -> str:
+        # The SDK call blocks; run it in a thread and let the request deadline
+        # bound the HTTP timeout so a cancelled request does not keep waiting.
+        # Without a deadline the SDK's own default timeout applies
+        extra = {"timeout": timeout} if timeout is not None else {}
+        chat = await asyncio.to_thread(
+            self.client.chat.completions.create,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **extra,
+        )
+        usage = getattr(chat, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+        if usage is not None and cached is not None and usage.prompt_tokens:
+            metrics.observe("llm.provider_cached_ratio", cached / usage.prompt_tokens)
+        return chat.choices[0].message.content or ""
+
+
+class LocalModel(ABC):
+    """A model that generates completions for a batch of prompts in one pass."""
+
+    @abstractmethod
+    def generate(self, prompts: List[str], max_tokens: int, temperature: float) -> List[str]:
+        raise NotImplementedError
+
+
+class Seq2SeqModel(LocalModel):
+    """Small HuggingFace seq2seq model (e.g. flan-t5) loaded once from local files."""
+
+    def __init__(self, path: str) -> None:
+        # Imported lazily: transformers/torch are heavy and only needed offline
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer  # type: ignore
+
+        self.tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(path, local_files_only=True)
+        self.model.eval()
+
+    def generate(self, prompts: List[str], max_tokens: int, temperature: float) -> List[str]:
+        import torch  # type: ignore
+
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True)
+        with torch.inference_mode():
+            out = self.model.generate(
+                **inputs,
+                max_new_tokens=max_tokens,
+                do_sample=temperature > 0,
+                temperature=max(temperature, 1e-5),
+            )
+        return self.tokenizer.batch_decode(out, skip_special_tokens=True)
+
+
+class MicroBatcher:
+    """Coalesces concurrent prompts into batched `LocalModel.generate` calls.
+
+    The first prompt of a batch waits at most ``max_wait_ms`` for companions;
+    a batch is flushed early once ``max_size`` prompts are queued. Generation
+    runs in a worker thread so the event loop stays responsive.
+    """
+
+    def __init__(self, model: LocalModel, max_size: int = 8, max_wait_ms: float = 10.0) -> None:
+        self.model = model
+        self.max_size = max(1, max_size)
+        self.max_wait_ms = max_wait_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.batches = 0
+        self.prompts = 0
+        self.generated_tokens = 0
+        self.busy_seconds = 0.0
+
+    def _get_queue(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._queue is None:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = None
+        return self._queue
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, prompt: str, max_tokens: int, temperature: float) -> str:
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Enqueue before (re)starting the worker so an idle worker never exits
+        # between the check and the put
+        self._get_queue().put_nowait((prompt, max_tokens, temperature, future))
+        self._ensure_worker()
+        return await future
+
+    async def _collect(self, queue: asyncio.Queue) -> List[Tuple[str, int, float, asyncio.Future]]:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_size:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=left))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        # Drains the queue and exits when idle; submit() restarts it on demand,
+        # so no task is left pending when the loop shuts down
+        queue = self._queue
+        while not queue.empty():
+            batch = await self._collect(queue)
+            # Drop prompts whose callers already gave up (deadline/cancellation)
+            batch = [item for item in batch if not item[3].done()]
+            if not batch:
+                continue
+            prompts = [item[0] for item in batch]
+            max_tokens = max(item[1] for item in batch)
+            temperature = batch[0][2]
+            start = time.perf_counter()
+            try:
+                outputs = await asyncio.to_thread(self.model.generate, prompts, max_tokens, temperature)
+            except Exception as exc:
+                for item in batch:
+                    if not item[3].done():
+                        item[3].set_exception(exc)
+                continue
+            elapsed = time.perf_counter() - start
+            tokens = sum(count_tokens(o) for o in outputs)
+            self.batches += 1
+            self.prompts += len(batch)
+            self.generated_tokens += tokens
+            self.busy_seconds += elapsed
+            metrics.observe("llm.local.batch_size", len(batch))
+            metrics.observe("llm.local.batch_seconds", elapsed)
+            for item, text in zip(batch, outputs):
+                if not item[3].done():
+                    item[3].set_result(text)
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.generated_tokens / self.busy_seconds if self.busy_seconds else 0.0
+
+
+class LocalBackend(LLMBackend):
+    """Offline backend: one model per process, concurrent prompts micro-batched."""
+
+    name = "local"
+
+    def __init__(self, model: LocalModel, max_batch: int = LLM_BATCH_MAX_SIZE, max_wait_ms: float = LLM_BATCH_MAX_WAIT_MS) -> None:
+        self.batcher = MicroBatcher(model, max_size=max_batch, max_wait_ms=max_wait_ms)
+
+    async def complete(self, system_prompt, user_prompt, *, max_tokens, temperature, timeout=None) -> str:
+        prompt = system_prompt + "\n\n" + user_prompt
+        return await asyncio.wait_for(self.batcher.submit(prompt, max_tokens, temperature), timeout=timeout)
+
+
+class InflightCoalescer:
+    """Shares one in-flight completion among identical concurrent requests.
+
+    The first caller for a key starts the work as a task; later callers await
+    the same task. Waiters are shielded, so one caller timing out does not
+    cancel the completion for the others.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[str]]) -> str:
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            metrics.incr("llm.coalesced")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; waiters re-raise it themselves
+
+
+def create_backend(name: str = LLM_BACKEND) -> Optional[LLMBackend]:
+    """Build the configured backend, or None when it cannot run here."""
+    if name == "local":
+        if not LOCAL_LLM_MODEL:
+            logger.debug("LLM_BACKEND=local but LOCAL_LLM_MODEL is not set; running in fallback mode")
+            return None
+        try:
+            return LocalBackend(Seq2SeqModel(LOCAL_LLM_MODEL))
+        except Exception:
+            logger.exception("Could not load local model from %s; running in fallback mode", LOCAL_LLM_MODEL)
+            return None
+    try:
+        from openai import OpenAI  # type: ignore
+    except Exception:  # pragma: no cover
+        return None
+    if not os.environ.get("OPENAI_API_KEY"):
+        return None
+    try:
+        return OpenAIBackend(OpenAI())
+    except Exception:  # pragma: no cover
+        logger.debug("LLMAgent could not initialize OpenAI client; running in fallback mode")
+        return None
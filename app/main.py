@@ -1,16 +1,29 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+import asyncio
+import logging
+import os
+import threading
+import time
 from pydantic import BaseModel
 
-from app.router import RouterAgent
+from app.router import ERROR_TEXT, RouterAgent
+from app.admission import OVERLOADED_TEXT, RATE_LIMITED_TEXT, Overloaded, get_admission
 from app.personality import apply_personality
 from app.guardrails import Guardrails
-from app.agents.handoff import HumanHandoffAgent, RedirectPolicy
-from app.config import AUTO_REDIRECT_ON_FALLBACK, REDIRECT_MAX_CLARIFICATIONS
+from app.agents.handoff import HumanHandoffAgent, RedirectPolicy, ticket_store
+from app.tickets import idempotency_scope
+from app.capture import CaptureMiddleware, get_capture_log, stage
+from app.config import AUTO_REDIRECT_ON_FALLBACK, REDIRECT_MAX_CLARIFICATIONS, REQUEST_DEADLINE_MS, WARMUP_MODE, CHAT_BATCH_MAX, KNOWLEDGE_SHARDS
+from app.deadline import Deadline, deadline_scope
 from app.agents.support import get_user_info, check_transfer_status
 from app.agents.support import _FAKE_DB  # test-only
-from typing import Literal
+from app.metrics import metrics
+from app.health import is_ready, mark_ready, process_memory
+from typing import Any, Callable, Dict, List, Literal, Optional
 
-app = FastAPI(title="Agent Swarm API")
+logger = logging.getLogger(__name__)
 
 
 class ChatRequest(BaseModel):
@@ -23,33 +36,234 @@ class ChatResponse(BaseModel):
 	route: str
 
 
-guards = Guardrails()
-router_agent = RouterAgent()
-handoff_agent = HumanHandoffAgent()
-redirect_policy = RedirectPolicy(max_clarifications=REDIRECT_MAX_CLARIFICATIONS)
+class ChatBatchRequest(BaseModel):
+	items: List[ChatRequest]
+
+
+class ChatBatchResponse(BaseModel):
+	results: List[ChatResponse]
+
+
+# Agents are built on first use (or by the lifespan warm-up), not at import, so
+# importing this module stays cheap for test collection and cold starts
+_FACTORIES: Dict[str, Callable[[], Any]] = {
+	"guards": Guardrails,
+	"router_agent": RouterAgent,
+	"handoff_agent": HumanHandoffAgent,
+	"redirect_policy": lambda: RedirectPolicy(max_clarifications=REDIRECT_MAX_CLARIFICATIONS),
+}
+_singletons: Dict[str, Any] = {}
+_build_lock = threading.RLock()
+
+
+def _get(name: str) -> Any:
+	obj = _singletons.get(name)
+	if obj is None:
+		with _build_lock:
+			obj = _singletons.get(name)
+			if obj is None:
+				obj = _singletons[name] = _FACTORIES[name]()
+	return obj
+
+
+def get_guards() -> Guardrails:
+	return _get("guards")
+
+
+def get_router() -> RouterAgent:
+	return _get("router_agent")
+
+
+def get_handoff() -> HumanHandoffAgent:
+	return _get("handoff_agent")
+
+
+def get_redirect_policy() -> RedirectPolicy:
+	return _get("redirect_policy")
+
+
+def __getattr__(name: str) -> Any:
+	# Keeps `app.main.router_agent` & co. working as lazily built module attributes
+	if name in _FACTORIES:
+		return _get(name)
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warm_up(start_shards: bool = True) -> None:
+	"""Build the agents and touch indices and caches so the first request (or forked worker) starts warm.
+
+	Knowledge shard processes belong to the worker that serves with them: the
+	pre-fork master passes ``start_shards=False`` and each worker starts its own
+	from the lifespan, where an already warm worker only starts its shards.
+	"""
+	if is_ready():
+		if start_shards:
+			_start_shards()
+		return
+	started = time.perf_counter()
+	for name in _FACTORIES:
+		_get(name)
+	if start_shards:
+		_start_shards()
+	if start_shards or KNOWLEDGE_SHARDS <= 1:
+		for query in ("taxas da maquininha", "como usar o celular como maquininha"):
+			get_router().knowledge.answer(query)
+	metrics.observe("startup.warm_up_ms", (time.perf_counter() - started) * 1000.0)
+	mark_ready()
+
+
+def _start_shards() -> None:
+	if KNOWLEDGE_SHARDS > 1:
+		from app.sharding import start_all
+
+		start_all()
+
+
+def _close_shards() -> None:
+	if KNOWLEDGE_SHARDS > 1:
+		from app.sharding import close_all
+
+		close_all()
+
+
+def _warm_up_done(task: "asyncio.Task") -> None:
+	# Nothing awaits the background task: without this a failed warm-up would
+	# leave /readyz at 503 with nothing in the logs
+	if task.cancelled() or task.exception() is None:
+		return
+	metrics.incr("startup.warm_up_errors")
+	logger.error("Background warm-up failed; /readyz stays at 503", exc_info=task.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	"""Warm up per WARMUP_MODE: in a background thread, before serving, or not at all.
+
+	A worker forked from a preloaded master is already warm and only starts its
+	knowledge shards (off the event loop) before serving; they stop on exit.
+	"""
+	task = None
+	if WARMUP_MODE == "eager" or is_ready():
+		await asyncio.to_thread(warm_up)
+	elif WARMUP_MODE == "background":
+		task = asyncio.create_task(asyncio.to_thread(warm_up))
+		task.add_done_callback(_warm_up_done)
+	yield
+	if task is not None and not task.done():
+		logger.debug("Shutting down before warm-up finished")
+	await asyncio.to_thread(_close_shards)
+	if get_capture_log() is not None:
+		await asyncio.to_thread(get_capture_log().flush)
+
+
+app = FastAPI(title="Agent Swarm API", lifespan=lifespan)
+if get_capture_log() is not None:
+	app.add_middleware(CaptureMiddleware, log=get_capture_log())
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest) -> ChatResponse:
+async def chat(req: ChatRequest, response: Response, idempotency_key: Optional[str] = Header(default=None)) -> ChatResponse:
+	admission = get_admission()
+	# Admission runs before anything else so floods cost O(1) per request
+	retry_after = admission.check_user(req.user_id)
+	if retry_after:
+		response.headers["Retry-After"] = str(max(1, round(retry_after)))
+		return ChatResponse(response=RATE_LIMITED_TEXT, route="admission:rate_limited")
 	try:
-		ok, action, reason, payload = guards.validate_input(req.message, req.user_id)
+		with stage("guardrails"):
+			ok, action, reason, payload = get_guards().validate_input(req.message, req.user_id)
 		if not ok:
 			return ChatResponse(response=apply_personality(payload), route=f"guardrails:{reason}")
 		message_for_agents = payload
-		route, raw_answer = await router_agent.handle(message_for_agents, req.user_id)
-		# Optional auto-redirect to human after repeated clarifications
-		if AUTO_REDIRECT_ON_FALLBACK and route == "router":
-			count = redirect_policy.note_clarification(req.user_id)
-			if redirect_policy.should_redirect(req.user_id):
-				route, raw_answer = await handoff_agent.handle(message_for_agents, req.user_id)
-		clean_answer, meta = guards.sanitize_output(raw_answer)
-		final_answer = apply_personality(clean_answer)
-		final_route = route if not meta.get("pii_redacted") else f"{route}:pii_redacted"
-		return ChatResponse(response=final_answer, route=final_route)
+		# A client retrying with the same Idempotency-Key gets the ticket it already opened
+		with idempotency_scope(idempotency_key):
+			try:
+				async with admission.slot():
+					with deadline_scope(Deadline(REQUEST_DEADLINE_MS)), stage("router"):
+						route, raw_answer = await get_router().handle(message_for_agents, req.user_id)
+			except Overloaded:
+				response.headers["Retry-After"] = "1"
+				return ChatResponse(response=OVERLOADED_TEXT, route="admission:shed")
+			with stage("finish"):
+				return await _finish(route, raw_answer, message_for_agents, req.user_id)
 	except Exception as exc:  # pragma: no cover
 		raise HTTPException(status_code=500, detail=str(exc))
 
 
+async def _finish(route: str, raw_answer: str, message: str, user_id: str) -> ChatResponse:
+	# Optional auto-redirect to human after repeated clarifications
+	if AUTO_REDIRECT_ON_FALLBACK and route == "router":
+		get_redirect_policy().note_clarification(user_id)
+		# Tickets count against the handoff route limit like explicit escalations
+		if get_redirect_policy().should_redirect(user_id) and get_admission().allow_route(user_id, "handoff"):
+			route, raw_answer = await get_handoff().handle(message, user_id)
+	clean_answer, meta = get_guards().sanitize_output(raw_answer)
+	final_answer = apply_personality(clean_answer)
+	final_route = route if not meta.get("pii_redacted") else f"{route}:pii_redacted"
+	return ChatResponse(response=final_answer, route=final_route)
+
+
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(req: ChatBatchRequest) -> ChatBatchResponse:
+	"""Several messages in one call: intents are classified in one batch, agents run concurrently.
+
+	Each item goes through the same admission, guardrail and personality steps
+	as `/chat`; the batch holds one concurrency slot and one request deadline.
+	A failing item gets an error reply (route ``router:error``); the others are
+	still answered. Items of the same user are handled in order.
+	"""
+	if len(req.items) > CHAT_BATCH_MAX:
+		raise HTTPException(status_code=413, detail=f"at most {CHAT_BATCH_MAX} items per batch")
+	admission = get_admission()
+	results: List[Optional[ChatResponse]] = [None] * len(req.items)
+	pending: List[int] = []
+	messages: List[str] = []
+	for i, item in enumerate(req.items):
+		if admission.check_user(item.user_id):
+			results[i] = ChatResponse(response=RATE_LIMITED_TEXT, route="admission:rate_limited")
+			continue
+		ok, action, reason, payload = get_guards().validate_input(item.message, item.user_id)
+		if not ok:
+			results[i] = ChatResponse(response=apply_personality(payload), route=f"guardrails:{reason}")
+			continue
+		pending.append(i)
+		messages.append(payload)
+	if pending:
+		try:
+			async with admission.slot():
+				with deadline_scope(Deadline(REQUEST_DEADLINE_MS)), stage("router"):
+					answers = await get_router().handle_batch([(m, req.items[i].user_id) for i, m in zip(pending, messages)])
+		except Overloaded:
+			for i in pending:
+				results[i] = ChatResponse(response=OVERLOADED_TEXT, route="admission:shed")
+		else:
+			for i, message, (route, raw_answer) in zip(pending, messages, answers):
+				try:
+					results[i] = await _finish(route, raw_answer, message, req.items[i].user_id)
+				except Exception:
+					logger.exception("chat_batch: finishing item %d failed", i)
+					results[i] = ChatResponse(response=apply_personality(ERROR_TEXT), route="router:error")
+	return ChatBatchResponse(results=results)
+
+
+@app.get("/healthz")
+async def healthz():
+	"""Liveness: the worker process is up and serving."""
+	return {"ok": True, "pid": os.getpid()}
+
+
+@app.get("/readyz")
+async def readyz():
+	"""Readiness: agents and indices are built and warmed up."""
+	body = {"ready": is_ready(), "pid": os.getpid(), "memory": process_memory()}
+	return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+@app.get("/metrics")
+async def get_metrics():
+	return metrics.snapshot()
+
+
 @app.get("/support/user_info/{user_id}", response_model=ChatResponse)
 async def support_user_info(user_id: str) -> ChatResponse:
 	try:
@@ -70,6 +284,22 @@ async def support_transfer_status(user_id: str) -> ChatResponse:
 		raise HTTPException(status_code=500, detail=str(exc))
 
 
+class TicketPage(BaseModel):
+	user_id: str
+	tickets: List[Dict[str, str]]
+	next_cursor: Optional[str] = None
+
+
+@app.get("/support/tickets/{user_id}", response_model=TicketPage)
+async def support_tickets(user_id: str, limit: int = Query(default=20, ge=1, le=200), cursor: Optional[str] = None) -> TicketPage:
+	"""User's tickets, newest first; pass ``next_cursor`` back as ``cursor`` for the next page."""
+	try:
+		tickets, next_cursor = ticket_store().list_for_user(user_id, limit=limit, cursor=cursor)
+	except ValueError as exc:
+		raise HTTPException(status_code=400, detail=str(exc))
+	return TicketPage(user_id=user_id, tickets=tickets, next_cursor=next_cursor)
+
+
 # Test-only endpoint to force last transfer status for a user
 class ForceTransferBody(BaseModel):
 	status: Literal["queued", "processing", "completed", "failed"]
@@ -100,10 +330,11 @@ async def test_force_transfer(user_id: str, body: ForceTransferBody):
 
 
 @app.post("/test/force_redirect/{user_id}")
-async def test_force_redirect(user_id: str):
+async def test_force_redirect(user_id: str, idempotency_key: Optional[str] = Header(default=None)):
 	try:
 		# Force immediate handoff ticket creation
-		route, text = await handoff_agent.handle("Force redirect", user_id)
+		with idempotency_scope(idempotency_key):
+			route, text = await get_handoff().handle("Force redirect", user_id)
 		return {"ok": True, "user_id": user_id, "route": route, "message": text}
 	except Exception as exc:  # pragma: no cover
 		raise HTTPException(status_code=500, detail=str(exc))
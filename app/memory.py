@@ -0,0 +1,214 @@
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Iterator, List, NamedTuple, Optional, Tuple
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from app.config import (
+	MEMORY_MAX_TURNS,
+	MEMORY_MAX_CONVERSATIONS,
+	MEMORY_MAX_CHARS,
+	MEMORY_MAX_ANSWER_CHARS,
+	MEMORY_SQLITE_PATH,
+)
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Turn(NamedTuple):
+	"""One exchange; a plain tuple so a conversation costs a few hundred bytes plus text."""
+	ts: float
+	message: str
+	route: str
+	answer: str
+	doc_ids: Tuple[int, ...] = ()
+
+	@property
+	def chars(self) -> int:
+		return len(self.message) + len(self.answer)
+
+
+class SQLiteConversationBackend:
+	"""Append-only turn log in SQLite; conversations evicted from memory reload from here."""
+
+	def __init__(self, path: str) -> None:
+		self.path = path
+		self._lock = threading.Lock()
+		self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute(
+			"CREATE TABLE IF NOT EXISTS turns (user_id TEXT NOT NULL, ts REAL NOT NULL, message TEXT, route TEXT, answer TEXT, doc_ids TEXT)"
+		)
+		self._conn.execute("CREATE INDEX IF NOT EXISTS turns_user_ts ON turns (user_id, ts)")
+
+	def append(self, user_id: str, turn: Turn) -> None:
+		with self._lock:
+			self._conn.execute(
+				"INSERT INTO turns VALUES (?, ?, ?, ?, ?, ?)",
+				(user_id, turn.ts, turn.message, turn.route, turn.answer, json.dumps(turn.doc_ids)),
+			)
+
+	def load(self, user_id: str, limit: int) -> List[Turn]:
+		with self._lock:
+			rows = self._conn.execute(
+				"SELECT ts, message, route, answer, doc_ids FROM turns WHERE user_id = ? ORDER BY ts DESC LIMIT ?",
+				(user_id, limit),
+			).fetchall()
+		return [Turn(ts, msg, route, answer, tuple(json.loads(ids or "[]"))) for ts, msg, route, answer, ids in reversed(rows)]
+
+	def clear(self, user_id: str) -> None:
+		with self._lock:
+			self._conn.execute("DELETE FROM turns WHERE user_id = ?", (user_id,))
+
+	def close(self) -> None:
+		with self._lock:
+			self._conn.close()
+
+
+class ConversationStore:
+	"""Per-user ring buffers of recent turns under a global LRU cap.
+
+	Each user keeps at most ``max_turns`` turns (a ``deque(maxlen=...)``).
+	Whole conversations are evicted least-recently-used first once there are
+	more than ``max_conversations`` or their text exceeds ``max_chars`` in
+	total. Answers are truncated to ``max_answer_chars`` before storing. With
+	a ``backend`` every turn is also persisted and evicted conversations are
+	reloaded on their next lookup.
+	"""
+
+	def __init__(
+		self,
+		max_turns: int = 6,
+		max_conversations: int = 10_000,
+		max_chars: int = 20_000_000,
+		max_answer_chars: int = 400,
+		backend: Optional[SQLiteConversationBackend] = None,
+	) -> None:
+		self.max_turns = max(1, max_turns)
+		self.max_conversations = max_conversations
+		self.max_chars = max_chars
+		self.max_answer_chars = max_answer_chars
+		self.backend = backend
+		self.chars = 0
+		self._lock = threading.Lock()
+		self._convs: "OrderedDict[str, Deque[Turn]]" = OrderedDict()
+
+	def __len__(self) -> int:
+		return len(self._convs)
+
+	def _conversation(self, user_id: str) -> Optional[Deque[Turn]]:
+		conv = self._convs.get(user_id)
+		if conv is not None:
+			self._convs.move_to_end(user_id)
+			return conv
+		if self.backend is None:
+			return None
+		turns = self.backend.load(user_id, self.max_turns)
+		if not turns:
+			return None
+		metrics.incr("memory.reloaded")
+		conv = self._convs[user_id] = deque(turns, maxlen=self.max_turns)
+		self.chars += sum(t.chars for t in turns)
+		self._evict()
+		return conv
+
+	def _evict(self) -> None:
+		while len(self._convs) > 1 and (len(self._convs) > self.max_conversations or self.chars > self.max_chars):
+			_, conv = self._convs.popitem(last=False)
+			self.chars -= sum(t.chars for t in conv)
+			metrics.incr("memory.evicted")
+
+	def append(self, user_id: str, message: str, route: str, answer: str, doc_ids: Tuple[int, ...] = ()) -> Turn:
+		turn = Turn(time.time(), message, route, answer[: self.max_answer_chars], tuple(doc_ids))
+		with self._lock:
+			conv = self._conversation(user_id)
+			if conv is None:
+				conv = self._convs[user_id] = deque(maxlen=self.max_turns)
+			if len(conv) == conv.maxlen:
+				self.chars -= conv[0].chars
+			conv.append(turn)
+			self.chars += turn.chars
+			self._evict()
+		if self.backend is not None:
+			self.backend.append(user_id, turn)
+		return turn
+
+	def recent(self, user_id: str, n: Optional[int] = None) -> List[Turn]:
+		"""Up to ``n`` most recent turns, oldest first."""
+		with self._lock:
+			conv = self._conversation(user_id)
+			if not conv:
+				return []
+			turns = list(conv)
+		return turns if n is None else turns[-n:]
+
+	def last(self, user_id: str) -> Optional[Turn]:
+		with self._lock:
+			conv = self._conversation(user_id)
+			return conv[-1] if conv else None
+
+	def reset(self) -> None:
+		"""Drop every in-memory conversation (the backend keeps its rows)."""
+		with self._lock:
+			self._convs.clear()
+			self.chars = 0
+
+	def clear(self, user_id: str) -> None:
+		with self._lock:
+			conv = self._convs.pop(user_id, None)
+			if conv:
+				self.chars -= sum(t.chars for t in conv)
+		if self.backend is not None:
+			self.backend.clear(user_id)
+
+
+class TurnContext:
+	"""Per-request scratch shared by the router and agents (like the deadline).
+
+	``followup_of`` is the earlier turn the current message continues, if any;
+	``query`` is the message as the router matched it (typo-corrected, with a
+	follow-up's subject), which agents use for keyword and retrieval term
+	lookup while everything shown or stored keeps the user's own words.
+	Agents report the documents they answered from in ``doc_ids``. It is a
+	mutable object so values set inside child tasks are visible to the caller.
+	"""
+	__slots__ = ("followup_of", "query", "doc_ids")
+
+	def __init__(self, followup_of: Optional[Turn] = None, query: Optional[str] = None) -> None:
+		self.followup_of = followup_of
+		self.query = query
+		self.doc_ids: Tuple[int, ...] = ()
+
+
+_current: ContextVar[Optional[TurnContext]] = ContextVar("turn_context", default=None)
+
+
+def current_turn() -> TurnContext:
+	"""The active turn context, or a throwaway one outside `turn_scope`."""
+	ctx = _current.get()
+	return ctx if ctx is not None else TurnContext()
+
+
+@contextmanager
+def turn_scope(ctx: TurnContext) -> Iterator[TurnContext]:
+	token = _current.set(ctx)
+	try:
+		yield ctx
+	finally:
+		_current.reset(token)
+
+
+_default: Optional[ConversationStore] = None
+
+
+def get_memory() -> ConversationStore:
+	global _default
+	if _default is None:
+		backend = SQLiteConversationBackend(MEMORY_SQLITE_PATH) if MEMORY_SQLITE_PATH else None
+		_default = ConversationStore(MEMORY_MAX_TURNS, MEMORY_MAX_CONVERSATIONS, MEMORY_MAX_CHARS, MEMORY_MAX_ANSWER_CHARS, backend)
+	return _default
@@ -0,0 +1,56 @@
+from typing import Dict
+import threading
+
+
+class Metrics:
+	"""Process-local counters and latency summaries exposed on `/metrics`.
+
+	Deliberately tiny (no Prometheus dependency): counters are monotonically
+	increasing floats, observations keep count/sum/max per name and gauges
+	hold the last value set.
+	"""
+
+	def __init__(self) -> None:
+		self._lock = threading.Lock()
+		self._counters: Dict[str, float] = {}
+		self._observations: Dict[str, Dict[str, float]] = {}
+		self._gauges: Dict[str, float] = {}
+
+	def incr(self, name: str, value: float = 1.0) -> None:
+		with self._lock:
+			self._counters[name] = self._counters.get(name, 0.0) + value
+
+	def observe(self, name: str, value: float) -> None:
+		with self._lock:
+			obs = self._observations.get(name)
+			if obs is None:
+				obs = self._observations[name] = {"count": 0.0, "sum": 0.0, "max": value}
+			obs["count"] += 1
+			obs["sum"] += value
+			if value > obs["max"]:
+				obs["max"] = value
+
+	def set(self, name: str, value: float) -> None:
+		with self._lock:
+			self._gauges[name] = value
+
+	def get(self, name: str) -> float:
+		with self._lock:
+			return self._counters.get(name, 0.0)
+
+	def snapshot(self) -> Dict[str, object]:
+		with self._lock:
+			return {
+				"counters": dict(self._counters),
+				"observations": {k: dict(v) for k, v in self._observations.items()},
+				"gauges": dict(self._gauges),
+			}
+
+	def reset(self) -> None:
+		with self._lock:
+			self._counters.clear()
+			self._observations.clear()
+			self._gauges.clear()
+
+
+metrics = Metrics()
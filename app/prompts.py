@@ -1,26 +1,30 @@
 from typing import List
 
 
-def build_system_prompt() -> str:
-    return (
-        "Você é um assistente especializado nos produtos InfinitePay. "
-        "Responda com base estritamente no contexto fornecido. "
-        "Se a resposta não estiver no contexto, diga explicitamente que não sabe e proponha próximos passos seguros. "
-        "Quando possível, cite trechos relevantes do contexto entre aspas curtas para justificar a resposta. "
-        "Seja conciso, claro e útil."
-    )
+# Templates are module-level constants so every request reuses the same system
+# string: the system message is the stable, byte-identical prefix that provider
+# side prompt caching keys on. Everything request-specific goes in the user
+# message, context first and the question last.
+SYSTEM_PROMPT = (
+    "Você é um assistente especializado nos produtos InfinitePay. "
+    "Responda com base estritamente no contexto fornecido. "
+    "Se a resposta não estiver no contexto, diga explicitamente que não sabe e proponha próximos passos seguros. "
+    "Quando possível, cite trechos relevantes do contexto entre aspas curtas para justificar a resposta. "
+    "Seja conciso, claro e útil."
+    "\n\nInstruções adicionais:"
+    "\n- Cite trechos relevantes entre aspas curtas quando justificar a resposta."
+    "\n- Se a pergunta não for respondida pelo contexto, diga que não sabe e proponha próximos passos."
+    "\n- Se não houver contexto disponível, responda: 'Não sei com base no contexto disponível.' e sugira o que o usuário pode fornecer."
+)
 
+_USER_TEMPLATE = "Contexto:\n{context}\n\nPergunta do usuário:\n{query}"
+_NO_CONTEXT = "(não há contexto disponível)"
 
-def build_user_prompt(query: str, chunks: List[str]) -> str:
-    header = "Pergunta do usuário:\n" + query.strip()
-    if not chunks:
-        return header + "\n\nContexto:\n(não há contexto disponível)\n\nInstruções adicionais:\n- Se não houver contexto suficiente, responda: 'Não sei com base no contexto disponível.' e sugira o que o usuário pode fornecer."
-    context = "\n\n".join(chunks)
-    return (
-        header
-        + "\n\nContexto:\n"
-        + context
-        + "\n\nInstruções adicionais:\n- Cite trechos relevantes entre aspas curtas quando justificar a resposta.\n- Se a pergunta não for respondida pelo contexto, diga que não sabe e proponha próximos passos."
-    )
 
+def build_system_prompt() -> str:
+    return SYSTEM_PROMPT
 
+
+def build_user_prompt(query: str, chunks: List[str]) -> str:
+    context = "\n\n".join(chunks) if chunks else _NO_CONTEXT
+    return _USER_TEMPLATE.format(context=context, query=query.strip())
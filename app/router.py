@@ -1,13 +1,25 @@
-from typing import Tuple
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
 
+import asyncio
 import logging
+import time
 from app.agents.base import Agent
 from app.agents.knowledge import KnowledgeAgent
-from app.agents.support import CustomerSupportAgent
+from app.agents.support import UNAVAILABLE_TEXT as SUPPORT_TIMEOUT_TEXT, CustomerSupportAgent
 from app.agents.handoff import HumanHandoffAgent
 from app.agents.slack import SlackAgent
-from app.tools.websearch import web_search
-from app.config import USE_LLM
+from app.admission import RATE_LIMITED_TEXT, get_admission
+from app.tools.websearch import web_search, web_search_items
+from app.tools.enrich import enrich_results
+from app.analysis import DEFAULT_SYNONYMS, analyze, analyze_query
+from app.capture import stage
+from app.guardrails import Guardrails
+from app.config import USE_LLM, WEBSEARCH_ENRICH, ENRICH_TOP_K, ROUTER_MODE, FANOUT_AGENT_TIMEOUT_MS, FANOUT_CONFIDENCE, ROUTE_DEADLINES_MS, MEMORY_FOLLOWUP_WINDOW_S, INTENT_MODE, INTENT_CONFIDENCE, SPELL_CORRECT, SLO_ROUTING
+from app.deadline import current_deadline, deadline_scope
+from app.memory import Turn, TurnContext, current_turn, get_memory, turn_scope
+from app.metrics import metrics
+from app.slo import create_slo_router
 try:
     from app.agents.llm import LLMAgent  # optional
 except Exception:  # pragma: no cover
@@ -15,6 +27,87 @@ except Exception:  # pragma: no cover
 
 logger = logging.getLogger(__name__)
 
+CLARIFY_TEXT = "Não entendi bem o assunto. Pode reformular ou dar mais detalhes?"
+SLACK_RETRY_TEXT = "Não consegui notificar a equipe agora. Pode tentar novamente em instantes?"
+HANDOFF_RETRY_TEXT = "Não consegui abrir seu chamado com um atendente agora. Pode tentar novamente em instantes?"
+ERROR_TEXT = "Tive um problema ao responder esta mensagem. Pode tentar novamente?"
+
+Handler = Callable[[str, str], Awaitable[Tuple[str, str]]]
+
+# Keyword triggers, checked in this order by RouterAgent
+SLACK_KEYWORDS = ("slack", "notify team", "ping team", "notificar equipe")
+BUSINESS_KEYWORDS = (
+	"maquininha", "infinitepay", "pix", "link de pagamento", "taxa", "fee", "tarifa",
+	"rates", "tap to pay", "pdv", "conta", "cartao", "rendimento", "boleto", "emprestimo",
+	"phone", "cell phone", "celular", "card machine", "iphone", "android", "infinitetap",
+)
+SUPPORT_KEYWORDS = (
+	"transfer", "transferir", "login", "sign in", "signin", "senha", "extrato", "transactions",
+	"cadastro", "perfil", "meus dados", "dados da conta", "account info", "user info",
+)
+# Explicit escalation triggers (avoid generic 'agent')
+HANDOFF_PHRASES = (
+	"talk to a human", "talk to human", "human agent", "transfer to human", "escalate to human",
+	"falar com humano", "transfira para humano", "representative", "atendente",
+)
+# Openers of elliptical follow-ups ("e no crédito 12x?", "and for pix?")
+FOLLOWUP_MARKERS = ("e ", "e no ", "e na ", "e o ", "e a ", "e para ", "e pra ", "e se ", "e quanto", "and ", "what about", "how about")
+# Replies that close a turn rather than continue it ("obrigado", "ok valeu")
+ACKNOWLEDGEMENTS = (
+	"obrigado", "obrigada", "valeu", "vlw", "ok", "okay", "certo", "beleza", "blz", "entendi",
+	"show", "perfeito", "legal", "otimo", "sim", "thanks", "thank you", "thx", "great", "got it",
+)
+# Words the typo corrector must know, besides the corpus vocabulary
+SPELL_KEYWORDS = SLACK_KEYWORDS + BUSINESS_KEYWORDS + SUPPORT_KEYWORDS + HANDOFF_PHRASES + tuple(
+	w for group in DEFAULT_SYNONYMS for w in group
+) + ("transferencia", "transaction", "taxas", "debito", "credito", "parcelado", "humano")
+# Routes whose documents a follow-up can reuse
+_FOLLOWUP_ROUTES = ("knowledge", "llm")
+_ACKNOWLEDGEMENT_TERMS = frozenset(analyze_query(" ".join(ACKNOWLEDGEMENTS)))
+
+
+def keyword_intent(lower: str) -> Optional[str]:
+	"""First keyword-triggered route for a lowercased message, or None."""
+	if any(k in lower for k in SLACK_KEYWORDS):
+		return "slack"
+	if any(k in lower for k in BUSINESS_KEYWORDS):
+		return "knowledge"
+	if any(k in lower for k in SUPPORT_KEYWORDS):
+		return "support"
+	if any(p in lower for p in HANDOFF_PHRASES):
+		return "handoff"
+	return None
+
+
+# Prior trust per candidate route; multiplied by query-term coverage of the answer
+_FANOUT_PRIORS: Dict[str, float] = {"llm": 1.0, "knowledge": 1.0, "websearch": 0.7}
+
+
+@dataclass
+class FanoutReport:
+	"""Outcome of one fan-out race (see `RouterAgent._race`), summarized in metrics."""
+	winner: str
+	confidence: float
+	elapsed_ms: float
+	sequential_ms: float
+	latencies_ms: Dict[str, float] = field(default_factory=dict)
+	cancelled: List[str] = field(default_factory=list)
+
+	@property
+	def saved_ms(self) -> float:
+		return max(0.0, self.sequential_ms - self.elapsed_ms)
+
+
+def answer_confidence(route: str, answer: str, message: str) -> float:
+	"""Cheap confidence proxy: prior(route) x share of query terms found in the answer."""
+	if not answer or route.endswith(":fallback") or route == "router":
+		return 0.0
+	query_terms = set(analyze_query(message))
+	if not query_terms:
+		return 0.0
+	coverage = len(query_terms.intersection(analyze(answer))) / len(query_terms)
+	return _FANOUT_PRIORS.get(route.split(":")[0], 0.5) * coverage
+
 
 class RouterAgent(Agent):
 	"""Routes user messages to specialized agents based on simple heuristics."""
@@ -23,51 +116,334 @@ class RouterAgent(Agent):
 		self.support = CustomerSupportAgent()
 		self.handoff = HumanHandoffAgent()
 		self.slack = SlackAgent()
-		self.llm = LLMAgent() if (USE_LLM and LLMAgent is not None) else None
+		self.llm = LLMAgent(knowledge=self.knowledge) if (USE_LLM and LLMAgent is not None) else None
+		self.mode = ROUTER_MODE
+		self.fanout_timeout_ms = FANOUT_AGENT_TIMEOUT_MS
+		self.fanout_confidence = FANOUT_CONFIDENCE
+		self.route_deadlines_ms: Dict[str, float] = dict(ROUTE_DEADLINES_MS)
+		self.slo = create_slo_router() if SLO_ROUTING else None
+		self.enrich_web = WEBSEARCH_ENRICH
+		self.admission = get_admission()
+		self.memory = get_memory()
+		self.guards = Guardrails()
+		self.followup_window_s = MEMORY_FOLLOWUP_WINDOW_S
+		self.intent_confidence = INTENT_CONFIDENCE
+		self.corrector = None
+		if SPELL_CORRECT:
+			from app.spell import get_corrector, keyword_vocabulary
+
+			self.corrector = get_corrector(keyword_vocabulary(SPELL_KEYWORDS), self.knowledge.rag.documents)
+		self.intent_model = None
+		if INTENT_MODE == "classifier":
+			from app.intent import get_intent_model
+
+			self.intent_model = get_intent_model()
+
+	def correct(self, message: str) -> str:
+		"""The message with misspelled words fixed ("maquinina" -> "maquininha"), if enabled."""
+		return self.corrector.correct(message) if self.corrector is not None else message
+
+	def classify(self, messages: Sequence[str]) -> List[str]:
+		"""Intent per message ("other" when none): one vectorized model call for the batch.
+
+		Without a model, or below the confidence threshold, the keyword rules decide.
+		"""
+		intents = [keyword_intent(m.lower()) or "other" for m in messages]
+		if self.intent_model is None or not messages:
+			return intents
+		started = time.perf_counter()
+		predictions = self.intent_model.predict(messages)
+		metrics.observe("router.intent.us_per_message", (time.perf_counter() - started) * 1e6 / len(messages))
+		for i, (label, confidence) in enumerate(predictions):
+			if confidence >= self.intent_confidence:
+				intents[i] = label
+				metrics.incr("router.intent.model")
+			else:
+				metrics.incr("router.intent.keywords")
+		return intents
+
+	async def handle(self, message: str, user_id: str, intent: Optional[str] = None, corrected: Optional[str] = None) -> Tuple[str, str]:
+		"""Return (route, answer), resolving follow-ups against the user's last turn.
+
+		The typo-corrected message only picks the intent and the terms agents
+		look up (`TurnContext.query`); agents, prompts, tickets, web search and
+		memory get the user's own words. ``intent`` and ``corrected`` are a
+		precomputed `classify` result and `correct` output (see `handle_batch`).
+		The exchange is then recorded in conversation memory, with emails and
+		phone numbers redacted.
+		"""
+		previous = self.memory.last(user_id)
+		if corrected is None:
+			corrected = self.correct(message)
+		followup_of = previous if self._is_followup(corrected, previous) else None
+		with turn_scope(TurnContext(followup_of, corrected)) as turn:
+			if followup_of is not None:
+				route, answer = await self._follow_up(message, user_id, followup_of)
+			else:
+				if intent is None:
+					intent = self.classify([corrected])[0]
+				route, answer = await self._route(message, user_id, intent)
+		# Memory may be persisted (MEMORY_SQLITE_PATH): keep PII out of it
+		self.memory.append(user_id, self._scrub(message), route, self._scrub(answer), turn.doc_ids)
+		return (route, answer)
+
+	def _scrub(self, text: str) -> str:
+		return self.guards.sanitize_output(text)[0]
+
+	async def handle_batch(self, items: Sequence[Tuple[str, str]]) -> List[Tuple[str, str]]:
+		"""Route (message, user_id) pairs: intents are classified together, users run concurrently.
+
+		One user's items run in order, so each sees the previous one in memory
+		(follow-ups). An item whose agent raises is answered with ``ERROR_TEXT``
+		(route ``router:error``) instead of failing the whole batch.
+		"""
+		# Each message is corrected once, for classification and for its handling
+		corrected = [self.correct(message) for message, _ in items]
+		intents = self.classify(corrected)
+		results: List[Tuple[str, str]] = [("router:error", ERROR_TEXT)] * len(items)
+		by_user: Dict[str, List[int]] = {}
+		for i, (_, user_id) in enumerate(items):
+			by_user.setdefault(user_id, []).append(i)
+
+		async def run_user(indices: List[int]) -> None:
+			for i in indices:
+				message, user_id = items[i]
+				try:
+					results[i] = await self.handle(message, user_id, intents[i], corrected[i])
+				except Exception:
+					logger.exception("RouterAgent: batch item %d failed", i)
+					metrics.incr("router.batch_errors")
+
+		await asyncio.gather(*(run_user(indices) for indices in by_user.values()))
+		return results
 
-	async def handle(self, message: str, user_id: str) -> Tuple[str, str]:
+	def _is_followup(self, message: str, previous: Optional[Turn]) -> bool:
+		"""An elliptical message shortly after a knowledge answer, with no keyword intent of its own."""
+		if previous is None or previous.route.split(":")[0] not in _FOLLOWUP_ROUTES:
+			return False
+		if time.time() - previous.ts > self.followup_window_s:
+			return False
+		lower = message.lower().strip()
+		# Messages that trigger a route by themselves are routed as usual
+		if keyword_intent(lower) is not None:
+			return False
+		# Elliptical opener ("e no crédito 12x?")
+		if lower.startswith(FOLLOWUP_MARKERS):
+			return True
+		# Too short to stand alone ("12x?", "no débito"), but adding a detail of its
+		# own: acknowledgements and repeats of the previous question are not follow-ups
+		terms = set(analyze_query(message))
+		if not 0 < len(terms) <= 2:
+			return False
+		return bool(terms - _ACKNOWLEDGEMENT_TERMS - set(analyze_query(previous.message)))
+
+	async def _follow_up(self, message: str, user_id: str, previous: Turn) -> Tuple[str, str]:
+		# The previous question carries the subject the follow-up leaves implicit;
+		# KnowledgeAgent answers from the previous turn's documents (no re-search)
+		resolved = f"{previous.message} {message}"
+		current_turn().query = self.correct(resolved)
+		metrics.incr("memory.followup")
+		logger.debug("RouterAgent: follow-up of %r resolved as %r", previous.message, resolved)
+		if previous.route.startswith("llm") and self._llm_admitted():
+			return await self._dispatch("llm", self.llm.handle, resolved, user_id, degrade=self._knowledge_degraded)
+		return await self._dispatch("knowledge", self.knowledge.handle, resolved, user_id, degrade=self._clarify)
+
+	async def _route(self, message: str, user_id: str, intent: Optional[str] = None) -> Tuple[str, str]:
 		"""Return (route, answer) from the selected agent or a clarification.
 
 		Heuristic ordering: explicit Slack → business knowledge (LLM if enabled,
 		otherwise BM25 knowledge) → support → explicit human handoff → web search →
-		clarify.
+		clarify. With INTENT_MODE=classifier the model picks the intent instead.
 		"""
-		lower = message.lower()
+		if intent is None:
+			intent = self.classify([message])[0]
 		# Slack notify triggers (explicit action)
-		if any(k in lower for k in ["slack", "notify team", "ping team", "notificar equipe"]):
-			return await self.slack.handle(message, user_id)
+		if intent == "slack":
+			return await self._dispatch("slack", self.slack.handle, message, user_id, on_timeout=self._slack_unavailable)
 
 		# Business knowledge
-		if any(k in lower for k in [
-			"maquininha", "infinitepay", "pix", "link de pagamento", "taxa", "fee", "tarifa",
-			"rates", "tap to pay", "pdv", "conta", "cartao", "rendimento", "boleto", "emprestimo",
-			"phone", "cell phone", "celular", "card machine", "iphone", "android", "infinitetap",
-		]):
-			if self.llm is not None:
+		if intent == "knowledge":
+			if self._llm_admitted():
 				logger.debug("RouterAgent selecting LLMAgent for business knowledge query")
-				return await self.llm.handle(message, user_id)
+				# Degrade to BM25 snippets when the LLM cannot answer within budget
+				return await self._dispatch("llm", self.llm.handle, message, user_id, degrade=self._knowledge_degraded)
 			logger.debug("RouterAgent selecting KnowledgeAgent (BM25) for business knowledge query")
-			return await self.knowledge.handle(message, user_id)
+			return await self._dispatch("knowledge", self.knowledge.handle, message, user_id, degrade=self._clarify)
 
 		# Support
-		if any(k in lower for k in [
-			"transfer", "transferir", "login", "sign in", "signin", "senha", "extrato", "transactions",
-			"cadastro", "perfil", "meus dados", "dados da conta", "account info", "user info",
-		]):
-			return await self.support.handle(message, user_id)
-
-		# Explicit escalation triggers (avoid generic 'agent')
-		if any(phrase in lower for phrase in [
-			"talk to a human", "talk to human", "human agent", "transfer to human", "escalate to human",
-			"falar com humano", "transfira para humano", "representative", "atendente",
-		]):
-			return await self.handoff.handle(message, user_id)
+		if intent == "support":
+			return await self._dispatch("support", self.support.handle, message, user_id, degrade=self._support_unavailable)
+
+		# Explicit escalation
+		if intent == "handoff":
+			return await self._dispatch("handoff", self.handoff.handle, message, user_id, on_timeout=self._handoff_unavailable)
+
+		if self.mode == "fanout":
+			return await self._fan_out(message, user_id)
 
 		# General web search
-		results = await web_search(message, top_k=3)
-		if results:
-			return ("websearch", "Resultados relacionados: " + "; ".join(results))
+		route, answer = await self._dispatch("websearch", self._web_answer, message, user_id, degrade=self._clarify)
+		if answer:
+			return (route, answer)
 
 		# Clarify instead of auto-escalate
 		logger.debug("RouterAgent fallback: no intent match; requesting clarification")
-		return ("router", "Não entendi bem o assunto. Pode reformular ou dar mais detalhes?")
+		return ("router", CLARIFY_TEXT)
+
+	def _llm_admitted(self) -> bool:
+		"""LLM enabled and, while it is over its SLO, not among the requests shifted to BM25."""
+		return self.llm is not None and (self.slo is None or self.slo.admit("llm"))
+
+	async def _dispatch(
+		self, route: str, fn: Handler, message: str, user_id: str,
+		degrade: Optional[Handler] = None, on_timeout: Optional[Handler] = None,
+	) -> Tuple[str, str]:
+		"""Run an agent under the request deadline narrowed by the route budget.
+
+		On timeout the call is cancelled and ``degrade`` (the next cheapest answer)
+		is used instead; without one the timeout propagates. A user over the
+		route's rate limit gets ``degrade`` straight away (or a rate-limit reply).
+		Routes with side effects (tickets, notifications) have no cheaper answer
+		and pass ``on_timeout`` instead, which only covers the timeout.
+		"""
+		degrade_timeout = degrade or on_timeout
+		if not self.admission.allow_route(user_id, route):
+			if degrade is not None:
+				return await degrade(message, user_id)
+			return ("admission:rate_limited", RATE_LIMITED_TEXT)
+		deadline = current_deadline().child(self.route_deadlines_ms.get(route))
+		started = time.perf_counter()
+		failed = True
+		with deadline_scope(deadline), stage(f"agent.{route}"):
+			try:
+				result = await asyncio.wait_for(fn(message, user_id), timeout=deadline.remaining())
+				# Agents catch their own backend errors and answer with a ":fallback" route
+				failed = result[0].endswith(":fallback")
+				return result
+			except asyncio.TimeoutError:
+				metrics.incr(f"deadline.timeout.{route}")
+				if degrade_timeout is None:
+					raise
+			finally:
+				# Per-agent latency/error statistics drive SLO shifting (see app.slo)
+				if self.slo is not None:
+					self.slo.observe(route, (time.perf_counter() - started) * 1000.0, failed)
+		metrics.incr(f"deadline.degraded.{route}")
+		logger.debug("RouterAgent: %s exceeded its deadline; degrading", route)
+		return await degrade_timeout(message, user_id)
+
+	async def _knowledge_degraded(self, message: str, user_id: str) -> Tuple[str, str]:
+		route, answer = await self.knowledge.handle(message, user_id)
+		return (f"{route.split(':')[0]}:degraded", answer)
+
+	async def _clarify(self, message: str, user_id: str) -> Tuple[str, str]:
+		return ("router", CLARIFY_TEXT)
+
+	async def _support_unavailable(self, message: str, user_id: str) -> Tuple[str, str]:
+		return ("support", SUPPORT_TIMEOUT_TEXT)
+
+	async def _slack_unavailable(self, message: str, user_id: str) -> Tuple[str, str]:
+		return ("slack:degraded", SLACK_RETRY_TEXT)
+
+	async def _handoff_unavailable(self, message: str, user_id: str) -> Tuple[str, str]:
+		return ("handoff:degraded", HANDOFF_RETRY_TEXT)
+
+	async def _web_answer(self, message: str, user_id: str) -> Tuple[str, str]:
+		if self.enrich_web:
+			items = await web_search_items(message, top_k=max(3, ENRICH_TOP_K))
+			summary = await enrich_results(message, items)
+			if summary:
+				return ("websearch:summary", summary)
+			results = [f"{title} ({url})" for title, url in items[:3]]
+		else:
+			results = await web_search(message, top_k=3)
+		if results:
+			return ("websearch", "Resultados relacionados: " + "; ".join(results))
+		return ("websearch", "")
+
+	def _fanout_candidates(self) -> List[Tuple[str, Handler]]:
+		# Listed in the order a sequential fallback chain would try them
+		candidates: List[Tuple[str, Handler]] = [
+			("knowledge", self.knowledge.handle),
+		]
+		# An LLM over its SLO is shed here too (see `_llm_admitted`)
+		if self._llm_admitted():
+			candidates.append(("llm", self.llm.handle))
+		candidates.append(("websearch", self._web_answer))
+		return candidates
+
+	async def _fan_out(self, message: str, user_id: str) -> Tuple[str, str]:
+		return (await self._race(message, user_id))[0]
+
+	async def _race(self, message: str, user_id: str) -> Tuple[Tuple[str, str], Optional[FanoutReport]]:
+		"""Race candidate agents; keep the first answer above the confidence threshold.
+
+		Each candidate runs under its own deadline. Once a confident answer arrives
+		the remaining tasks are cancelled; otherwise the best completed answer wins.
+		Candidates over their route limit for this user are left out, as with
+		`_dispatch`; if none is left the user gets the rate-limit reply. Returns
+		the answer and the race's `FanoutReport` (None when nothing ran).
+		"""
+		started = time.perf_counter()
+		candidates = [(name, fn) for name, fn in self._fanout_candidates() if self.admission.allow_route(user_id, name)]
+		if not candidates:
+			return ("admission:rate_limited", RATE_LIMITED_TEXT), None
+		order = [name for name, _ in candidates]
+		finished_at: Dict[str, float] = {}
+
+		timeout = current_deadline().timeout(self.fanout_timeout_ms / 1000.0)
+
+		async def run(name: str, fn: Handler) -> Tuple[str, str]:
+			failed: Optional[bool] = True
+			try:
+				result = await asyncio.wait_for(fn(message, user_id), timeout=timeout)
+				failed = result[0].endswith(":fallback")
+				return result
+			except asyncio.CancelledError:
+				# Lost the race: neither a failure nor a full latency sample
+				failed = None
+				raise
+			finally:
+				finished_at[name] = (time.perf_counter() - started) * 1000.0
+				if self.slo is not None and failed is not None:
+					self.slo.observe(name, finished_at[name], failed)
+
+		tasks = {asyncio.create_task(run(name, fn)): name for name, fn in candidates}
+		pending = set(tasks)
+		best: Tuple[float, str, Tuple[str, str]] = (0.0, "", ("router", CLARIFY_TEXT))
+		while pending:
+			done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+			for task in done:
+				name = tasks[task]
+				if task.cancelled() or task.exception() is not None:
+					metrics.incr(f"router.fanout.failed.{name}")
+					continue
+				route, answer = task.result()
+				conf = answer_confidence(route, answer, message)
+				# Ties go to the candidate earlier in the sequential order
+				if conf > best[0] or (conf == best[0] and best[1] and order.index(name) < order.index(best[1])):
+					best = (conf, name, (route, answer))
+			if best[0] >= self.fanout_confidence:
+				break
+		cancelled = [tasks[t] for t in pending]
+		for task in pending:
+			task.cancel()
+		if pending:
+			await asyncio.gather(*pending, return_exceptions=True)
+
+		elapsed = (time.perf_counter() - started) * 1000.0
+		winner = best[1] or "router"
+		# Sequential fallback would have paid every earlier candidate's full latency
+		# before reaching the winner (cancelled ones count their elapsed time, a lower bound)
+		stop = order.index(winner) + 1 if winner in order else len(order)
+		sequential = sum(finished_at.get(name, elapsed) for name in order[:stop])
+		report = FanoutReport(
+			winner=winner, confidence=best[0], elapsed_ms=elapsed, sequential_ms=sequential,
+			latencies_ms=dict(finished_at), cancelled=cancelled,
+		)
+		metrics.incr(f"router.fanout.win.{winner}")
+		metrics.incr("router.fanout.cancelled", len(cancelled))
+		metrics.observe("router.fanout.saved_ms", report.saved_ms)
+		logger.debug("RouterAgent fan-out: winner=%s conf=%.2f elapsed=%.1fms saved=%.1fms", winner, best[0], elapsed, report.saved_ms)
+		# The report is returned, not kept on the router: concurrent requests share it
+		return best[2], report
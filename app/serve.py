@@ -0,0 +1,136 @@
+"""Pre-fork multi-worker server.
+
+Usage: python -m app.serve [--workers N] [--host H] [--port P]
+
+The master binds the listening socket, imports ``app.main`` and runs its
+warm-up (building the BM25 index, summarizer corpora and analyzer caches) to
+completion, then forks the
+workers. Their heaps start as copy-on-write views of the master's, so the
+indices are paid for once instead of per worker. ``gc.freeze()`` moves those
+objects out of the collector's generations so a worker's GC pass does not
+write to (and thereby un-share) every page it scans.
+"""
+from typing import Dict
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from app.config import SERVE_HOST, SERVE_PORT, WEB_CONCURRENCY, WORKER_RESTART_DELAY_S
+
+logger = logging.getLogger(__name__)
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+	family = socket.AF_INET6 if ":" in host else socket.AF_INET
+	sock = socket.socket(family, socket.SOCK_STREAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind((host, port))
+	sock.listen(backlog)
+	sock.set_inheritable(True)
+	return sock
+
+
+def preload() -> None:
+	"""Build and warm everything shared, then freeze it for copy-on-write."""
+	started = time.perf_counter()
+	from app.main import warm_up
+
+	# Shard processes are started per worker (see `app.main.lifespan`), not forked idle from here
+	warm_up(start_shards=False)
+	gc.collect()
+	if hasattr(gc, "freeze"):
+		gc.freeze()
+	logger.info("Preloaded app in %.0f ms", (time.perf_counter() - started) * 1000.0)
+
+
+def run_worker(sock: socket.socket, log_level: str = "info") -> None:
+	import uvicorn
+
+	from app.main import app
+
+	config = uvicorn.Config(app, log_level=log_level, access_log=False, lifespan="on")
+	uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+	"""Forks ``workers`` server processes on a shared socket and keeps them alive."""
+
+	def __init__(self, sock: socket.socket, workers: int, restart_delay_s: float = WORKER_RESTART_DELAY_S, log_level: str = "info") -> None:
+		self.sock = sock
+		self.workers = max(1, workers)
+		self.restart_delay_s = restart_delay_s
+		self.log_level = log_level
+		self.children: Dict[int, int] = {}  # pid -> worker slot
+		self.stopping = False
+
+	def spawn(self, slot: int) -> int:
+		pid = os.fork()
+		if pid == 0:
+			signal.signal(signal.SIGINT, signal.SIG_DFL)
+			signal.signal(signal.SIGTERM, signal.SIG_DFL)
+			code = 0
+			try:
+				run_worker(self.sock, self.log_level)
+			except BaseException:
+				logger.exception("Worker %d crashed", slot)
+				code = 1
+			finally:
+				os._exit(code)
+		self.children[pid] = slot
+		logger.info("Started worker %d (pid %d)", slot, pid)
+		return pid
+
+	def stop(self, signum=None, frame=None) -> None:
+		self.stopping = True
+		for pid in list(self.children):
+			try:
+				os.kill(pid, signal.SIGTERM)
+			except ProcessLookupError:
+				pass
+
+	def run(self) -> int:
+		signal.signal(signal.SIGTERM, self.stop)
+		signal.signal(signal.SIGINT, self.stop)
+		for slot in range(self.workers):
+			self.spawn(slot)
+		while self.children:
+			try:
+				pid, status = os.wait()
+			except ChildProcessError:
+				break
+			except InterruptedError:
+				continue
+			slot = self.children.pop(pid, None)
+			if slot is None or self.stopping:
+				continue
+			logger.warning("Worker %d (pid %d) exited with status %d; restarting", slot, pid, status)
+			time.sleep(self.restart_delay_s)
+			if not self.stopping:
+				self.spawn(slot)
+		self.sock.close()
+		return 0
+
+
+def main(argv=None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+	parser.add_argument("--host", default=SERVE_HOST)
+	parser.add_argument("--port", type=int, default=SERVE_PORT)
+	parser.add_argument("--log-level", default="info")
+	args = parser.parse_args(argv)
+	logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(process)d %(name)s %(message)s")
+	sock = bind_socket(args.host, args.port)
+	preload()
+	if args.workers <= 1:
+		run_worker(sock, args.log_level)
+		return 0
+	return Supervisor(sock, args.workers, log_level=args.log_level).run()
+
+
+if __name__ == "__main__":
+	sys.exit(main())
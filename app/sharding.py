@@ -0,0 +1,340 @@
+"""Sharded scatter-gather BM25 retrieval over local shard processes.
+
+Usage: python -m app.sharding build --shards N [--knowledge-dir DIR] [--out PATH]
+
+The corpus is split into N contiguous document ranges, each indexed by its own
+`BM25Index` in its own process (or thread). On start the shards report their
+document count, total length and per-term document frequencies; the
+coordinator merges them into the collection's idf and average document length
+and hands each shard the idf of its terms, so shards score exactly as a single
+index over the whole corpus (up to the summation order of the negative-idf
+floor). A query is analyzed once, scattered to every shard in parallel and
+the per-shard top-k lists are merged into the global top-k, ties going to the
+lower document id as with one index.
+
+``build`` writes one snapshot per shard (see `shard_paths`); each shard process
+maps only its own, and the coordinator maps only their documents.
+"""
+from collections.abc import Sequence as SequenceABC
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import argparse
+import bisect
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import weakref
+
+import numpy as np
+
+from app.analysis import analyze, analyze_query
+from app.bm25 import (
+	BM25Index,
+	cleaned_knowledge,
+	knowledge_paths,
+	load_corpus,
+	load_snapshot,
+	okapi_idf,
+	source_fingerprint,
+	top_k,
+	write_snapshot,
+)
+from app.config import BM25_SNAPSHOT_PATH, KNOWLEDGE_DIR
+from app.corpus import CorpusStore
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def shard_ranges(n_docs: int, n_shards: int) -> List[Tuple[int, int]]:
+	"""Contiguous [start, end) document ranges of near-equal size."""
+	n_shards = max(1, min(n_shards, n_docs or 1))
+	bounds = [n_docs * i // n_shards for i in range(n_shards + 1)]
+	return list(zip(bounds[:-1], bounds[1:]))
+
+
+def shard_paths(base: str, n_shards: int) -> List[str]:
+	"""Snapshot path of each shard, e.g. ``bm25.shard0-of-4.snap`` next to ``bm25.snap``."""
+	root, ext = os.path.splitext(base)
+	return [f"{root}.shard{i}-of-{n_shards}{ext}" for i in range(n_shards)]
+
+
+@dataclass
+class ShardSpec:
+	"""How a shard process gets its index: a snapshot ``path`` or ``documents`` to index."""
+
+	shard_id: int
+	offset: int
+	path: str = ""
+	documents: Optional[Sequence[str]] = None
+
+
+@dataclass
+class ShardStats:
+	"""What a shard contributes to the collection statistics."""
+
+	n_docs: int
+	total_len: int
+	terms: Sequence[str]
+	doc_freq: np.ndarray
+	epsilon: float
+
+
+class Shard:
+	"""One shard's index; global document id = ``offset`` + local id."""
+
+	def __init__(self, index: BM25Index, offset: int) -> None:
+		self.index = index
+		self.offset = offset
+
+	@classmethod
+	def load(cls, spec: ShardSpec) -> "Shard":
+		if spec.path:
+			loaded = load_snapshot(spec.path)
+			if loaded is None:
+				raise RuntimeError(f"shard snapshot {spec.path} is missing or stale")
+			return cls(loaded[1], spec.offset)
+		return cls(BM25Index.from_corpus([analyze(doc) for doc in spec.documents or ()]), spec.offset)
+
+	def stats(self) -> ShardStats:
+		index = self.index
+		return ShardStats(index.corpus_size, int(index.doc_len.sum()), list(index.terms), index.doc_freq, index.epsilon)
+
+	def set_collection_stats(self, idf: np.ndarray, avgdl: float) -> None:
+		self.index.set_collection_stats(idf, avgdl)
+
+	def search(self, tokens: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+		scores = self.index.get_scores(tokens)
+		ids = top_k(scores, k)
+		return ids + self.offset, scores[ids]
+
+
+# Shards living in this process, by key. A shard process holds exactly one;
+# in thread mode the coordinator's process holds them all.
+_SHARDS: Dict[str, Shard] = {}
+
+
+def _load_shard(key: str, spec: ShardSpec) -> None:
+	_SHARDS[key] = Shard.load(spec)
+
+
+def _call(key: str, method: str, args: tuple):
+	return getattr(_SHARDS[key], method)(*args)
+
+
+def merge_stats(stats: Sequence[ShardStats]) -> Tuple[Dict[str, float], float]:
+	"""Collection idf and average document length from the shards' statistics."""
+	n_docs = sum(s.n_docs for s in stats)
+	doc_freq: Dict[str, int] = {}
+	for s in stats:
+		for term, freq in zip(s.terms, s.doc_freq.tolist()):
+			doc_freq[term] = doc_freq.get(term, 0) + freq
+	avgdl = float(sum(s.total_len for s in stats)) / n_docs if n_docs else 0.0
+	return okapi_idf(doc_freq, n_docs, stats[0].epsilon if stats else 0.25), avgdl
+
+
+def merge_results(parts: Sequence[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+	"""Global top ``k`` (ids, scores) from the shards' top-k lists."""
+	if not parts:
+		return np.zeros(0, dtype=np.int64), np.zeros(0)
+	ids = np.concatenate([p[0] for p in parts])
+	scores = np.concatenate([p[1] for p in parts])
+	order = np.lexsort((ids, -scores))[:k]
+	return ids[order], scores[order]
+
+
+class ShardedCorpus(SequenceABC):
+	"""The shards' `CorpusStore` objects read as one sequence of documents by global id."""
+
+	def __init__(self, stores: Sequence[CorpusStore]) -> None:
+		self.stores = list(stores)
+		self.offsets = [0]
+		for store in self.stores:
+			self.offsets.append(self.offsets[-1] + len(store))
+
+	def _locate(self, i: int) -> Tuple[CorpusStore, int]:
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError(i)
+		s = bisect.bisect_right(self.offsets, i) - 1
+		return self.stores[s], i - self.offsets[s]
+
+	def __len__(self) -> int:
+		return self.offsets[-1]
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [self[j] for j in range(*i.indices(len(self)))]
+		store, j = self._locate(i)
+		return store[j]
+
+	def lines(self, i: int) -> List[str]:
+		store, j = self._locate(i)
+		return store.lines(j)
+
+	def chunks(self, i: int) -> List[str]:
+		store, j = self._locate(i)
+		return store.chunks(j)
+
+
+class ShardedRAG:
+	"""`BM25RAG` interface over shards: scatter a query, gather the merged top-k.
+
+	Shard processes (``mode="process"``, forked) or threads (``"thread"``) are
+	started by `start` (or on first use); a forked server worker owns its own
+	and starts them from its lifespan (`start_all`), never the pre-fork master.
+	``documents`` stays in the coordinator for reading results.
+	"""
+
+	def __init__(self, documents: Sequence[str], specs: Sequence[ShardSpec], mode: str = "process") -> None:
+		if mode == "process" and "fork" not in multiprocessing.get_all_start_methods():
+			logger.warning("ShardedRAG: fork start method unavailable; using thread mode")
+			mode = "thread"
+		self.documents = documents
+		self.specs = list(specs)
+		self.mode = mode
+		self._keys = [f"shard:{id(self)}:{spec.shard_id}" for spec in self.specs]
+		self._pools: List[Executor] = []
+		self._lock = threading.Lock()
+		_instances.add(self)
+
+	@classmethod
+	def from_documents(cls, documents: Sequence[str], n_shards: int, mode: str = "process") -> "ShardedRAG":
+		"""Shards that index their slice of ``documents`` themselves, in parallel."""
+		docs = list(documents)
+		specs = [ShardSpec(i, a, documents=docs[a:b]) for i, (a, b) in enumerate(shard_ranges(len(docs), n_shards))]
+		return cls(CorpusStore.from_documents(docs), specs, mode)
+
+	@classmethod
+	def from_snapshots(cls, base: str, n_shards: int, mode: str = "process", knowledge_dir: str = KNOWLEDGE_DIR) -> Optional["ShardedRAG"]:
+		"""Shards over ``python -m app.sharding build`` snapshots; None if any is missing or stale."""
+		paths = knowledge_paths(knowledge_dir)
+		if not paths:
+			return None
+		source = source_fingerprint(paths)
+		stores: List[CorpusStore] = []
+		for path in shard_paths(base, n_shards):
+			store = load_corpus(path, source)
+			if store is None:
+				return None
+			stores.append(store)
+		documents = ShardedCorpus(stores)
+		specs = [ShardSpec(i, documents.offsets[i], path=path) for i, path in enumerate(shard_paths(base, n_shards))]
+		return cls(documents, specs, mode)
+
+	def _new_pool(self, key: str, spec: ShardSpec) -> Executor:
+		# One single-worker pool per shard, so a shard's index lives in exactly one process
+		if self.mode == "process":
+			ctx = multiprocessing.get_context("fork")
+			return ProcessPoolExecutor(max_workers=1, mp_context=ctx, initializer=_load_shard, initargs=(key, spec))
+		return ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"bm25-shard{spec.shard_id}", initializer=_load_shard, initargs=(key, spec))
+
+	def start(self) -> None:
+		"""Load the shards and give them the collection statistics (once per process)."""
+		with self._lock:
+			if self._pools:
+				return
+			started = time.perf_counter()
+			pools = [self._new_pool(key, spec) for key, spec in zip(self._keys, self.specs)]
+			stats = [f.result() for f in [pool.submit(_call, key, "stats", ()) for pool, key in zip(pools, self._keys)]]
+			idf, avgdl = merge_stats(stats)
+			futures = [
+				pool.submit(_call, key, "set_collection_stats", (np.array([idf[t] for t in s.terms], dtype=np.float64), avgdl))
+				for pool, key, s in zip(pools, self._keys, stats)
+			]
+			for f in futures:
+				f.result()
+			self._pools = pools
+			logger.info(
+				"ShardedRAG: %d %s shards, %d docs, %d terms ready in %.0f ms",
+				len(pools), self.mode, sum(s.n_docs for s in stats), len(idf), (time.perf_counter() - started) * 1000.0,
+			)
+
+	def search_scored(self, query: str, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+		"""Global top ``k`` (ids, scores) for ``query``."""
+		self.start()
+		tokens = list(analyze_query(query))
+		started = time.perf_counter()
+		futures = [pool.submit(_call, key, "search", (tokens, k)) for pool, key in zip(self._pools, self._keys)]
+		ids, scores = merge_results([f.result() for f in futures], k)
+		metrics.observe("shards.gather_ms", (time.perf_counter() - started) * 1000.0)
+		return ids, scores
+
+	def search_ids(self, query: str, k: int = 5) -> List[int]:
+		return self.search_scored(query, k)[0].tolist()
+
+	def search(self, query: str, k: int = 5) -> List[str]:
+		return [self.documents[i] for i in self.search_ids(query, k)]
+
+	def search_chunks(self, query: str, k: int = 5) -> List[List[str]]:
+		return [self.documents.chunks(i) for i in self.search_ids(query, k)]
+
+	def close(self) -> None:
+		with self._lock:
+			for pool in self._pools:
+				pool.shutdown(wait=False, cancel_futures=True)
+			self._pools = []
+
+
+_instances: "weakref.WeakSet[ShardedRAG]" = weakref.WeakSet()
+
+
+def _reset_after_fork() -> None:
+	# Shard processes/threads belong to the parent; a forked server worker starts its own
+	for rag in list(_instances):
+		rag._pools = []
+		rag._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+	os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def start_all() -> None:
+	"""Start the shards of every `ShardedRAG` in this process (a server worker's lifespan)."""
+	for rag in list(_instances):
+		rag.start()
+
+
+def close_all() -> None:
+	"""Stop the shards of every `ShardedRAG` in this process."""
+	for rag in list(_instances):
+		rag.close()
+
+
+def build_shards(n_shards: int, knowledge_dir: str = KNOWLEDGE_DIR, out: str = BM25_SNAPSHOT_PATH) -> List[str]:
+	"""Clean and index the knowledge files into ``n_shards`` snapshots; returns their paths."""
+	source = source_fingerprint(knowledge_paths(knowledge_dir))
+	docs, report = cleaned_knowledge(knowledge_dir)
+	paths = shard_paths(out, n_shards)
+	for path, (a, b) in zip(paths, shard_ranges(len(docs), n_shards)):
+		shard_docs = docs[a:b]
+		write_snapshot(path, shard_docs, BM25Index.from_corpus([analyze(d) for d in shard_docs]), source, report)
+	return paths
+
+
+def main(argv=None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	sub = parser.add_subparsers(dest="cmd", required=True)
+	build = sub.add_parser("build", help="clean, analyze and index the knowledge files into one snapshot per shard")
+	build.add_argument("--shards", type=int, required=True)
+	build.add_argument("--knowledge-dir", default=KNOWLEDGE_DIR)
+	build.add_argument("--out", default=BM25_SNAPSHOT_PATH, help="base snapshot path; shard paths are derived from it")
+	args = parser.parse_args(argv)
+	if not args.out:
+		parser.error("--out is required when BM25_SNAPSHOT_PATH is empty")
+	started = time.perf_counter()
+	paths = build_shards(args.shards, args.knowledge_dir, args.out)
+	for path in paths:
+		print(f"wrote {path}: {os.path.getsize(path)} bytes")
+	print(f"{len(paths)} shards in {(time.perf_counter() - started) * 1000.0:.0f} ms")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,152 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+import logging
+import random
+import threading
+
+from app.config import (
+	SLO_EWMA_ALPHA,
+	SLO_LATENCY_MS,
+	SLO_MAX_ERROR_RATE,
+	SLO_PROBE_FRACTION,
+	SLO_SHIFT_STEP,
+	SLO_WINDOW,
+)
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RouteStats:
+	"""Rolling latency and error statistics of one route in constant memory.
+
+	``mean_ms`` and ``error_rate`` are EWMAs; ``p95_ms`` is the 95th percentile
+	of the last ``window`` latencies, so a spike (or its end) shows up within
+	``window`` requests instead of being averaged away.
+	"""
+
+	__slots__ = ("alpha", "q", "samples", "mean_ms", "error_rate", "_recent", "_recent_errors")
+
+	def __init__(self, alpha: float = 0.1, q: float = 0.95, window: int = 100) -> None:
+		self.alpha = alpha
+		self.q = q
+		self.samples = 0
+		self.mean_ms = 0.0
+		self.error_rate = 0.0
+		self._recent: Deque[float] = deque(maxlen=window)
+		self._recent_errors: Deque[bool] = deque(maxlen=window)
+
+	def observe(self, ms: float, error: bool = False) -> None:
+		self.mean_ms = ms if self.samples == 0 else self.mean_ms + self.alpha * (ms - self.mean_ms)
+		self.error_rate += self.alpha * ((1.0 if error else 0.0) - self.error_rate)
+		self._recent.append(ms)
+		self._recent_errors.append(error)
+		self.samples += 1
+
+	def recent_ok(self, n: int, limit_ms: float) -> bool:
+		"""Whether the last ``n`` calls all succeeded under ``limit_ms``."""
+		if len(self._recent) < n:
+			return False
+		tail = range(len(self._recent) - n, len(self._recent))
+		return all(self._recent[i] < limit_ms and not self._recent_errors[i] for i in tail)
+
+	@property
+	def p95_ms(self) -> float:
+		if not self._recent:
+			return 0.0
+		ordered = sorted(self._recent)
+		return ordered[min(len(ordered) - 1, int(self.q * len(ordered)))]
+
+
+class SLORouter:
+	"""Shifts traffic away from routes that break their latency or error SLO.
+
+	Every observation of a budgeted route re-evaluates it: over budget (p95 or
+	error rate) raises its shed fraction by ``step``, comfortably under budget
+	(p95 below ``recover_ratio`` x budget, or the last ``min_samples`` calls
+	all successful and that fast) lowers it by ``step``. The second test lets a
+	shed route recover from its probes alone, without waiting for the window to
+	turn over at probe traffic rates. `admit` sends
+	that fraction of requests to the caller's fallback; at least ``probe`` of
+	them always go through, so the statistics keep updating and the route
+	recovers once its backend does.
+	"""
+
+	def __init__(
+		self,
+		budgets_ms: Dict[str, float],
+		max_error_rate: float = 0.2,
+		probe: float = 0.05,
+		step: float = 0.1,
+		alpha: float = 0.1,
+		window: int = 100,
+		min_samples: int = 5,
+		recover_ratio: float = 0.8,
+		rng: Optional[random.Random] = None,
+	) -> None:
+		self.budgets_ms = dict(budgets_ms)
+		self.max_error_rate = max_error_rate
+		self.probe = probe
+		self.step = step
+		self.alpha = alpha
+		self.window = window
+		self.min_samples = min_samples
+		self.recover_ratio = recover_ratio
+		self.stats: Dict[str, RouteStats] = {}
+		self.shed: Dict[str, float] = {}
+		self._rng = rng or random.Random()
+		self._lock = threading.Lock()
+
+	def observe(self, route: str, ms: float, error: bool = False) -> None:
+		with self._lock:
+			stats = self.stats.get(route)
+			if stats is None:
+				stats = self.stats[route] = RouteStats(self.alpha, window=self.window)
+			stats.observe(ms, error)
+			p95 = stats.p95_ms
+			if route in self.budgets_ms and stats.samples >= self.min_samples:
+				self._adjust(route, stats, p95)
+		metrics.set(f"slo.p95_ms.{route}", round(p95, 3))
+		metrics.set(f"slo.error_rate.{route}", round(stats.error_rate, 4))
+
+	def _adjust(self, route: str, stats: RouteStats, p95: float) -> None:
+		budget = self.budgets_ms[route]
+		before = self.shed.get(route, 0.0)
+		healthy = stats.recent_ok(self.min_samples, self.recover_ratio * budget)
+		if not healthy and (p95 > budget or stats.error_rate > self.max_error_rate):
+			shed = min(1.0 - self.probe, before + self.step)
+		elif healthy or (p95 < self.recover_ratio * budget and stats.error_rate <= self.max_error_rate / 2):
+			shed = max(0.0, before - self.step)
+		else:
+			return
+		if shed != before:
+			self.shed[route] = shed
+			metrics.set(f"slo.shed_fraction.{route}", round(shed, 3))
+			if (before == 0.0) != (shed == 0.0):
+				logger.warning(
+					"SLO %s: %s shifting traffic (p95 %.0f ms / budget %.0f ms, errors %.0f%%)",
+					route, "started" if shed else "stopped", p95, budget, stats.error_rate * 100,
+				)
+
+	def admit(self, route: str) -> bool:
+		"""Whether this request may take ``route``; False means use its fallback."""
+		shed = self.shed.get(route, 0.0)
+		if shed > 0.0 and self._rng.random() < shed:
+			metrics.incr(f"slo.shifted.{route}")
+			return False
+		metrics.incr(f"slo.admitted.{route}")
+		return True
+
+	def report(self) -> Dict[str, Dict[str, float]]:
+		with self._lock:
+			return {
+				route: {
+					"samples": s.samples, "mean_ms": s.mean_ms, "p95_ms": s.p95_ms,
+					"error_rate": s.error_rate, "shed_fraction": self.shed.get(route, 0.0),
+				}
+				for route, s in self.stats.items()
+			}
+
+
+def create_slo_router() -> SLORouter:
+	return SLORouter(SLO_LATENCY_MS, SLO_MAX_ERROR_RATE, SLO_PROBE_FRACTION, SLO_SHIFT_STEP, SLO_EWMA_ALPHA, SLO_WINDOW)
@@ -0,0 +1,187 @@
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import logging
+import re
+import threading
+import time
+
+from app.analysis import STOPWORDS, fold_accents, tokenize
+from app.config import SPELL_MAX_DISTANCE, SPELL_MIN_LENGTH, SPELL_PREFIX_LENGTH
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+# Vocabulary words from routing rules outrank corpus words at the same distance
+_KEYWORD_COUNT = 1_000_000
+# Up to this length a word has too many one-edit neighbours ("bolo" -> "dolo",
+# "what" -> "chat"); such words are only corrected to routing keywords
+_SHORT_WORD = 5
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+	"""Optimal-string-alignment distance (adjacent swaps count 1), or ``limit + 1`` once exceeded."""
+	if abs(len(a) - len(b)) > limit:
+		return limit + 1
+	prev2: List[int] = []
+	prev = list(range(len(b) + 1))
+	for i in range(1, len(a) + 1):
+		cur = [i] + [0] * len(b)
+		best = i
+		for j in range(1, len(b) + 1):
+			cost = 0 if a[i - 1] == b[j - 1] else 1
+			v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+			if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+				v = min(v, prev2[j - 2] + 1)
+			cur[j] = v
+			best = min(best, v)
+		if best > limit:
+			return limit + 1
+		prev2, prev = prev, cur
+	return prev[-1]
+
+
+class SymSpell:
+	"""Symmetric-delete spelling correction (SymSpell).
+
+	Every vocabulary word is indexed under all strings obtained by deleting up
+	to ``max_distance`` characters from its first ``prefix_length`` characters.
+	A lookup generates the same deletes of the query and only verifies the
+	words found under them, so its cost depends on the word length, not on
+	the vocabulary size.
+	"""
+
+	def __init__(self, max_distance: int = 2, prefix_length: int = 7) -> None:
+		self.max_distance = max_distance
+		self.prefix_length = max(prefix_length, max_distance + 1)
+		self.words: Dict[str, int] = {}
+		self._deletes: Dict[str, List[str]] = {}
+
+	def __len__(self) -> int:
+		return len(self.words)
+
+	def _variants(self, word: str, distance: int) -> Set[str]:
+		prefix = word[: self.prefix_length]
+		out = {prefix}
+		frontier = {prefix}
+		for _ in range(distance):
+			frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+			out |= frontier
+		return out
+
+	def add(self, word: str, count: int = 1) -> None:
+		if word in self.words:
+			self.words[word] += count
+			return
+		self.words[word] = count
+		for key in self._variants(word, self.max_distance):
+			self._deletes.setdefault(key, []).append(word)
+
+	def lookup(self, word: str, max_distance: Optional[int] = None, min_count: int = 0) -> Optional[Tuple[str, int]]:
+		"""Closest vocabulary word (counted at least ``min_count`` times) as (word, distance).
+
+		Ties go to the more frequent word.
+		"""
+		limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+		if word in self.words:
+			return (word, 0)
+		best: Optional[Tuple[int, int, str]] = None
+		seen: Set[str] = set()
+		for key in self._variants(word, limit):
+			for candidate in self._deletes.get(key, ()):
+				if candidate in seen:
+					continue
+				seen.add(candidate)
+				if self.words[candidate] < min_count:
+					continue
+				d = edit_distance(word, candidate, limit)
+				if d <= limit:
+					rank = (d, -self.words[candidate], candidate)
+					if best is None or rank < best:
+						best = rank
+		return (best[2], best[0]) if best is not None else None
+
+	@property
+	def index_size(self) -> int:
+		return len(self._deletes)
+
+
+class QueryCorrector:
+	"""Rewrites unknown words of a message to their closest known spelling.
+
+	Words shorter than ``min_length``, capitalized words (names: "Fernando"),
+	numbers, stopwords and known words are left alone; up to 7 characters one edit is allowed, longer words up to
+	``max_distance``. Short words are only corrected to routing keywords.
+	Corrected words are written accent-folded ("tranferencia" ->
+	"transferencia"), which every keyword check and the analyzer accept.
+	"""
+
+	def __init__(self, speller: SymSpell, min_length: int = 4) -> None:
+		self.speller = speller
+		self.min_length = min_length
+		self._cache = lru_cache(maxsize=4096)(self._correct)
+
+	def _word(self, word: str) -> str:
+		if word[0].isupper():
+			return word
+		folded = fold_accents(word.lower())
+		if len(folded) < self.min_length or folded.isdigit() or folded in STOPWORDS or folded in self.speller.words:
+			return word
+		hit = self.speller.lookup(
+			folded,
+			1 if len(folded) <= 7 else self.speller.max_distance,
+			_KEYWORD_COUNT if len(folded) <= _SHORT_WORD else 0,
+		)
+		if hit is None or hit[1] == 0:
+			return word
+		return hit[0]
+
+	def _correct(self, message: str) -> str:
+		return _WORD_RE.sub(lambda m: self._word(m.group(0)), message)
+
+	def correct(self, message: str) -> str:
+		started = time.perf_counter()
+		corrected = self._cache(message)
+		metrics.observe("spell.correct_us", (time.perf_counter() - started) * 1e6)
+		if corrected != message:
+			metrics.incr("spell.corrected")
+		return corrected
+
+
+def keyword_vocabulary(phrases: Iterable[str]) -> List[str]:
+	"""Distinct folded words of routing phrases, in order."""
+	return list(dict.fromkeys(w for phrase in phrases for w in tokenize(phrase)))
+
+
+def build_speller(keywords: Iterable[str], documents: Sequence[str] = (), max_distance: int = 2, prefix_length: int = 7) -> SymSpell:
+	"""Index router/agent keyword words (boosted) and the corpus vocabulary."""
+	started = time.perf_counter()
+	speller = SymSpell(max_distance, prefix_length)
+	counts: Counter = Counter()
+	for doc in documents:
+		counts.update(tokenize(doc))
+	for word in keywords:
+		counts[word] += _KEYWORD_COUNT
+	for word, count in counts.items():
+		if not word.isdigit():
+			speller.add(word, count)
+	logger.info(
+		"Spelling index: %d words, %d delete keys in %.0f ms",
+		len(speller), speller.index_size, (time.perf_counter() - started) * 1000.0,
+	)
+	return speller
+
+
+_default: Optional[QueryCorrector] = None
+_lock = threading.Lock()
+
+
+def get_corrector(keywords: Iterable[str] = (), documents: Sequence[str] = ()) -> QueryCorrector:
+	"""Process-wide corrector, built from the first caller's keywords and corpus."""
+	global _default
+	if _default is None:
+		with _lock:
+			if _default is None:
+				_default = QueryCorrector(build_speller(keywords, documents, SPELL_MAX_DISTANCE, SPELL_PREFIX_LENGTH), SPELL_MIN_LENGTH)
+	return _default
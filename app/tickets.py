@@ -0,0 +1,215 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+import base64
+import datetime as dt
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+
+try:
+	import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+	fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+	"CREATE TABLE IF NOT EXISTS tickets ("
+	" ticket_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, created_at TEXT NOT NULL,"
+	" offset INTEGER NOT NULL, length INTEGER NOT NULL, idempotency_key TEXT)",
+	"CREATE INDEX IF NOT EXISTS tickets_user_created ON tickets (user_id, created_at, ticket_id)",
+	"CREATE UNIQUE INDEX IF NOT EXISTS tickets_idempotency ON tickets (user_id, idempotency_key) WHERE idempotency_key IS NOT NULL",
+	"CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+)
+
+
+def _encode_cursor(created_at: str, ticket_id: str) -> str:
+	return base64.urlsafe_b64encode(f"{created_at}|{ticket_id}".encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+	try:
+		created_at, _, ticket_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").partition("|")
+	except Exception:
+		raise ValueError("invalid cursor")
+	if not ticket_id:
+		raise ValueError("invalid cursor")
+	return created_at, ticket_id
+
+
+class TicketStore:
+	"""Append-only JSONL ticket log with a persistent SQLite secondary index.
+
+	The log stays the source of truth (one JSON record per line, as before);
+	the index maps ticket_id, (user_id, created_at) and (user_id,
+	idempotency key) to the record's byte offset, so lookups are B-tree
+	searches plus one seek instead of a scan. An append and its index row are
+	written under an exclusive lock on the log, so pre-forked workers can share
+	one store. Lines the index has not seen (a crash between the two writes,
+	or a log written before the index existed) are indexed when the store opens.
+	"""
+
+	def __init__(self, log_path: str, index_path: Optional[str] = None) -> None:
+		self.log_path = log_path
+		self.index_path = index_path or f"{log_path}.idx.sqlite"
+		os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+		self._lock = threading.Lock()
+		self._db = sqlite3.connect(self.index_path, check_same_thread=False, isolation_level=None)
+		self._db.execute("PRAGMA journal_mode=WAL")
+		for stmt in _SCHEMA:
+			self._db.execute(stmt)
+		with self._locked_log() as log:
+			self._catch_up(log)
+
+	@contextmanager
+	def _locked_log(self) -> Iterator:
+		with self._lock, open(self.log_path, "a+b") as log:
+			if fcntl is not None:
+				fcntl.flock(log.fileno(), fcntl.LOCK_EX)
+			try:
+				yield log
+			finally:
+				if fcntl is not None:
+					fcntl.flock(log.fileno(), fcntl.LOCK_UN)
+
+	def _indexed_upto(self) -> int:
+		row = self._db.execute("SELECT value FROM meta WHERE key = 'indexed_upto'").fetchone()
+		return row[0] if row else 0
+
+	def _catch_up(self, log) -> int:
+		"""Index complete log lines past the last indexed offset; returns how many."""
+		start = self._indexed_upto()
+		log.seek(0, os.SEEK_END)
+		if log.tell() <= start:
+			return 0
+		log.seek(start)
+		offset = start
+		added = 0
+		self._db.execute("BEGIN")
+		try:
+			for line in log:
+				if not line.endswith(b"\n"):
+					break  # torn final write from a crash mid-append: leave it unindexed
+				try:
+					rec = json.loads(line)
+					self._db.execute(
+						"INSERT OR IGNORE INTO tickets VALUES (?, ?, ?, ?, ?, ?)",
+						(rec["ticket_id"], rec["user_id"], rec["created_at"], offset, len(line), rec.get("idempotency_key")),
+					)
+					added += 1
+				except (ValueError, KeyError):
+					logger.warning("Skipping malformed ticket log line at offset %d", offset)
+				offset += len(line)
+			self._db.execute("INSERT OR REPLACE INTO meta VALUES ('indexed_upto', ?)", (offset,))
+			self._db.execute("COMMIT")
+		except BaseException:
+			self._db.execute("ROLLBACK")
+			raise
+		if added:
+			logger.info("Indexed %d ticket(s) from %s", added, self.log_path)
+		return added
+
+	def _read_at(self, offset: int, length: int) -> Dict[str, str]:
+		with open(self.log_path, "rb") as f:
+			f.seek(offset)
+			return json.loads(f.read(length))
+
+	def create(self, user_id: str, message: str, route_hint: str, idempotency_key: Optional[str] = None) -> Dict[str, str]:
+		"""Append a ticket; a repeated ``idempotency_key`` for the same user returns the original."""
+		with self._locked_log() as log:
+			# Other workers may have appended since we last looked
+			self._catch_up(log)
+			if idempotency_key:
+				row = self._db.execute(
+					"SELECT offset, length FROM tickets WHERE user_id = ? AND idempotency_key = ?",
+					(user_id, idempotency_key),
+				).fetchone()
+				if row:
+					return self._read_at(*row)
+			record = {
+				"ticket_id": f"T-{uuid.uuid4().hex[:8].upper()}",
+				"user_id": user_id,
+				"message": message,
+				"route_hint": route_hint,
+				"created_at": dt.datetime.utcnow().isoformat() + "Z",
+			}
+			if idempotency_key:
+				record["idempotency_key"] = idempotency_key
+			line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+			log.seek(0, os.SEEK_END)
+			offset = log.tell()
+			log.write(line)
+			log.flush()
+			self._db.execute("BEGIN")
+			self._db.execute(
+				"INSERT INTO tickets VALUES (?, ?, ?, ?, ?, ?)",
+				(record["ticket_id"], user_id, record["created_at"], offset, len(line), idempotency_key),
+			)
+			self._db.execute("INSERT OR REPLACE INTO meta VALUES ('indexed_upto', ?)", (offset + len(line),))
+			self._db.execute("COMMIT")
+		return record
+
+	def get(self, ticket_id: str) -> Optional[Dict[str, str]]:
+		with self._lock:
+			row = self._db.execute("SELECT offset, length FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+		return self._read_at(*row) if row else None
+
+	def list_for_user(self, user_id: str, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+		"""A page of the user's tickets, newest first, plus the cursor of the next page.
+
+		Keyset pagination on the (user_id, created_at, ticket_id) index: every
+		page is one index range scan, however deep the client pages.
+		"""
+		limit = max(1, limit)
+		sql = "SELECT created_at, ticket_id, offset, length FROM tickets WHERE user_id = ?"
+		params: list = [user_id]
+		if cursor:
+			created_at, ticket_id = _decode_cursor(cursor)
+			sql += " AND (created_at, ticket_id) < (?, ?)"
+			params += [created_at, ticket_id]
+		sql += " ORDER BY created_at DESC, ticket_id DESC LIMIT ?"
+		params.append(limit + 1)
+		with self._lock:
+			rows = self._db.execute(sql, params).fetchall()
+		page = rows[:limit]
+		tickets = [self._read_at(offset, length) for _, _, offset, length in page]
+		next_cursor = _encode_cursor(page[-1][0], page[-1][1]) if len(rows) > limit else None
+		return tickets, next_cursor
+
+	def close(self) -> None:
+		with self._lock:
+			self._db.close()
+
+
+_stores: Dict[str, TicketStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_ticket_store(log_path: str) -> TicketStore:
+	"""One store per log path (tests and reloaded configs point at other files)."""
+	with _stores_lock:
+		store = _stores.get(log_path)
+		if store is None:
+			store = _stores[log_path] = TicketStore(log_path)
+		return store
+
+
+_idempotency_key: ContextVar[Optional[str]] = ContextVar("idempotency_key", default=None)
+
+
+def current_idempotency_key() -> Optional[str]:
+	return _idempotency_key.get()
+
+
+@contextmanager
+def idempotency_scope(key: Optional[str]) -> Iterator[None]:
+	"""Make the request's Idempotency-Key visible to ticket creation deeper in the call stack."""
+	token = _idempotency_key.set(key or None)
+	try:
+		yield
+	finally:
+		_idempotency_key.reset(token)
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+import asyncio
+import codecs
+import logging
+import time
+
+from app.analysis import analyze, analyze_query
+from app.config import (
+	ENRICH_TOP_K,
+	ENRICH_MAX_BYTES,
+	ENRICH_PAGE_TIMEOUT_MS,
+	ENRICH_SUMMARY_SENTENCES,
+	ENRICH_CACHE_SIZE,
+	ENRICH_CACHE_TTL_S,
+)
+from app.context_packer import bm25_scores, split_sentences
+from app.deadline import current_deadline
+from app.metrics import metrics
+from app.tools.html_extract import StreamingTextExtractor
+
+if TYPE_CHECKING:  # httpx is imported when enrichment first runs
+	import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class PageCache:
+	"""Small TTL + LRU cache of extracted page text keyed by URL."""
+
+	def __init__(self, max_items: int = 256, ttl_seconds: float = 600.0) -> None:
+		self.max_items = max_items
+		self.ttl_seconds = ttl_seconds
+		self._items: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+	def get(self, url: str) -> Optional[str]:
+		item = self._items.get(url)
+		if item is None:
+			return None
+		stored_at, text = item
+		if time.monotonic() - stored_at > self.ttl_seconds:
+			del self._items[url]
+			return None
+		self._items.move_to_end(url)
+		return text
+
+	def put(self, url: str, text: str) -> None:
+		self._items[url] = (time.monotonic(), text)
+		self._items.move_to_end(url)
+		while len(self._items) > self.max_items:
+			self._items.popitem(last=False)
+
+
+page_cache = PageCache(ENRICH_CACHE_SIZE, ENRICH_CACHE_TTL_S)
+
+
+async def fetch_page_text(client: "httpx.AsyncClient", url: str, max_bytes: int = ENRICH_MAX_BYTES) -> str:
+	"""Stream a page and extract its visible text, reading at most ``max_bytes``."""
+	parser = StreamingTextExtractor()
+	received = 0
+	async with client.stream("GET", url, headers={"User-Agent": "Mozilla/5.0"}, follow_redirects=True) as resp:
+		resp.raise_for_status()
+		if "html" not in resp.headers.get("content-type", "text/html"):
+			return ""
+		decoder = codecs.getincrementaldecoder(resp.charset_encoding or "utf-8")(errors="replace")
+		async for chunk in resp.aiter_bytes():
+			chunk = chunk[: max_bytes - received]
+			received += len(chunk)
+			parser.feed(decoder.decode(chunk))
+			if received >= max_bytes:
+				metrics.incr("enrich.truncated")
+				break
+	parser.feed(decoder.decode(b"", final=True))
+	parser.close()
+	return parser.text()
+
+
+async def _fetch_cached(client: "httpx.AsyncClient", url: str, timeout: float, max_bytes: int) -> str:
+	cached = page_cache.get(url)
+	if cached is not None:
+		metrics.incr("enrich.cache_hit")
+		return cached
+	try:
+		text = await asyncio.wait_for(fetch_page_text(client, url, max_bytes), timeout=timeout)
+	except asyncio.TimeoutError:
+		metrics.incr("enrich.page_timeout")
+		return ""
+	except Exception:
+		metrics.incr("enrich.page_error")
+		return ""
+	page_cache.put(url, text)
+	return text
+
+
+def extractive_summary(query: str, pages: Sequence[Tuple[str, str]], max_sentences: int = ENRICH_SUMMARY_SENTENCES) -> List[Tuple[str, str]]:
+	"""Top query-relevant sentences across pages as (sentence, url), BM25-ranked."""
+	sentences: List[Tuple[str, str]] = []
+	for url, text in pages:
+		for sent in split_sentences(text):
+			# Skip menu crumbs and walls of text alike
+			if 30 <= len(sent) <= 400:
+				sentences.append((sent, url))
+	query_terms = list(analyze_query(query))
+	if not sentences or not query_terms:
+		return []
+	scores = bm25_scores([analyze(s) for s, _ in sentences], query_terms)
+	picked: List[Tuple[str, str]] = []
+	seen = set()
+	for i in sorted(range(len(sentences)), key=lambda i: (-scores[i], i)):
+		if scores[i] <= 0 or len(picked) >= max_sentences:
+			break
+		key = sentences[i][0].lower()
+		if key in seen:
+			continue
+		seen.add(key)
+		picked.append(sentences[i])
+	return picked
+
+
+async def enrich_results(
+	query: str,
+	items: Sequence[Tuple[str, str]],
+	top_k: int = ENRICH_TOP_K,
+	page_timeout_ms: float = ENRICH_PAGE_TIMEOUT_MS,
+	max_bytes: int = ENRICH_MAX_BYTES,
+	client: Optional["httpx.AsyncClient"] = None,
+) -> str:
+	"""Fetch the top-k result pages concurrently and summarize them for ``query``.
+
+	Each page gets ``page_timeout_ms`` (never more than the request deadline
+	leaves) and ``max_bytes``; slow or failing pages are skipped. Returns ""
+	when nothing relevant was extracted.
+	"""
+	urls = [url for _, url in items[:top_k]]
+	timeout = current_deadline().timeout(page_timeout_ms / 1000.0)
+	if not urls or not timeout:
+		return ""
+	started = time.perf_counter()
+	own_client = client is None
+	if own_client:
+		import httpx
+
+		client = httpx.AsyncClient(timeout=timeout)
+	try:
+		texts = await asyncio.gather(*(_fetch_cached(client, url, timeout, max_bytes) for url in urls))
+	finally:
+		if own_client:
+			await client.aclose()
+	metrics.observe("enrich.fetch_ms", (time.perf_counter() - started) * 1000.0)
+	picked = extractive_summary(query, [(u, t) for u, t in zip(urls, texts) if t])
+	if not picked:
+		return ""
+	sources: List[str] = []
+	for _, url in picked:
+		if url not in sources:
+			sources.append(url)
+	return "\n".join(s for s, _ in picked) + "\nFontes: " + ", ".join(sources)
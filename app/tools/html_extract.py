@@ -0,0 +1,256 @@
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+import re
+
+from app.config import HTML_PARSER
+
+logger = logging.getLogger(__name__)
+
+# Elements whose text is never visible to a reader
+_SKIP_TAGS = frozenset({"script", "style", "noscript", "template", "svg", "head", "iframe"})
+# Elements that imply a line break around their content
+_BLOCK_TAGS = frozenset({
+	"p", "div", "br", "li", "ul", "ol", "section", "article", "header", "footer", "nav", "aside",
+	"h1", "h2", "h3", "h4", "h5", "h6", "tr", "td", "th", "table", "main", "blockquote", "pre",
+})
+_WS_RE = re.compile(r"[ \t\r\f\v]+")
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset=[\"']?([A-Za-z0-9_-]+)", re.I)
+
+BACKENDS = ("selectolax", "lxml", "stdlib")
+
+
+@lru_cache(maxsize=None)
+def _selectolax_tree() -> Any:
+	# Imported on first parse rather than at startup. Lexbor is the maintained
+	# selectolax engine (>= 0.3); older releases only ship Modest
+	try:
+		from selectolax.lexbor import LexborHTMLParser  # type: ignore
+		return LexborHTMLParser
+	except Exception:  # pragma: no cover
+		try:
+			from selectolax.parser import HTMLParser as ModestHTMLParser  # type: ignore
+			return ModestHTMLParser
+		except Exception:
+			return None
+
+
+@lru_cache(maxsize=None)
+def _lxml_etree() -> Any:
+	try:
+		from lxml import etree  # type: ignore
+		return etree
+	except Exception:  # pragma: no cover
+		return None
+
+
+def available_backends() -> List[str]:
+	found = []
+	if _selectolax_tree() is not None:
+		found.append("selectolax")
+	if _lxml_etree() is not None:
+		found.append("lxml")
+	found.append("stdlib")
+	return found
+
+
+def _pick(preferred: str, allowed: Sequence[str]) -> str:
+	available = [b for b in available_backends() if b in allowed]
+	if preferred in available:
+		return preferred
+	if preferred not in ("", "auto"):
+		logger.debug("HTML backend %s unavailable; using %s", preferred, available[0])
+	return available[0]
+
+
+def _normalize_lines(raw: str) -> str:
+	lines = (_WS_RE.sub(" ", line).strip() for line in raw.split("\n"))
+	return "\n".join(line for line in lines if line)
+
+
+def _class_matches(value: Optional[str], classes: frozenset) -> bool:
+	return bool(value) and not classes.isdisjoint(value.split())
+
+
+class _TextSink:
+	"""SAX-style target collecting visible text; shared by the stdlib and lxml backends."""
+
+	def __init__(self) -> None:
+		self._skip_depth = 0
+		self._parts: List[str] = []
+
+	def start(self, tag: str, attrib: Dict[str, str]) -> None:
+		if tag in _SKIP_TAGS:
+			self._skip_depth += 1
+		elif tag in _BLOCK_TAGS:
+			self._parts.append("\n")
+
+	def end(self, tag: str) -> None:
+		if tag in _SKIP_TAGS:
+			if self._skip_depth:
+				self._skip_depth -= 1
+		elif tag in _BLOCK_TAGS:
+			self._parts.append("\n")
+
+	def data(self, data: str) -> None:
+		if not self._skip_depth:
+			self._parts.append(data)
+
+	def close(self) -> str:
+		return _normalize_lines("".join(self._parts))
+
+
+class _LinkSink:
+	"""SAX-style target collecting (href, text) of anchors carrying one of ``classes``."""
+
+	def __init__(self, classes: Iterable[str]) -> None:
+		self.classes = frozenset(classes)
+		self.links: List[Tuple[str, str]] = []
+		self._href: Optional[str] = None
+		self._text: List[str] = []
+
+	def start(self, tag: str, attrib: Dict[str, str]) -> None:
+		if tag == "a" and _class_matches(attrib.get("class"), self.classes):
+			self._href = attrib.get("href") or ""
+			self._text = []
+
+	def end(self, tag: str) -> None:
+		if tag == "a" and self._href is not None:
+			self.links.append((self._href, " ".join("".join(self._text).split())))
+			self._href = None
+
+	def data(self, data: str) -> None:
+		if self._href is not None:
+			self._text.append(data)
+
+	def close(self) -> List[Tuple[str, str]]:
+		return self.links
+
+
+class _StdlibDriver(HTMLParser):
+	"""Feeds stdlib tokenizer events into a sink."""
+
+	def __init__(self, sink) -> None:
+		super().__init__(convert_charrefs=True)
+		self.sink = sink
+
+	def handle_starttag(self, tag, attrs):
+		self.sink.start(tag, {k: v or "" for k, v in attrs})
+
+	def handle_startendtag(self, tag, attrs):
+		self.sink.start(tag, {k: v or "" for k, v in attrs})
+		if tag not in _SKIP_TAGS:
+			self.sink.end(tag)
+
+	def handle_endtag(self, tag):
+		self.sink.end(tag)
+
+	def handle_data(self, data):
+		self.sink.data(data)
+
+
+class StreamingTextExtractor:
+	"""Incremental visible-text extractor: feed decoded HTML as it arrives.
+
+	No tree is built, so memory stays bounded by the text kept rather than the
+	document size. Uses lxml's event target when installed, else the stdlib
+	tokenizer.
+	"""
+
+	def __init__(self, backend: str = HTML_PARSER) -> None:
+		self.backend = _pick(backend, ("lxml", "stdlib"))
+		self._sink = _TextSink()
+		if self.backend == "lxml":
+			self._parser = _lxml_etree().HTMLParser(target=self._sink)
+		else:
+			self._parser = _StdlibDriver(self._sink)
+		self._text: Optional[str] = None
+
+	def feed(self, data: str) -> None:
+		if data:
+			self._parser.feed(data)
+
+	def close(self) -> None:
+		if self._text is None:
+			try:
+				self._parser.close()
+			except Exception:
+				# lxml raises on empty/garbage input; whatever was collected stands
+				pass
+			self._text = self._sink.close()
+
+	def text(self) -> str:
+		self.close()
+		return self._text or ""
+
+
+def html_to_text(chunks: Iterable[str], backend: str = HTML_PARSER) -> str:
+	"""Visible text of an HTML document given as one or more decoded chunks."""
+	parser = StreamingTextExtractor(backend)
+	for chunk in chunks:
+		parser.feed(chunk)
+	return parser.text()
+
+
+def _selectolax_text(html: str) -> str:
+	tree = _selectolax_tree()(html)
+	tree.strip_tags(list(_SKIP_TAGS))
+	root = tree.body or tree.root
+	if root is None:
+		return ""
+	parts: List[str] = []
+	for node in root.traverse(include_text=True):
+		tag = node.tag
+		if tag == "-text":
+			parts.append(node.text_content or "")
+		elif tag in _BLOCK_TAGS:
+			parts.append("\n")
+	return _normalize_lines("".join(parts))
+
+
+def visible_text(html: str, backend: str = HTML_PARSER) -> str:
+	"""Visible text of a complete document using the fastest available backend."""
+	chosen = _pick(backend, BACKENDS)
+	if chosen == "selectolax":
+		return _selectolax_text(html)
+	return html_to_text([html], chosen)
+
+
+def extract_links(html: str, classes: Iterable[str], backend: str = HTML_PARSER) -> List[Tuple[str, str]]:
+	"""(href, text) of anchors whose class list intersects ``classes``, in document order."""
+	classes = frozenset(classes)
+	chosen = _pick(backend, BACKENDS)
+	if chosen == "selectolax":
+		selector = ", ".join(f"a.{c}" for c in sorted(classes))
+		return [
+			(node.attributes.get("href") or "", " ".join(node.text(deep=True).split()))
+			for node in _selectolax_tree()(html).css(selector)
+		]
+	sink = _LinkSink(classes)
+	if chosen == "lxml":
+		parser = _lxml_etree().HTMLParser(target=sink)
+		parser.feed(html)
+		try:
+			parser.close()
+		except Exception:
+			pass
+	else:
+		driver = _StdlibDriver(sink)
+		driver.feed(html)
+		driver.close()
+	return sink.links
+
+
+def decode_html(content: bytes, content_type: str = "") -> str:
+	"""Decode HTML bytes using the header charset, then <meta charset>, then UTF-8."""
+	charset = ""
+	if "charset=" in content_type:
+		charset = content_type.split("charset=", 1)[1].split(";")[0].strip(" \"'")
+	if not charset:
+		m = _META_CHARSET_RE.search(content[:4096])
+		charset = m.group(1).decode("ascii") if m else "utf-8"
+	try:
+		return content.decode(charset, errors="replace")
+	except LookupError:
+		return content.decode("utf-8", errors="replace")
@@ -1,10 +1,29 @@
-import httpx
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
 from urllib.parse import urlparse, urlunparse, parse_qs
-from bs4 import BeautifulSoup
+import asyncio
+import logging
+import time
+
+from app.config import WEBSEARCH_HEDGE_MS, WEBSEARCH_PROVIDERS
+from app.deadline import current_deadline
+from app.metrics import metrics
+from app.slo import RouteStats
+from app.tools.html_extract import extract_links
+
+if TYPE_CHECKING:  # httpx is imported on first search, not at startup
+	import httpx
+
+logger = logging.getLogger(__name__)
+
+Item = Tuple[str, str]
 
 DDG_HTML = "https://html.duckduckgo.com/html/"
 DDG_IA = "https://api.duckduckgo.com/"
+# DuckDuckGo html endpoint uses anchors with class result__a inside .result;
+# the other classes broaden the match for robustness
+_RESULT_LINK_CLASSES = ("result__a", "result__url", "result__title")
+# Upper bound per search; the request deadline may shorten it further
+SEARCH_TIMEOUT_SECONDS = 10.0
 
 
 def _normalize_url(url: str) -> str:
@@ -26,12 +45,9 @@ def _normalize_url(url: str) -> str:
 
 
 def _extract_results_from_html(html: str) -> List[Tuple[str, str]]:
-	soup = BeautifulSoup(html, "html.parser")
 	results: List[Tuple[str, str]] = []
-	# DuckDuckGo html endpoint uses anchors with class result__a inside .result
-	for a in soup.select("a.result__a, a.result__url, a.result__title"):  # broaden selectors for robustness
-		href = a.get("href") or ""
-		title = a.get_text(strip=True)
+	# Only the result anchors are needed, so no document tree is built
+	for href, title in extract_links(html, _RESULT_LINK_CLASSES):
 		if not href:
 			continue
 		norm = _normalize_url(href)
@@ -51,13 +67,13 @@ def _extract_results_from_html(html: str) -> List[Tuple[str, str]]:
 	return dedup
 
 
-async def _search_duckduckgo_html(client: httpx.AsyncClient, query: str) -> List[Tuple[str, str]]:
+async def _search_duckduckgo_html(client: "httpx.AsyncClient", query: str) -> List[Tuple[str, str]]:
 	resp = await client.get(DDG_HTML, params={"q": query}, headers={"User-Agent": "Mozilla/5.0"})
 	resp.raise_for_status()
 	return _extract_results_from_html(resp.text)
 
 
-async def _search_duckduckgo_ia(client: httpx.AsyncClient, query: str) -> List[Tuple[str, str]]:
+async def _search_duckduckgo_ia(client: "httpx.AsyncClient", query: str) -> List[Tuple[str, str]]:
 	# Fallback to Instant Answer API (limited but deterministic)
 	resp = await client.get(DDG_IA, params={"q": query, "format": "json", "no_html": 1, "no_redirect": 1})
 	resp.raise_for_status()
@@ -72,21 +88,156 @@ async def _search_duckduckgo_ia(client: httpx.AsyncClient, query: str) -> List[T
 	return results
 
 
-async def web_search(query: str, top_k: int = 3) -> List[str]:
-	items: List[Tuple[str, str]] = []
+class SearchProvider:
+	"""A web search backend returning (title, url) pairs; raising or [] means no usable result."""
+
+	name = "provider"
+
+	async def search(self, client: "httpx.AsyncClient", query: str) -> List[Item]:
+		raise NotImplementedError
+
+
+class DuckDuckGoHTML(SearchProvider):
+	name = "ddg_html"
+
+	async def search(self, client: "httpx.AsyncClient", query: str) -> List[Item]:
+		return await _search_duckduckgo_html(client, query)
+
+
+class DuckDuckGoInstantAnswer(SearchProvider):
+	name = "ddg_ia"
+
+	async def search(self, client: "httpx.AsyncClient", query: str) -> List[Item]:
+		return await _search_duckduckgo_ia(client, query)
+
+
+class StubProvider(SearchProvider):
+	"""Offline provider for tests and benchmarks: fixed results after ``latency_ms``, or a failure."""
+
+	def __init__(self, name: str, items: Sequence[Item] = (), latency_ms: float = 0.0, fail: bool = False) -> None:
+		self.name = name
+		self.items = list(items)
+		self.latency_ms = latency_ms
+		self.fail = fail
+		self.calls = 0
+
+	async def search(self, client, query: str) -> List[Item]:
+		self.calls += 1
+		await asyncio.sleep(self.latency_ms / 1000.0)
+		if self.fail:
+			raise RuntimeError(f"{self.name} unavailable")
+		return list(self.items)
+
+
+PROVIDERS = {cls.name: cls for cls in (DuckDuckGoHTML, DuckDuckGoInstantAnswer)}
+
+
+class HedgedSearch:
+	"""Queries providers as hedged requests; the first non-empty result wins.
+
+	Provider ``i + 1`` starts ``hedge_ms`` after provider ``i`` (0: all at
+	once; None: only after it failed), or as soon as every running provider
+	has failed or come back empty. Losers are cancelled. Latency and errors of
+	each provider are tracked in `RouteStats` and exported as ``websearch.*``
+	metrics; cancelled calls count under ``websearch.cancelled.<name>``.
+	"""
+
+	def __init__(self, providers: Sequence[SearchProvider], hedge_ms: Optional[float] = 300.0) -> None:
+		self.providers = list(providers)
+		self.hedge_ms = hedge_ms
+		self.stats: Dict[str, RouteStats] = {p.name: RouteStats() for p in self.providers}
+
+	async def _timed(self, provider: SearchProvider, client, query: str) -> List[Item]:
+		started = time.perf_counter()
+		try:
+			items = await provider.search(client, query)
+		except asyncio.CancelledError:
+			metrics.incr(f"websearch.cancelled.{provider.name}")
+			raise
+		except Exception as exc:
+			self._record(provider.name, started, error=True)
+			logger.debug("web search provider %s failed: %s", provider.name, exc)
+			return []
+		self._record(provider.name, started, error=False)
+		if not items:
+			metrics.incr(f"websearch.empty.{provider.name}")
+		return items
+
+	def _record(self, name: str, started: float, error: bool) -> None:
+		ms = (time.perf_counter() - started) * 1000.0
+		stats = self.stats[name]
+		stats.observe(ms, error)
+		metrics.observe(f"websearch.ms.{name}", ms)
+		metrics.set(f"websearch.p95_ms.{name}", round(stats.p95_ms, 3))
+		if error:
+			metrics.incr(f"websearch.errors.{name}")
+
+	async def search(self, client, query: str) -> Tuple[List[Item], Optional[str]]:
+		"""Items of the first provider with results and its name, or ([], None)."""
+		loop = asyncio.get_running_loop()
+		waiting = list(self.providers)
+		running: Dict["asyncio.Task[List[Item]]", str] = {}
+		next_start = loop.time()
+		try:
+			while waiting or running:
+				hedge_due = self.hedge_ms is not None and loop.time() >= next_start
+				if waiting and (not running or hedge_due):
+					provider = waiting.pop(0)
+					running[asyncio.ensure_future(self._timed(provider, client, query))] = provider.name
+					next_start = loop.time() + (self.hedge_ms or 0.0) / 1000.0
+					continue
+				timeout = max(0.0, next_start - loop.time()) if waiting and self.hedge_ms is not None else None
+				done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+				for task in done:
+					name = running.pop(task)
+					items = task.result()
+					if items:
+						metrics.incr(f"websearch.wins.{name}")
+						return items, name
+		finally:
+			for task in running:
+				task.cancel()
+			if running:
+				await asyncio.gather(*running, return_exceptions=True)
+		return [], None
+
+	def report(self) -> Dict[str, Dict[str, float]]:
+		return {
+			name: {"samples": s.samples, "mean_ms": s.mean_ms, "p95_ms": s.p95_ms, "error_rate": s.error_rate}
+			for name, s in self.stats.items()
+		}
+
+
+_default: Optional[HedgedSearch] = None
+
+
+def get_hedged_search() -> HedgedSearch:
+	global _default
+	if _default is None:
+		unknown = [name for name in WEBSEARCH_PROVIDERS if name not in PROVIDERS]
+		if unknown:
+			logger.warning("Unknown WEBSEARCH_PROVIDERS ignored: %s", ", ".join(unknown))
+		providers = [PROVIDERS[name]() for name in WEBSEARCH_PROVIDERS if name in PROVIDERS]
+		_default = HedgedSearch(providers, WEBSEARCH_HEDGE_MS if WEBSEARCH_HEDGE_MS >= 0 else None)
+	return _default
+
+
+async def web_search_items(query: str, top_k: int = 3) -> List[Item]:
+	"""Search results as (title, url) pairs from the first provider with any (see `HedgedSearch`)."""
+	timeout = current_deadline().timeout(SEARCH_TIMEOUT_SECONDS)
+	if not timeout:
+		return []
 	try:
-		async with httpx.AsyncClient(timeout=10) as client:
-			try:
-				items = await _search_duckduckgo_html(client, query)
-			except Exception:
-				items = []
-			if not items:
-				try:
-					items = await _search_duckduckgo_ia(client, query)
-				except Exception:
-					items = []
+		import httpx
+
+		async with httpx.AsyncClient(timeout=timeout) as client:
+			items, _ = await asyncio.wait_for(get_hedged_search().search(client, query), timeout=timeout)
 	except Exception:
 		items = []
+	return items[:top_k]
+
+
+async def web_search(query: str, top_k: int = 3) -> List[str]:
+	items = await web_search_items(query, top_k=top_k)
 	# Format as "Title (URL)" strings
-	formatted = [f"{title} ({url})" for title, url in items]
-	return formatted[:top_k]
+	return [f"{title} ({url})" for title, url in items]
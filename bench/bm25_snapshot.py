@@ -0,0 +1,70 @@
+"""KnowledgeAgent startup from scratch vs from the memory-mapped BM25 snapshot.
+
+Usage: python -m bench.bm25_snapshot [--rounds 5] [--queries 2000]
+
+Builds a snapshot of data/knowledge into a temp dir, then times
+``KnowledgeAgent()`` in fresh interpreters with BM25_SNAPSHOT_PATH unset
+(clean + analyze + index every file) and pointing at the snapshot. Also
+compares query scoring of rank_bm25.BM25Okapi with app.bm25.BM25Index.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_CHILD = (
+	"import time; t = time.perf_counter(); "
+	"from app.agents.knowledge import KnowledgeAgent; KnowledgeAgent(); "
+	"print((time.perf_counter() - t) * 1000.0)"
+)
+QUERIES = ["taxas da maquininha", "pix parcelado 12x", "celular como maquininha", "boleto conta pj", "quanto custa a smart"]
+
+
+def _cold_start_ms(snapshot: str, rounds: int) -> float:
+	env = dict(os.environ, BM25_SNAPSHOT_PATH=snapshot)
+	times = []
+	for _ in range(rounds):
+		out = subprocess.run([sys.executable, "-c", _CHILD], env=env, capture_output=True, text=True, check=True).stdout
+		times.append(float(out.strip().splitlines()[-1]))
+	return statistics.median(times)
+
+
+def _query_us(scorer, n: int) -> float:
+	from app.analysis import analyze_query
+
+	terms = [list(analyze_query(q)) for q in QUERIES]
+	start = time.perf_counter()
+	for i in range(n):
+		scorer.get_scores(terms[i % len(terms)])
+	return (time.perf_counter() - start) / n * 1e6
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--rounds", type=int, default=5)
+	parser.add_argument("--queries", type=int, default=2000)
+	args = parser.parse_args()
+	from rank_bm25 import BM25Okapi
+
+	from app.agents.knowledge import load_knowledge_docs
+	from app.analysis import analyze
+	from app.bm25 import BM25Index, build_snapshot
+
+	with tempfile.TemporaryDirectory() as tmp:
+		snap = os.path.join(tmp, "bm25.snap")
+		header = build_snapshot(out=snap)
+		print(f"snapshot: {header['n_docs']} docs, {header['n_terms']} terms, {os.path.getsize(snap)} bytes")
+		scratch = _cold_start_ms("", args.rounds)
+		mapped = _cold_start_ms(snap, args.rounds)
+	print(f"KnowledgeAgent() from scratch   {scratch:8.1f} ms (median of {args.rounds})")
+	print(f"KnowledgeAgent() from snapshot  {mapped:8.1f} ms")
+	tokenized = [analyze(d) for d in load_knowledge_docs()]
+	print(f"query rank_bm25.BM25Okapi       {_query_us(BM25Okapi(tokenized), args.queries):8.1f} us")
+	print(f"query app.bm25.BM25Index        {_query_us(BM25Index.from_corpus(tokenized), args.queries):8.1f} us")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,78 @@
+"""Memory per active conversation and lookup overhead of the conversation store.
+
+Usage: python -m bench.conversation_memory [--users 20000] [--turns 6] [--lookups 500000]
+
+Fills a ConversationStore with ``users`` conversations of ``turns`` realistic
+turns and reports traced Python heap per conversation, then the cost of
+``last()`` (the router's per-request lookup) and ``append()``. With --sqlite
+the same runs against the persistent backend, including reloads after
+eviction.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.memory import ConversationStore, SQLiteConversationBackend
+
+MESSAGE = "Quais as taxas da maquininha no crédito 12x?"
+ANSWER = (
+	"Taxas da Maquininha Smart (referência):\n- Pix: 0%\n- Débito: 0,35%\n- Crédito à vista: 2,69%\n"
+	"- Crédito 12x: 8,99%\nObs.: As taxas variam por faturamento e pelo plano de recebimento."
+)
+
+
+def fill(store: ConversationStore, users: int, turns: int) -> None:
+	for t in range(turns):
+		for u in range(users):
+			# Distinct strings per turn, as real traffic would have
+			store.append(f"user-{u}", f"{MESSAGE} ({u}.{t})", "knowledge", f"{ANSWER} ({u}.{t})", (3, 7, 11, 2, 5))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--users", type=int, default=20_000)
+	parser.add_argument("--turns", type=int, default=6)
+	parser.add_argument("--lookups", type=int, default=500_000)
+	parser.add_argument("--sqlite", action="store_true")
+	args = parser.parse_args()
+
+	tracemalloc.start()
+	base = tracemalloc.get_traced_memory()[0]
+	store = ConversationStore(max_turns=args.turns, max_conversations=args.users, max_chars=10**12)
+	fill(store, args.users, args.turns)
+	used = tracemalloc.get_traced_memory()[0] - base
+	tracemalloc.stop()
+	print(f"{args.users} conversations x {args.turns} turns: {used / 1e6:.1f} MB, {used / args.users / 1024:.2f} KiB per conversation "
+		f"({store.chars / args.users:.0f} chars of text each)")
+
+	keys = [f"user-{u}" for u in range(args.users)]
+	start = time.perf_counter()
+	for i in range(args.lookups):
+		store.last(keys[i % args.users])
+	print(f"last() in memory         {(time.perf_counter() - start) / args.lookups * 1e9:8.0f} ns")
+	start = time.perf_counter()
+	for i in range(args.lookups):
+		store.append(keys[i % args.users], MESSAGE, "knowledge", ANSWER)
+	print(f"append() in memory       {(time.perf_counter() - start) / args.lookups * 1e9:8.0f} ns")
+
+	if args.sqlite:
+		with tempfile.TemporaryDirectory() as tmp:
+			backend = SQLiteConversationBackend(os.path.join(tmp, "memory.db"))
+			# Keep only a tenth in memory so most lookups reload from SQLite
+			persisted = ConversationStore(max_turns=args.turns, max_conversations=max(1, args.users // 10), backend=backend)
+			n = min(args.users * args.turns, 50_000)
+			start = time.perf_counter()
+			for i in range(n):
+				persisted.append(keys[i % args.users], MESSAGE, "knowledge", ANSWER)
+			print(f"append() with SQLite     {(time.perf_counter() - start) / n * 1e6:8.1f} us")
+			n = min(args.lookups, 20_000)
+			start = time.perf_counter()
+			for i in range(n):
+				persisted.last(keys[(i * 7919) % args.users])
+			print(f"last() with reloads      {(time.perf_counter() - start) / n * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,81 @@
+"""Resident memory and access time of the knowledge corpus: str list vs CorpusStore.
+
+Usage: python -m bench.corpus_memory [--scale 200] [--queries 500]
+
+Writes a BM25 snapshot of the cleaned corpus repeated ``scale`` times, then in
+a fresh process per layout loads it and reports the RSS/PSS growth and the
+Python heap held by the documents: "list" decodes every document into a str
+(the layout before CorpusStore), "store" keeps the memory-mapped buffer and
+offsets. Also times reading the lines and the chunks of five documents per
+query, as the knowledge summarizers and the LLM context packer do.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = r"""
+import gc, json, random, sys, time, tracemalloc
+from app.bm25 import load_snapshot
+from app.context_packer import split_chunks
+from app.health import process_memory
+
+path, layout, queries = sys.argv[1], sys.argv[2], int(sys.argv[3])
+gc.collect()
+before = process_memory()
+tracemalloc.start()
+store, index = load_snapshot(path)
+docs = list(store) if layout == "list" else store
+heap = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+after = process_memory()
+rng = random.Random(1)
+picks = [[rng.randrange(len(docs)) for _ in range(5)] for _ in range(queries)]
+start = time.perf_counter()
+for ids in picks:
+	for i in ids:
+		docs[i].splitlines() if layout == "list" else store.lines(i)
+lines_us = (time.perf_counter() - start) / queries * 1e6
+start = time.perf_counter()
+for ids in picks:
+	for i in ids:
+		split_chunks(docs[i]) if layout == "list" else store.chunks(i)
+chunks_us = (time.perf_counter() - start) / queries * 1e6
+print(json.dumps({
+	"rss_kb": after.get("rss_kb", 0) - before.get("rss_kb", 0),
+	"pss_kb": after.get("pss_kb", 0) - before.get("pss_kb", 0),
+	"heap_kb": heap // 1024, "lines_us": lines_us, "chunks_us": chunks_us, "docs": len(docs),
+}))
+"""
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--scale", type=int, default=200)
+	parser.add_argument("--queries", type=int, default=500)
+	args = parser.parse_args()
+	from app.agents.knowledge import load_knowledge_docs
+	from app.analysis import analyze
+	from app.bm25 import BM25Index, write_snapshot
+
+	docs = load_knowledge_docs() * args.scale
+	with tempfile.TemporaryDirectory() as tmp:
+		snap = os.path.join(tmp, "bm25.snap")
+		started = time.perf_counter()
+		write_snapshot(snap, docs, BM25Index.from_corpus([analyze(d) for d in docs[: len(docs) // args.scale]] * args.scale), "bench")
+		print(f"{len(docs)} docs, {sum(len(d.encode('utf-8')) for d in docs) / 1e6:.1f} MB of text, "
+			f"snapshot {os.path.getsize(snap) / 1e6:.1f} MB written in {(time.perf_counter() - started):.1f} s")
+		for layout in ("list", "store"):
+			out = subprocess.run([sys.executable, "-c", CHILD, snap, layout, str(args.queries)], capture_output=True, text=True, check=True)
+			r = json.loads(out.stdout.strip().splitlines()[-1])
+			print(
+				f"{layout:<6} RSS +{r['rss_kb'] / 1024:7.1f} MB  PSS +{r['pss_kb'] / 1024:7.1f} MB  "
+				f"Python heap {r['heap_kb'] / 1024:7.1f} MB | per query (5 docs): lines {r['lines_us']:8.1f} us, chunks {r['chunks_us']:8.1f} us"
+			)
+
+
+if __name__ == "__main__":
+	main()
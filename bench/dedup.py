@@ -0,0 +1,72 @@
+"""Index size and per-query work with and without corpus cleaning.
+
+Usage: python -m bench.dedup [--queries 500]
+
+Indexes data/knowledge raw and after app.dedup (near-duplicate documents,
+boilerplate lines, near-duplicate chunks) and reports the cleaning itself,
+index size (terms, postings, snapshot bytes), postings scored per query,
+distinct source pages in the top 5, and KnowledgeAgent answer time.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+QUERIES = [
+	"Quais as taxas da maquininha?", "What are the fees of the Maquininha Smart", "Quanto custa a maquininha smart?",
+	"Como usar meu celular como maquininha?", "como funciona a gestão de cobrança", "pix parcelado 12x",
+	"empréstimo para empresa", "boleto conta pj", "link de pagamento taxa", "tap to pay iphone",
+]
+
+
+def _measure(label: str, docs, queries: int) -> None:
+	from app.agents.knowledge import BM25RAG, KnowledgeAgent
+	from app.analysis import analyze_query
+	from app.bm25 import source_fingerprint, write_snapshot
+
+	rag = BM25RAG(docs)
+	index = rag.bm25
+	with tempfile.TemporaryDirectory() as tmp:
+		snap = os.path.join(tmp, "bm25.snap")
+		write_snapshot(snap, docs, index, source_fingerprint([]))
+		size = os.path.getsize(snap)
+	postings = 0
+	distinct = 0
+	for q in QUERIES:
+		for t in analyze_query(q):
+			i = index.term_ids.get(t)
+			if i is not None:
+				postings += int(index.post_ptr[i + 1] - index.post_ptr[i])
+		top = [docs[i] for i in rag.search_ids(q, k=5)]
+		distinct += len({d[:200] for d in top})
+	agent = KnowledgeAgent.__new__(KnowledgeAgent)
+	agent.rag = rag
+	start = time.perf_counter()
+	for i in range(queries):
+		agent.answer(QUERIES[i % len(QUERIES)])
+	answer_ms = (time.perf_counter() - start) / queries * 1000.0
+	print(
+		f"{label:<8}{len(docs):6d} docs {sum(map(len, docs)):9d} chars {len(index.terms):7d} terms "
+		f"{len(index.post_doc):8d} postings {size:9d} bytes | per query: {postings / len(QUERIES):7.0f} postings, "
+		f"{distinct / len(QUERIES):.1f}/5 distinct pages, answer {answer_ms:6.2f} ms"
+	)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--queries", type=int, default=500)
+	args = parser.parse_args()
+	from app.agents.knowledge import load_knowledge_docs
+	from app.dedup import get_cleaner
+
+	raw = load_knowledge_docs(clean=False)
+	start = time.perf_counter()
+	cleaned, report = get_cleaner().clean(raw)
+	elapsed = (time.perf_counter() - start) * 1000.0
+	print(f"cleaning: {elapsed:.0f} ms, {report.as_dict()}")
+	_measure("raw", raw, args.queries)
+	_measure("cleaned", cleaned, args.queries)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,76 @@
+"""Measure event-loop lag while KnowledgeAgent serves concurrent queries.
+
+Usage: python -m bench.event_loop_lag [--requests 200] [--concurrency 20]
+
+A probe coroutine sleeps 1 ms in a loop and records how late it wakes up; the
+lag is what every other coroutine in the worker (e.g. support lookups) would
+experience. Runs once per executor mode.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from app.agents.knowledge import KnowledgeAgent
+from app.executor import CPUExecutor
+
+QUERIES = [
+	"What are the fees of the Maquininha Smart",
+	"quanto custa a maquininha smart",
+	"Como usar meu celular como maquininha?",
+	"o que é pix parcelado",
+	"rendimento da conta",
+]
+
+
+async def _probe(lags: List[float], stop: asyncio.Event) -> None:
+	while not stop.is_set():
+		start = time.perf_counter()
+		await asyncio.sleep(0.001)
+		lags.append((time.perf_counter() - start - 0.001) * 1000.0)
+
+
+async def _run(agent: KnowledgeAgent, n: int, concurrency: int) -> None:
+	sem = asyncio.Semaphore(concurrency)
+
+	async def one(i: int) -> None:
+		async with sem:
+			await agent.handle(QUERIES[i % len(QUERIES)], "bench")
+
+	await asyncio.gather(*(one(i) for i in range(n)))
+
+
+async def _measure(mode: str, n: int, concurrency: int) -> None:
+	agent = KnowledgeAgent()
+	agent.executor = CPUExecutor(mode)
+	await _run(agent, len(QUERIES), 1)  # warm pools and caches
+	lags: List[float] = []
+	stop = asyncio.Event()
+	probe = asyncio.create_task(_probe(lags, stop))
+	start = time.perf_counter()
+	await _run(agent, n, concurrency)
+	elapsed = time.perf_counter() - start
+	stop.set()
+	await probe
+	agent.executor.shutdown()
+	lags.sort()
+	p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+	print(
+		f"{mode:8s} rps={n / elapsed:8.1f} lag_p50={statistics.median(lags or [0]):7.2f}ms "
+		f"lag_p99={p99:7.2f}ms lag_max={(lags or [0])[-1]:7.2f}ms"
+	)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--requests", type=int, default=200)
+	parser.add_argument("--concurrency", type=int, default=20)
+	parser.add_argument("--modes", default="inline,thread,process")
+	args = parser.parse_args()
+	for mode in args.modes.split(","):
+		asyncio.run(_measure(mode, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,52 @@
+"""Throughput of the HTML extraction backends on the saved fixtures.
+
+Usage: python -m bench.html_parse [--rounds 200]
+
+Compares the legacy BeautifulSoup(html.parser) paths (when bs4 is installed)
+with every available app.tools.html_extract backend, for the DuckDuckGo result
+anchors and for InfinitePay page text.
+"""
+import argparse
+import os
+import time
+from typing import Callable
+
+from app.tools.html_extract import available_backends, extract_links, visible_text
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures")
+_CLASSES = ("result__a", "result__url", "result__title")
+
+
+def _read(name: str) -> str:
+	with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+		return f.read()
+
+
+def _rate(fn: Callable[[str], object], html: str, rounds: int) -> float:
+	start = time.perf_counter()
+	for _ in range(rounds):
+		fn(html)
+	elapsed = time.perf_counter() - start
+	return len(html.encode("utf-8")) * rounds / elapsed / 1e6
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--rounds", type=int, default=200)
+	args = parser.parse_args()
+	ddg = _read("ddg_results.html")
+	page = _read("infinitepay_maquininha.html")
+	try:
+		from bs4 import BeautifulSoup
+
+		print(f"{'bs4 html.parser':16s} ddg {_rate(lambda h: BeautifulSoup(h, 'html.parser').select('a.result__a, a.result__url, a.result__title'), ddg, args.rounds):7.2f} MB/s"
+			f"  page {_rate(lambda h: BeautifulSoup(h, 'html.parser').get_text(separator=' '), page, args.rounds):7.2f} MB/s")
+	except ImportError:
+		print("bs4 not installed; skipping legacy baseline")
+	for backend in available_backends():
+		print(f"{backend:16s} ddg {_rate(lambda h: extract_links(h, _CLASSES, backend), ddg, args.rounds):7.2f} MB/s"
+			f"  page {_rate(lambda h: visible_text(h, backend), page, args.rounds):7.2f} MB/s")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,71 @@
+"""Intent classifier accuracy and latency vs the keyword router.
+
+Usage: python -m bench.intent [--model PATH] [--rounds 200]
+
+Trains on data/intent/train.jsonl (unless --model is given) and evaluates on
+data/intent/eval.jsonl: accuracy of the keyword rules, the model alone and
+the model with keyword fallback below INTENT_CONFIDENCE, then per-message
+latency of single and batched predictions and the median single-message
+latency against ``--target-ms`` (the router classifies on every request).
+"""
+import argparse
+import statistics
+import time
+
+from app.config import INTENT_CONFIDENCE
+from app.intent import EVAL_PATH, TRAIN_PATH, IntentModel, load_labelled, train
+from app.router import keyword_intent
+
+
+def _accuracy(predicted, labels) -> float:
+	return sum(a == b for a, b in zip(predicted, labels)) / len(labels)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--model", help="saved model (default: train one from data/intent/train.jsonl)")
+	parser.add_argument("--rounds", type=int, default=200)
+	parser.add_argument("--confidence", type=float, default=INTENT_CONFIDENCE)
+	parser.add_argument("--target-ms", type=float, default=1.0, help="median single-message latency budget")
+	args = parser.parse_args()
+
+	if args.model:
+		model = IntentModel.load(args.model)
+		if model is None:
+			parser.error(f"{args.model}: missing or stale")
+	else:
+		started = time.perf_counter()
+		model = train(*load_labelled(TRAIN_PATH))
+		print(f"trained in {(time.perf_counter() - started) * 1000.0:.0f} ms")
+	messages, labels = load_labelled(EVAL_PATH)
+	keywords = [keyword_intent(m.lower()) or "other" for m in messages]
+	predictions = model.predict(messages)
+	combined = [label if p >= args.confidence else kw for (label, p), kw in zip(predictions, keywords)]
+	confident = sum(p >= args.confidence for _, p in predictions)
+	print(f"eval: {len(messages)} messages")
+	print(f"accuracy keywords                {_accuracy(keywords, labels):.3f}")
+	print(f"accuracy model                   {_accuracy([l for l, _ in predictions], labels):.3f}")
+	print(f"accuracy model + keyword fallback {_accuracy(combined, labels):.3f}  ({confident}/{len(messages)} above {args.confidence})")
+
+	started = time.perf_counter()
+	for i in range(args.rounds * 10):
+		keyword_intent(messages[i % len(messages)].lower())
+	print(f"latency keywords                 {(time.perf_counter() - started) / (args.rounds * 10) * 1e6:8.1f} us/message")
+	for size in (1, 8, 32, 128):
+		batch = [messages[i % len(messages)] for i in range(size)]
+		started = time.perf_counter()
+		for _ in range(args.rounds):
+			model.predict(batch)
+		per_message = (time.perf_counter() - started) / (args.rounds * size) * 1e6
+		print(f"latency model, batch {size:<4}        {per_message:8.1f} us/message")
+	times = []
+	for m in messages * 3:
+		started = time.perf_counter()
+		model.predict([m])
+		times.append((time.perf_counter() - started) * 1000.0)
+	median = statistics.median(times)
+	print(f"median single message            {median * 1000.0:8.1f} us  ({'within' if median < args.target_ms else 'OVER'} {args.target_ms:g} ms target)")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,65 @@
+"""Tokens/sec and latency of the local LLM backend under concurrent load.
+
+Usage: python -m bench.llm_batching [--requests 64] [--concurrency 32]
+       python -m bench.llm_batching --model /models/flan-t5-small   # real model
+
+Without --model a synthetic model is used whose forward pass costs a fixed
+overhead plus a small per-prompt increment, which is the cost profile that
+makes micro-batching pay off on CPU.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from app.llm_backends import LocalBackend, LocalModel, Seq2SeqModel
+
+
+class SyntheticModel(LocalModel):
+	def __init__(self, overhead_ms: float = 40.0, per_prompt_ms: float = 4.0) -> None:
+		self.overhead = overhead_ms / 1000.0
+		self.per_prompt = per_prompt_ms / 1000.0
+
+	def generate(self, prompts: List[str], max_tokens: int, temperature: float) -> List[str]:
+		time.sleep(self.overhead + self.per_prompt * len(prompts))
+		return ["A taxa no débito é 0,75% e no crédito à vista 2,69%." for _ in prompts]
+
+
+async def _load(backend: LocalBackend, n: int, concurrency: int) -> List[float]:
+	sem = asyncio.Semaphore(concurrency)
+	latencies: List[float] = []
+
+	async def one(i: int) -> None:
+		async with sem:
+			start = time.perf_counter()
+			await backend.complete("Você é um assistente.", f"Pergunta {i}: quais as taxas?", max_tokens=32, temperature=0.0)
+			latencies.append((time.perf_counter() - start) * 1000.0)
+
+	await asyncio.gather(*(one(i) for i in range(n)))
+	return latencies
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--requests", type=int, default=64)
+	parser.add_argument("--concurrency", type=int, default=32)
+	parser.add_argument("--model", default="", help="local seq2seq model directory")
+	parser.add_argument("--batch-sizes", default="1,4,16")
+	parser.add_argument("--max-wait-ms", type=float, default=10.0)
+	args = parser.parse_args()
+	model = Seq2SeqModel(args.model) if args.model else SyntheticModel()
+	for size in (int(s) for s in args.batch_sizes.split(",")):
+		backend = LocalBackend(model, max_batch=size, max_wait_ms=args.max_wait_ms)
+		start = time.perf_counter()
+		lat = sorted(asyncio.run(_load(backend, args.requests, args.concurrency)))
+		wall = time.perf_counter() - start
+		b = backend.batcher
+		print(
+			f"max_batch={size:3d} batches={b.batches:4d} tok/s(wall)={b.generated_tokens / wall:8.1f} "
+			f"p50={statistics.median(lat):7.1f}ms p95={lat[int(len(lat) * 0.95) - 1]:7.1f}ms"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,122 @@
+"""Throughput and per-worker memory of the pre-fork server by worker count.
+
+Usage: python -m bench.multiworker [--workers 1,2,4] [--seconds 5] [--concurrency 32]
+
+Starts ``python -m app.serve`` for each worker count, waits for /readyz, drives
+/chat with knowledge queries from one asyncio client and reports req/s plus
+RSS and PSS per worker. PSS is what the workers really cost: the shared index
+pages are split between them, so sum(PSS) stays far below workers * RSS.
+"""
+from typing import Dict, List
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app.health import process_memory
+
+QUERIES = [
+	"taxas da maquininha",
+	"quanto custa a maquininha smart",
+	"como usar o celular como maquininha",
+	"taxa do pix parcelado",
+	"crédito em 12x",
+]
+
+
+def _free_port() -> int:
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+
+def _children(pid: int) -> List[int]:
+	try:
+		with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+			return [int(p) for p in f.read().split()]
+	except OSError:
+		return []
+
+
+async def _wait_ready(base: str, workers: int, timeout: float = 60.0) -> None:
+	deadline = time.monotonic() + timeout
+	async with httpx.AsyncClient(base_url=base) as client:
+		while time.monotonic() < deadline:
+			try:
+				if (await client.get("/readyz")).status_code == 200:
+					return
+			except httpx.TransportError:
+				pass
+			await asyncio.sleep(0.2)
+	raise RuntimeError(f"server with {workers} workers not ready after {timeout}s")
+
+
+async def _load(base: str, seconds: float, concurrency: int) -> Dict[str, float]:
+	done = 0
+	errors = 0
+	stop_at = time.perf_counter() + seconds
+
+	async def user(i: int, client: httpx.AsyncClient) -> None:
+		nonlocal done, errors
+		n = i
+		while time.perf_counter() < stop_at:
+			body = {"message": QUERIES[n % len(QUERIES)], "user_id": f"bench{i}"}
+			n += 1
+			try:
+				resp = await client.post("/chat", json=body)
+				if resp.status_code == 200:
+					done += 1
+				else:
+					errors += 1
+			except httpx.TransportError:
+				errors += 1
+
+	limits = httpx.Limits(max_connections=concurrency)
+	started = time.perf_counter()
+	async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30.0) as client:
+		await asyncio.gather(*(user(i, client) for i in range(concurrency)))
+	elapsed = time.perf_counter() - started
+	return {"rps": done / elapsed, "errors": errors}
+
+
+def run_one(workers: int, seconds: float, concurrency: int) -> None:
+	port = _free_port()
+	base = f"http://127.0.0.1:{port}"
+	cmd = [sys.executable, "-m", "app.serve", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+	env = dict(os.environ, USE_LLM="0")
+	proc = subprocess.Popen(cmd, env=env)
+	try:
+		asyncio.run(_wait_ready(base, workers))
+		stats = asyncio.run(_load(base, seconds, concurrency))
+		pids = _children(proc.pid) or [proc.pid]
+		mems = [process_memory(pid) for pid in pids]
+		rss = sum(m.get("rss_kb", 0) for m in mems) / len(mems) / 1024
+		pss = sum(m.get("pss_kb", 0) for m in mems) / 1024
+		print(f"{workers:>7}  {stats['rps']:>9.1f}  {stats['errors']:>6.0f}  {rss:>14.1f}  {pss:>12.1f}")
+	finally:
+		proc.send_signal(signal.SIGTERM)
+		try:
+			proc.wait(timeout=10)
+		except subprocess.TimeoutExpired:
+			proc.kill()
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4) if n <= (os.cpu_count() or 1)) or "1")
+	parser.add_argument("--seconds", type=float, default=5.0)
+	parser.add_argument("--concurrency", type=int, default=32)
+	args = parser.parse_args()
+	print("workers      req/s  errors  RSS/worker MiB  sum(PSS) MiB")
+	for n in (int(x) for x in args.workers.split(",")):
+		run_one(n, args.seconds, args.concurrency)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,201 @@
+"""Replay captured /chat traffic against this build and compare two builds.
+
+Usage: python -m bench.replay run CAPTURE [--speed 1] [--concurrency 32] [--out results.json] [--url URL]
+       python -m bench.replay compare BASE.json CANDIDATE.json
+
+``run`` re-sends the requests of a capture log (CAPTURE_PATH, see app.capture)
+to an in-process app with stubbed web search, Slack and LLM backends (fixed
+latencies, no network, no files outside a temp dir; the fake account DB is
+seeded) and admission control off, so a captured burst from one user gets its
+original routes instead of rate-limit replies (``--admission`` keeps it), or
+to a running server with ``--url``. ``--speed`` keeps the original
+inter-arrival times (1), compresses them (10 = ten times faster) or sends as
+fast as ``--concurrency`` allows (0). To compare builds, run the same capture
+from each checkout (e.g. a ``git worktree`` of the baseline) and ``compare``
+the two result files: latency percentiles, throughput and route agreement.
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+
+
+def install_stubs(web_ms: float, llm_ms: float, tmp_dir: str, admission: bool = False) -> None:
+	"""Replace external backends (and, unless ``admission``, rate limits) before the app builds its agents."""
+	import app.admission as admission_control
+	import app.agents.handoff as handoff
+	import app.agents.llm as llm
+	import app.agents.slack as slack
+	import app.router as router
+	from app.llm_backends import LLMBackend
+
+	async def web_search_items(query: str, top_k: int = 5):
+		await asyncio.sleep(web_ms / 1000.0)
+		return [(f"Resultado {i} para {query[:40]}", f"https://example.com/{i}") for i in range(top_k)]
+
+	async def web_search(query: str, top_k: int = 5):
+		return [f"{title} ({url})" for title, url in await web_search_items(query, top_k)]
+
+	class StubLLM(LLMBackend):
+		name = "stub"
+
+		async def complete(self, system_prompt, user_prompt, *, max_tokens, temperature, timeout=None) -> str:
+			await asyncio.sleep(llm_ms / 1000.0)
+			return "Resposta de teste."
+
+	router.web_search = web_search
+	router.web_search_items = web_search_items
+	slack._send_webhook = lambda text, webhook_url, timeout_seconds=5.0: True
+	llm.create_backend = lambda *args, **kwargs: StubLLM()
+	handoff.TICKETS_FILEPATH = os.path.join(tmp_dir, "tickets.jsonl")
+	if not admission:
+		admission_control._default = admission_control.AdmissionController(enabled=False)
+
+
+def _percentile(values: List[float], q: float) -> float:
+	if not values:
+		return 0.0
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summary(result: Dict[str, Any]) -> Dict[str, float]:
+	ms = [r["ms"] for r in result["results"] if r["status"] == 200]
+	return {
+		"requests": len(result["results"]),
+		"errors": sum(r["status"] != 200 for r in result["results"]),
+		"p50_ms": _percentile(ms, 0.5),
+		"p95_ms": _percentile(ms, 0.95),
+		"p99_ms": _percentile(ms, 0.99),
+		"mean_ms": sum(ms) / len(ms) if ms else 0.0,
+		"rps": len(result["results"]) / result["wall_s"] if result["wall_s"] else 0.0,
+	}
+
+
+def _body(record: Dict[str, Any]) -> Dict[str, Any]:
+	if record["path"] == "/chat/batch":
+		return {"items": [{"message": it["message"], "user_id": it["user"]} for it in record["items"]]}
+	return {"message": record["message"], "user_id": record["user"]}
+
+
+def _routes(record_path: str, data: Dict[str, Any]) -> List[Optional[str]]:
+	if record_path == "/chat/batch":
+		return [r.get("route") for r in data.get("results", [])]
+	return [data.get("route")]
+
+
+async def _replay(records: List[Dict[str, Any]], client, speed: float, concurrency: int) -> Dict[str, Any]:
+	sem = asyncio.Semaphore(concurrency)
+	results: List[Optional[Dict[str, Any]]] = [None] * len(records)
+	t0 = records[0]["ts"] if records else 0.0
+
+	async def send(i: int, record: Dict[str, Any], start: float) -> None:
+		if speed > 0:
+			await asyncio.sleep(max(0.0, start + (record["ts"] - t0) / speed - time.perf_counter()))
+		async with sem:
+			sent = time.perf_counter()
+			resp = await client.post(record["path"], json=_body(record))
+			ms = (time.perf_counter() - sent) * 1000.0
+		data = resp.json() if resp.status_code == 200 else {}
+		results[i] = {"i": i, "path": record["path"], "status": resp.status_code, "ms": round(ms, 3), "routes": _routes(record["path"], data)}
+
+	start = time.perf_counter()
+	await asyncio.gather(*(send(i, r, start) for i, r in enumerate(records)))
+	return {"wall_s": time.perf_counter() - start, "results": results}
+
+
+def _git_label() -> str:
+	try:
+		out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+		return out.stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return "build"
+
+
+def run(args) -> Dict[str, Any]:
+	import httpx
+
+	from app.capture import read_capture
+
+	records = [r for r in read_capture(args.capture) if r.get("status") == 200]
+	random.seed(args.seed)
+	with tempfile.TemporaryDirectory() as tmp:
+		if args.url:
+			client = httpx.AsyncClient(base_url=args.url, timeout=30.0)
+		else:
+			install_stubs(args.web_ms, args.llm_ms, tmp, args.admission)
+			import app.main as main
+
+			main.warm_up()
+			client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://replay", timeout=30.0)
+
+		async def go() -> Dict[str, Any]:
+			async with client:
+				return await _replay(records, client, args.speed, args.concurrency)
+
+		result = asyncio.run(go())
+	result.update({"label": args.label or _git_label(), "capture": args.capture, "speed": args.speed})
+	return result
+
+
+def compare(base: Dict[str, Any], cand: Dict[str, Any]) -> None:
+	a, b = _summary(base), _summary(cand)
+	print(f"{'':<10}{base['label']:>12}{cand['label']:>12}{'change':>10}")
+	for key in ("requests", "errors", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "rps"):
+		change = f"{(b[key] - a[key]) / a[key] * 100:+.1f}%" if a[key] else ""
+		print(f"{key:<10}{a[key]:12.2f}{b[key]:12.2f}{change:>10}")
+	pairs = list(zip(base["results"], cand["results"]))
+	same = sum(x["routes"] == y["routes"] for x, y in pairs)
+	print(f"routes identical for {same}/{len(pairs)} requests")
+	changed: Dict[str, int] = {}
+	for x, y in pairs:
+		for ra, rb in zip(x["routes"], y["routes"]):
+			if ra != rb:
+				changed[f"{ra} -> {rb}"] = changed.get(f"{ra} -> {rb}", 0) + 1
+	for change, n in sorted(changed.items(), key=lambda kv: -kv[1])[:10]:
+		print(f"  {n:5d}  {change}")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	sub = parser.add_subparsers(dest="cmd", required=True)
+	r = sub.add_parser("run", help="replay a capture log against this build")
+	r.add_argument("capture")
+	r.add_argument("--speed", type=float, default=1.0, help="1 = original pace, 10 = ten times faster, 0 = as fast as possible")
+	r.add_argument("--concurrency", type=int, default=32)
+	r.add_argument("--url", help="a running server instead of the in-process app (no stubs)")
+	r.add_argument("--web-ms", type=float, default=150.0, help="stub web search latency")
+	r.add_argument("--llm-ms", type=float, default=400.0, help="stub LLM latency")
+	r.add_argument("--admission", action="store_true", help="keep admission control (rate limits, load shedding) on")
+	r.add_argument("--seed", type=int, default=0)
+	r.add_argument("--label")
+	r.add_argument("--out")
+	c = sub.add_parser("compare", help="compare two replay result files")
+	c.add_argument("base")
+	c.add_argument("candidate")
+	args = parser.parse_args()
+	if args.cmd == "compare":
+		with open(args.base, encoding="utf-8") as f:
+			base = json.load(f)
+		with open(args.candidate, encoding="utf-8") as f:
+			cand = json.load(f)
+		compare(base, cand)
+		return
+	result = run(args)
+	s = _summary(result)
+	print(
+		f"{result['label']}: {s['requests']} requests in {result['wall_s']:.2f} s ({s['rps']:.1f} req/s), "
+		f"p50 {s['p50_ms']:.1f} ms, p95 {s['p95_ms']:.1f} ms, p99 {s['p99_ms']:.1f} ms, {s['errors']} errors"
+	)
+	if args.out:
+		with open(args.out, "w", encoding="utf-8") as f:
+			json.dump(result, f)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,100 @@
+"""Sharded BM25 retrieval: latency and throughput by shard count on one machine.
+
+Usage: python -m bench.sharding [--docs 50000] [--shards 1,2,4,8] [--queries 200] [--clients 8] [--mode process]
+
+Builds a synthetic corpus of ``--docs`` documents from random lines of
+data/knowledge, then for the single in-process index and for each shard count
+reports start time (shards index their slice in parallel), sequential query
+latency (p50/p95) and throughput with ``--clients`` concurrent callers, and
+checks that every shard count returns the single index's top 5. Shards only
+run in parallel with at least as many free cores as shards.
+"""
+from typing import Callable, List
+import argparse
+import os
+import random
+import statistics
+import threading
+import time
+
+QUERIES = [
+	"taxas da maquininha", "pix parcelado 12x", "celular como maquininha", "boleto conta pj",
+	"quanto custa a smart", "prazo de recebimento", "link de pagamento", "rendimento da conta",
+]
+
+
+def _corpus(n_docs: int, seed: int) -> List[str]:
+	from app.agents.knowledge import load_knowledge_docs
+
+	lines = [line for doc in load_knowledge_docs() for line in doc.splitlines() if line.strip()]
+	rng = random.Random(seed)
+	return ["\n".join(rng.choices(lines, k=rng.randint(5, 30))) for _ in range(n_docs)]
+
+
+def _latency_ms(search: Callable[[str, int], List[int]], n: int) -> List[float]:
+	times = []
+	for i in range(n):
+		t0 = time.perf_counter()
+		search(QUERIES[i % len(QUERIES)], 5)
+		times.append((time.perf_counter() - t0) * 1000.0)
+	return times
+
+
+def _throughput(search: Callable[[str, int], List[int]], n: int, clients: int) -> float:
+	per_client = max(1, n // clients)
+
+	def worker(c: int) -> None:
+		for i in range(per_client):
+			search(QUERIES[(c + i) % len(QUERIES)], 5)
+
+	threads = [threading.Thread(target=worker, args=(c,)) for c in range(clients)]
+	start = time.perf_counter()
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	return per_client * clients / (time.perf_counter() - start)
+
+
+def _row(label: str, start_ms: float, times: List[float], rps: float, same: bool) -> None:
+	p95 = sorted(times)[int(0.95 * (len(times) - 1))]
+	print(f"{label:<14}{start_ms:10.0f}{statistics.median(times):10.2f}{p95:10.2f}{rps:10.1f}  {'yes' if same else 'NO'}")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--docs", type=int, default=50000)
+	parser.add_argument("--shards", default="1,2,4,8")
+	parser.add_argument("--queries", type=int, default=200)
+	parser.add_argument("--clients", type=int, default=8)
+	parser.add_argument("--mode", default="process", choices=["process", "thread"])
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	from app.agents.knowledge import BM25RAG
+	from app.sharding import ShardedRAG
+
+	docs = _corpus(args.docs, args.seed)
+	print(f"{len(docs)} docs, {sum(len(d) for d in docs) / 1e6:.1f} MB text, {os.cpu_count()} cpus, {args.mode} shards")
+	print(f"{'':<14}{'start ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}  same top-5")
+	t0 = time.perf_counter()
+	single = BM25RAG(docs)
+	start_ms = (time.perf_counter() - t0) * 1000.0
+	expected = {q: single.search_ids(q, 5) for q in QUERIES}
+	_row("single", start_ms, _latency_ms(single.search_ids, args.queries), _throughput(single.search_ids, args.queries, args.clients), True)
+	for n in [int(s) for s in args.shards.split(",")]:
+		t0 = time.perf_counter()
+		sharded = ShardedRAG.from_documents(docs, n, args.mode)
+		sharded.start()
+		start_ms = (time.perf_counter() - t0) * 1000.0
+		try:
+			same = all(sharded.search_ids(q, 5) == ids for q, ids in expected.items())
+			times = _latency_ms(sharded.search_ids, args.queries)
+			rps = _throughput(sharded.search_ids, args.queries, args.clients)
+		finally:
+			sharded.close()
+		_row(f"{n} shards", start_ms, times, rps, same)
+
+
+if __name__ == "__main__":
+	main()
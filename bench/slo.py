@@ -0,0 +1,88 @@
+"""SLO routing during a simulated LLM latency spike, with and without shifting.
+
+Usage: python -m bench.slo [--per-tick 10] [--budget-ms 250] [--normal-ms 50] [--spike-ms 1000]
+
+The LLM agent is replaced by a stub whose latency follows a schedule (normal,
+spike, recovered) and knowledge questions are sent in waves of ``--per-tick``
+concurrent requests. Each wave prints its p95 latency and the share answered
+by the LLM; with SLO routing the share drops during the spike (down to the
+probe fraction) and the p95 stays near the BM25 knowledge latency, then the
+LLM gets its traffic back after the spike.
+"""
+from typing import List, Tuple
+import argparse
+import asyncio
+import time
+
+QUESTIONS = [
+	"Quais as taxas da maquininha?",
+	"Como funciona o pix parcelado?",
+	"Como faço para pedir uma maquininha nova?",
+	"Quais as tarifas do Pix?",
+	"Como funciona o link de pagamento?",
+]
+
+
+def _p95(values: List[float]) -> float:
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+def _schedule(args) -> List[float]:
+	return [args.normal_ms] * args.ticks + [args.spike_ms] * args.ticks + [args.normal_ms] * (2 * args.ticks)
+
+
+async def _run(schedule: List[float], per_tick: int, slo_on: bool, budget_ms: float) -> List[Tuple[float, float, float, float]]:
+	from app.router import RouterAgent
+	from app.slo import SLORouter
+
+	router = RouterAgent()
+	router.slo = SLORouter({"llm": budget_ms}, window=4 * per_tick) if slo_on else None
+	latency = {"ms": schedule[0]}
+
+	class StubLLM:
+		async def handle(self, message, user_id):
+			await asyncio.sleep(latency["ms"] / 1000.0)
+			return ("llm", "Resposta de teste.")
+
+	router.llm = StubLLM()
+
+	async def one(i: int) -> Tuple[float, str]:
+		t0 = time.perf_counter()
+		route, _ = await router.handle(QUESTIONS[i % len(QUESTIONS)], f"bench-{i}")
+		return (time.perf_counter() - t0) * 1000.0, route
+
+	rows = []
+	n = 0
+	for ms in schedule:
+		latency["ms"] = ms
+		results = await asyncio.gather(*(one(n + i) for i in range(per_tick)))
+		n += per_tick
+		llm_share = sum(route == "llm" for _, route in results) / per_tick
+		times = [t for t, _ in results]
+		rows.append((ms, _p95(times), sum(times) / len(times), llm_share))
+	return rows
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--per-tick", type=int, default=10, help="concurrent requests per wave")
+	parser.add_argument("--ticks", type=int, default=10, help="waves per phase (the recovered phase is twice as long)")
+	parser.add_argument("--budget-ms", type=float, default=250.0, help="LLM p95 budget")
+	parser.add_argument("--normal-ms", type=float, default=50.0)
+	parser.add_argument("--spike-ms", type=float, default=1000.0)
+	args = parser.parse_args()
+	schedule = _schedule(args)
+	off = asyncio.run(_run(schedule, args.per_tick, False, args.budget_ms))
+	on = asyncio.run(_run(schedule, args.per_tick, True, args.budget_ms))
+	print(f"{'wave':>4} {'llm ms':>7} | {'p95 off':>8} {'llm off':>8} | {'p95 on':>8} {'llm on':>7}")
+	for i, ((ms, p_off, _, s_off), (_, p_on, _, s_on)) in enumerate(zip(off, on)):
+		print(f"{i:4d} {ms:7.0f} | {p_off:8.1f} {s_off:8.0%} | {p_on:8.1f} {s_on:7.0%}")
+	spike = slice(args.ticks, 2 * args.ticks)
+	for label, rows in (("off", off), ("on", on)):
+		means = [m for _, _, m, _ in rows[spike]]
+		print(f"SLO routing {label}: mean latency during the spike {sum(means) / len(means):.1f} ms, final LLM share {rows[-1][3]:.0%}")
+
+
+if __name__ == "__main__":
+	main()
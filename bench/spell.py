@@ -0,0 +1,77 @@
+"""Typo correction latency, index size and hit rate vs vocabulary size.
+
+Usage: python -m bench.spell [--lookups 2000]
+
+Builds the SymSpell deletion index over the router keywords plus the
+knowledge corpus, padded with synthetic words up to each vocabulary size,
+and reports build time, delete keys, per-message correction time (cold,
+bypassing the memo cache) against a brute-force edit-distance scan, and how
+many of a set of misspelled routing messages end up on the intended route.
+"""
+import argparse
+import random
+import time
+
+TYPOS = [
+	("quais as taxas da maquinina?", "knowledge"), ("tarifas do pixx", "knowledge"), ("emprestmo pra empresa", "knowledge"),
+	("qual a taxa da maquinnha smart", "knowledge"), ("como funciona o linck de pagamento", "knowledge"),
+	("minha tranferencia nao caiu", "support"), ("nao consigo fazer loggin", "support"), ("meu extrto sumiu", "support"),
+	("quero falar com um atendete", "handoff"), ("slak notify the team", "slack"),
+]
+
+
+def _synthetic(n: int, rng: random.Random):
+	letters = "abcdefghijklmnopqrstuvwxyz"
+	return ["".join(rng.choice(letters) for _ in range(rng.randint(5, 12))) for _ in range(n)]
+
+
+def _brute(words, word, limit):
+	from app.spell import edit_distance
+
+	best = None
+	for w in words:
+		d = edit_distance(word, w, limit)
+		if d <= limit and (best is None or d < best[1]):
+			best = (w, d)
+	return best
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--lookups", type=int, default=2000)
+	args = parser.parse_args()
+	from app.agents.knowledge import load_knowledge_docs
+	from app.analysis import tokenize
+	from app.router import SPELL_KEYWORDS, keyword_intent
+	from app.spell import QueryCorrector, build_speller, keyword_vocabulary
+
+	docs = load_knowledge_docs()
+	keywords = keyword_vocabulary(SPELL_KEYWORDS)
+	rng = random.Random(7)
+	probes = [w for m, _ in TYPOS for w in tokenize(m)]
+	for extra in (0, 10_000, 100_000):
+		start = time.perf_counter()
+		speller = build_speller(keywords, docs + [" ".join(_synthetic(extra, rng))])
+		build_ms = (time.perf_counter() - start) * 1000.0
+		corrector = QueryCorrector(speller)
+		start = time.perf_counter()
+		for i in range(args.lookups):
+			corrector._correct(TYPOS[i % len(TYPOS)][0])
+		per_msg = (time.perf_counter() - start) / args.lookups * 1e6
+		words = list(speller.words)
+		scans = max(1, args.lookups // 200)
+		start = time.perf_counter()
+		for i in range(scans):
+			_brute(words, probes[i % len(probes)], 2)
+		brute = (time.perf_counter() - start) / scans * 1e6
+		print(
+			f"{len(speller):7d} words {speller.index_size:9d} delete keys, build {build_ms:7.0f} ms | "
+			f"correct {per_msg:7.1f} us/message, brute-force scan {brute:9.0f} us/word"
+		)
+	hits_raw = sum(keyword_intent(m.lower()) == route for m, route in TYPOS)
+	hits = sum(keyword_intent(corrector.correct(m).lower()) == route for m, route in TYPOS)
+	print(f"misspelled messages routed as intended: {hits_raw}/{len(TYPOS)} raw, {hits}/{len(TYPOS)} corrected")
+
+
+if __name__ == "__main__":
+	main()
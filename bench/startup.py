@@ -0,0 +1,67 @@
+"""Cold-start timings of the API: import, lifespan startup, readiness, first request.
+
+Usage: python -m bench.startup [--rounds 5] [--json]
+
+Each round runs in a fresh interpreter so nothing is cached in-process; the
+TestClient harness (and the httpx it needs) is imported before the clock starts. With
+WARMUP_MODE=background (default) lifespan startup returns at once and agents
+are built in a thread; "ready" is when /readyz turns 200.
+"""
+from typing import Dict, List
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+PHASES = ("import_ms", "startup_ms", "ready_ms", "first_chat_ms")
+
+
+def measure() -> Dict[str, float]:
+	"""Timings for this (fresh) process, each measured from interpreter-level t0."""
+	from fastapi.testclient import TestClient  # test harness only, kept out of the timings
+
+	t0 = time.perf_counter()
+	from app.main import app
+
+	out = {"import_ms": (time.perf_counter() - t0) * 1000.0}
+	with TestClient(app) as client:
+		out["startup_ms"] = (time.perf_counter() - t0) * 1000.0
+		while client.get("/readyz").status_code != 200:
+			time.sleep(0.005)
+		out["ready_ms"] = (time.perf_counter() - t0) * 1000.0
+		client.post("/chat", json={"message": "taxas da maquininha", "user_id": "bench"})
+		out["first_chat_ms"] = (time.perf_counter() - t0) * 1000.0
+	return out
+
+
+def run_rounds(rounds: int) -> Dict[str, float]:
+	"""Median of each phase over ``rounds`` fresh interpreters."""
+	samples: List[Dict[str, float]] = []
+	for _ in range(rounds):
+		proc = subprocess.run([sys.executable, "-m", "bench.startup", "--child"], capture_output=True, text=True, check=True)
+		samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+	return {k: statistics.median(s[k] for s in samples) for k in PHASES}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--rounds", type=int, default=5)
+	parser.add_argument("--json", action="store_true")
+	parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		print(json.dumps(measure()))
+		return
+	result = run_rounds(args.rounds)
+	if args.json:
+		print(json.dumps(result))
+		return
+	print(f"median of {args.rounds} cold starts (ms since interpreter start of measurement)")
+	for k in PHASES:
+		print(f"  {k:<14} {result[k]:>8.1f}")
+
+
+if __name__ == "__main__":
+	main()
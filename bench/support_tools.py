@@ -0,0 +1,63 @@
+"""Support agent latency: tools called one by one vs the concurrent, memoized engine.
+
+Usage: python -m bench.support_tools [--latency-ms 20,50,100] [--rounds 20]
+
+The stub account backend sleeps ``latency-ms`` per call. "sequential" awaits
+each tool an intent needs in turn, in a fresh run each (so a dependency is
+fetched again, as the old agent re-read the user record); "engine" is
+CustomerSupportAgent.handle, which starts independent tools together and
+fetches each once per message.
+"""
+import argparse
+import asyncio
+import time
+
+INTENTS = [
+	("login", "não consigo fazer login", ("account", "reset_password")),
+	("profile", "meus dados do cadastro", ("account", "limits")),
+	("transfer", "status da transferência", ("account", "limits", "transfers")),
+	("statement", "mostrar extrato", ("transactions",)),
+]
+
+
+async def _sequential(tools, backend, user_id, names) -> None:
+	for name in names:
+		async with tools.run(backend, user_id) as run:
+			await run.get(name)
+
+
+async def _bench(latency_ms: float, rounds: int) -> None:
+	from app.agents.support import SUPPORT_TOOLS, CustomerSupportAgent, SupportBackend, _ensure_user
+
+	_ensure_user("bench")["failed_signins"] = 1
+	for label, message, names in INTENTS:
+		backend = SupportBackend(latency_ms)
+		start = time.perf_counter()
+		for _ in range(rounds):
+			await _sequential(SUPPORT_TOOLS, backend, "bench", names)
+		seq_ms = (time.perf_counter() - start) / rounds * 1000.0
+		seq_calls = sum(backend.calls.values()) / rounds
+		backend = SupportBackend(latency_ms)
+		agent = CustomerSupportAgent(backend=backend)
+		start = time.perf_counter()
+		for _ in range(rounds):
+			await agent.handle(message, "bench")
+		eng_ms = (time.perf_counter() - start) / rounds * 1000.0
+		eng_calls = sum(backend.calls.values()) / rounds
+		print(
+			f"latency {latency_ms:5.0f} ms  {label:<10} sequential {seq_ms:7.1f} ms ({seq_calls:.0f} calls)  "
+			f"engine {eng_ms:7.1f} ms ({eng_calls:.0f} calls)  saved {seq_ms - eng_ms:6.1f} ms"
+		)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--latency-ms", default="20,50,100")
+	parser.add_argument("--rounds", type=int, default=20)
+	args = parser.parse_args()
+	for latency in (float(x) for x in args.latency_ms.split(",")):
+		asyncio.run(_bench(latency, args.rounds))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,79 @@
+"""Per-user ticket lookup: indexed store vs scanning the JSONL log.
+
+Usage: python -m bench.tickets [--tickets 200000] [--users 20000] [--lookups 2000]
+
+Builds a log of N tickets spread over U users, then compares fetching one
+user's newest page (20 tickets) through the SQLite index against the old
+approach of reading and parsing the whole file. Also reports create()
+throughput (append + index row under the log lock) and the cost of indexing
+an existing log on first open.
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import tempfile
+import time
+
+from app.tickets import TicketStore
+
+
+def _scan(log_path: str, user_id: str, limit: int) -> list:
+	with open(log_path, encoding="utf-8") as f:
+		mine = [rec for rec in map(json.loads, f) if rec["user_id"] == user_id]
+	mine.sort(key=lambda r: (r["created_at"], r["ticket_id"]), reverse=True)
+	return mine[:limit]
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--tickets", type=int, default=200_000)
+	parser.add_argument("--users", type=int, default=20_000)
+	parser.add_argument("--lookups", type=int, default=2_000)
+	parser.add_argument("--creates", type=int, default=5_000)
+	args = parser.parse_args()
+
+	rng = random.Random(7)
+	with tempfile.TemporaryDirectory() as tmp:
+		log_path = os.path.join(tmp, "tickets.jsonl")
+		base = dt.datetime(2024, 1, 1)
+		with open(log_path, "w", encoding="utf-8") as f:
+			for i in range(args.tickets):
+				f.write(json.dumps({
+					"ticket_id": f"T-{i:08X}",
+					"user_id": f"user-{rng.randrange(args.users)}",
+					"message": "Quero falar com um atendente",
+					"route_hint": "handoff",
+					"created_at": (base + dt.timedelta(seconds=i)).isoformat() + "Z",
+				}) + "\n")
+		size_mb = os.path.getsize(log_path) / 2**20
+		print(f"log: {args.tickets} tickets, {args.users} users, {size_mb:.1f} MiB")
+
+		started = time.perf_counter()
+		store = TicketStore(log_path)
+		print(f"index existing log on open      {(time.perf_counter() - started) * 1000.0:9.0f} ms")
+
+		users = [f"user-{rng.randrange(args.users)}" for _ in range(args.lookups)]
+		started = time.perf_counter()
+		for u in users:
+			store.list_for_user(u, limit=20)
+		indexed = (time.perf_counter() - started) / len(users)
+		scans = users[: max(1, min(20, len(users)))]
+		started = time.perf_counter()
+		for u in scans:
+			_scan(log_path, u, 20)
+		scanned = (time.perf_counter() - started) / len(scans)
+		print(f"page of 20, indexed             {indexed * 1e6:9.0f} us")
+		print(f"page of 20, full JSONL scan     {scanned * 1e6:9.0f} us  ({scanned / indexed:.0f}x slower)")
+
+		started = time.perf_counter()
+		for i in range(args.creates):
+			store.create(f"user-{i % args.users}", "Quero falar com um atendente", "handoff", idempotency_key=f"k{i}")
+		elapsed = time.perf_counter() - started
+		print(f"create (append + index)         {args.creates / elapsed:9.0f} tickets/s")
+		store.close()
+
+
+if __name__ == "__main__":
+	main()
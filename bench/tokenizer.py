@@ -0,0 +1,89 @@
+"""Benchmark the shared analyzer against the legacy regex tokenizer.
+
+Usage: python -m bench.tokenizer [--rounds 20]
+
+Reports tokenization throughput over the knowledge snapshots and recall@5 for
+a small labelled query set that mixes accented and unaccented spellings.
+"""
+import argparse
+import glob
+import os
+import re
+import time
+from typing import Callable, Dict, List, Tuple
+
+from rank_bm25 import BM25Okapi
+
+from app.analysis import analyze, analyze_query
+from app.agents.knowledge import _simple_clean
+from app.config import KNOWLEDGE_DIR
+
+
+# (query, expected snapshot filename suffix)
+LABELLED_QUERIES: List[Tuple[str, str]] = [
+	("credito parcelado sem cartao", "pix-parcelado"),
+	("crédito parcelado sem cartão", "pix-parcelado"),
+	("emprestimo para meu negocio", "emprestimo"),
+	("empréstimo para meu negócio", "emprestimo"),
+	("emitir boletos gratis", "boleto"),
+	("rendimento do saldo da conta", "rendimento"),
+	("celular como maquininha aproximacao", "maquininha-celular"),
+	("celular como maquininha aproximação", "maquininha-celular"),
+	("cartoes com cashback", "cartao"),
+	("cartões com cashback", "cartao"),
+	("gestao de estoque no pdv", "pdv"),
+	("gestão de estoque no PDV", "pdv"),
+]
+
+
+def _legacy_tokenize(text: str) -> List[str]:
+	return [t for t in re.split(r"\W+", text.lower()) if t]
+
+
+def _load_corpus() -> Dict[str, str]:
+	corpus: Dict[str, str] = {}
+	for p in sorted(glob.glob(os.path.join(KNOWLEDGE_DIR, "*.txt"))):
+		with open(p, "r", encoding="utf-8") as f:
+			corpus[os.path.basename(p)[: -len(".txt")]] = _simple_clean(f.read())
+	return corpus
+
+
+def _throughput(fn: Callable[[str], List[str]], docs: List[str], rounds: int) -> float:
+	total_bytes = sum(len(d.encode("utf-8")) for d in docs) * rounds
+	start = time.perf_counter()
+	for _ in range(rounds):
+		for d in docs:
+			fn(d)
+	return total_bytes / (time.perf_counter() - start) / 1e6
+
+
+def _recall(index_fn: Callable[[str], List[str]], query_fn: Callable[[str], List[str]], corpus: Dict[str, str]) -> float:
+	names = list(corpus)
+	bm25 = BM25Okapi([index_fn(corpus[n]) for n in names])
+	hits = 0
+	for query, expected in LABELLED_QUERIES:
+		scores = bm25.get_scores(list(query_fn(query)))
+		top = sorted(range(len(names)), key=lambda i: scores[i], reverse=True)[:5]
+		hits += any(names[i].endswith(expected) for i in top)
+	return hits / len(LABELLED_QUERIES)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--rounds", type=int, default=20)
+	args = parser.parse_args()
+	corpus = _load_corpus()
+	docs = list(corpus.values())
+	queries = [q for q, _ in LABELLED_QUERIES] * 100
+
+	print(f"docs={len(docs)} rounds={args.rounds}")
+	print(f"index  legacy   {_throughput(_legacy_tokenize, docs, args.rounds):8.2f} MB/s")
+	print(f"index  analyzer {_throughput(analyze, docs, args.rounds):8.2f} MB/s")
+	print(f"query  legacy   {_throughput(_legacy_tokenize, queries, args.rounds):8.2f} MB/s")
+	print(f"query  cached   {_throughput(analyze_query, queries, args.rounds):8.2f} MB/s")
+	print(f"recall@5 legacy   {_recall(_legacy_tokenize, _legacy_tokenize, corpus):.2f}")
+	print(f"recall@5 analyzer {_recall(analyze, analyze_query, corpus):.2f}")
+
+
+if __name__ == "__main__":
+	main()
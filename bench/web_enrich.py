@@ -0,0 +1,64 @@
+"""End-to-end latency of web search enrichment against a fixed deadline.
+
+Usage: python -m bench.web_enrich [--rounds 20] [--deadline-ms 1500]
+
+Result pages are served by an in-process httpx.MockTransport with randomized
+latency (a share of them far slower than the per-page timeout) and ~300 KB
+bodies, so the run is offline and exercises the byte limit, the per-page
+timeout and the page cache.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+from app.deadline import Deadline, deadline_scope
+from app.tools import enrich
+
+_PARAGRAPH = "<p>Com a maquininha você recebe na hora com taxa de 0,75% no débito e 2,69% no crédito.</p>"
+_FILLER = "<div><span>Conteúdo institucional sem relação com a pergunta do usuário.</span></div>"
+BODY = "<html><body>" + _PARAGRAPH + _FILLER * 4000 + "</body></html>"
+
+
+def _client(slow_share: float) -> httpx.AsyncClient:
+	async def handler(request: httpx.Request) -> httpx.Response:
+		slow = random.random() < slow_share
+		await asyncio.sleep(random.uniform(2.0, 4.0) if slow else random.uniform(0.02, 0.3))
+		return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, text=BODY)
+	return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def _round(i: int, args: argparse.Namespace, client: httpx.AsyncClient) -> float:
+	items = [(f"r{j}", f"https://site{i % args.distinct}-{j}.example/") for j in range(args.top_k)]
+	start = time.perf_counter()
+	with deadline_scope(Deadline(args.deadline_ms)):
+		await enrich.enrich_results("taxa no débito", items, top_k=args.top_k, page_timeout_ms=args.page_timeout_ms, client=client)
+	return (time.perf_counter() - start) * 1000.0
+
+
+async def _main(args: argparse.Namespace) -> None:
+	async with _client(args.slow_share) as client:
+		lat = sorted([await _round(i, args, client) for i in range(args.rounds)])
+	over = sum(1 for v in lat if v > args.deadline_ms)
+	print(
+		f"rounds={args.rounds} p50={statistics.median(lat):7.1f}ms p95={lat[int(len(lat) * 0.95) - 1]:7.1f}ms "
+		f"max={lat[-1]:7.1f}ms deadline={args.deadline_ms:.0f}ms over_deadline={over}"
+	)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--rounds", type=int, default=20)
+	parser.add_argument("--top-k", type=int, default=3)
+	parser.add_argument("--distinct", type=int, default=10, help="distinct result sets (repeats hit the cache)")
+	parser.add_argument("--deadline-ms", type=float, default=1500)
+	parser.add_argument("--page-timeout-ms", type=float, default=1000)
+	parser.add_argument("--slow-share", type=float, default=0.2)
+	asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+	main()
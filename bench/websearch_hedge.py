@@ -0,0 +1,80 @@
+"""Hedged web search: latency and extra provider calls by hedge delay, offline.
+
+Usage: python -m bench.websearch_hedge [--queries 1000] [--failure-rate 0.05] [--timeout-ms 2000]
+
+Two simulated providers: a primary with log-normal latency (median
+``--primary-ms``) that hangs until ``--timeout-ms`` and fails on
+``--failure-rate`` of the calls, and a slower, reliable secondary. Compares
+the old sequential fallback (secondary only after the primary failed) with
+hedge delays of 300/100 ms and all-at-once, reporting p50/p95/p99 latency and
+provider calls per query (the extra load hedging costs).
+"""
+from typing import List, Optional
+import argparse
+import asyncio
+import random
+import time
+
+from app.tools.websearch import HedgedSearch, SearchProvider
+
+
+class _SimulatedProvider(SearchProvider):
+	def __init__(self, name: str, median_ms: float, sigma: float, failure_rate: float, timeout_ms: float, rng: random.Random) -> None:
+		self.name = name
+		self.median_ms = median_ms
+		self.sigma = sigma
+		self.failure_rate = failure_rate
+		self.timeout_ms = timeout_ms
+		self.rng = rng
+		self.calls = 0
+
+	async def search(self, client, query: str):
+		self.calls += 1
+		if self.rng.random() < self.failure_rate:
+			await asyncio.sleep(self.timeout_ms / 1000.0)
+			raise TimeoutError(f"{self.name} timed out")
+		await asyncio.sleep(min(self.timeout_ms, self.median_ms * self.rng.lognormvariate(0.0, self.sigma)) / 1000.0)
+		return [(f"{self.name} result", f"https://{self.name}.example/")]
+
+
+def _percentile(values: List[float], q: float) -> float:
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _run(hedge_ms: Optional[float], args) -> None:
+	rng = random.Random(args.seed)
+	primary = _SimulatedProvider("primary", args.primary_ms, 0.5, args.failure_rate, args.timeout_ms, rng)
+	secondary = _SimulatedProvider("secondary", args.secondary_ms, 0.3, 0.0, args.timeout_ms, rng)
+	hedged = HedgedSearch([primary, secondary], hedge_ms)
+	sem = asyncio.Semaphore(args.concurrency)
+
+	async def one(i: int) -> float:
+		async with sem:
+			t0 = time.perf_counter()
+			await hedged.search(None, f"query {i}")
+			return (time.perf_counter() - t0) * 1000.0
+
+	times = await asyncio.gather(*(one(i) for i in range(args.queries)))
+	label = "sequential" if hedge_ms is None else ("all at once" if hedge_ms == 0 else f"hedge {hedge_ms:.0f} ms")
+	calls = (primary.calls + secondary.calls) / args.queries
+	print(f"{label:<14}{_percentile(times, 0.5):9.1f}{_percentile(times, 0.95):9.1f}{_percentile(times, 0.99):9.1f}{calls:12.2f}")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--queries", type=int, default=1000)
+	parser.add_argument("--concurrency", type=int, default=200)
+	parser.add_argument("--primary-ms", type=float, default=120.0)
+	parser.add_argument("--secondary-ms", type=float, default=250.0)
+	parser.add_argument("--failure-rate", type=float, default=0.05)
+	parser.add_argument("--timeout-ms", type=float, default=2000.0)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+	print(f"{'':<14}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls/query':>12}")
+	for hedge_ms in (None, 300.0, 100.0, 0.0):
+		asyncio.run(_run(hedge_ms, args))
+
+
+if __name__ == "__main__":
+	main()
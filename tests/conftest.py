@@ -1,6 +1,17 @@
 import os
 import sys
 
+import pytest
+
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
 	sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_conversation_memory():
+	# Conversation memory is process-wide; keep follow-up detection from leaking across tests
+	from app.memory import get_memory
+
+	get_memory().reset()
+	yield
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.admission as admission
+from app.admission import AdmissionController, ConcurrencyGate, Overloaded, RateLimiter
+from app.router import RouterAgent
+
+
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+class FakeClock:
+	def __init__(self) -> None:
+		self.now = 0.0
+
+	def __call__(self) -> float:
+		return self.now
+
+
+def test_token_bucket_burst_refill_and_retry_after():
+	clock = FakeClock()
+	limiter = RateLimiter(rate=2.0, burst=3, clock=clock)
+	assert [limiter.allow("u") for _ in range(4)] == [True, True, True, False]
+	assert limiter.retry_after("u") == pytest.approx(0.5)
+	clock.now = 0.5
+	assert limiter.allow("u") and not limiter.allow("u")
+	# Other keys have their own bucket; refill never exceeds the burst
+	assert limiter.allow("v")
+	clock.now = 100.0
+	assert [limiter.allow("u") for _ in range(4)] == [True, True, True, False]
+
+
+def test_rate_limiter_bounds_tracked_keys():
+	limiter = RateLimiter(rate=1.0, burst=1, max_keys=2)
+	for key in ("a", "b", "c"):
+		limiter.allow(key)
+	assert len(limiter) == 2
+
+
+def test_gate_queues_then_sheds():
+	async def scenario():
+		gate = ConcurrencyGate(limit=1, max_queue=1, queue_timeout_s=1.0)
+		await gate.acquire()
+		waiter = asyncio.ensure_future(gate.acquire())
+		await asyncio.sleep(0)
+		assert gate.waiting == 1
+		with pytest.raises(Overloaded):
+			await gate.acquire()
+		gate.release()
+		await waiter  # slot handed over to the queued request
+		assert gate.active == 1 and gate.waiting == 0
+		gate.release()
+		assert gate.active == 0
+
+	run(scenario())
+
+
+def test_gate_queue_timeout_sheds():
+	async def scenario():
+		gate = ConcurrencyGate(limit=1, max_queue=4, queue_timeout_s=0.01)
+		await gate.acquire()
+		with pytest.raises(Overloaded):
+			await gate.acquire()
+		gate.release()
+		# The timed-out waiter must not swallow the freed slot
+		assert gate.active == 0
+
+	run(scenario())
+
+
+def test_route_limit_answers_without_creating_ticket(tmp_path, monkeypatch):
+	# Keep the ticket out of the repo's data/ directory
+	monkeypatch.setattr("app.agents.handoff.TICKETS_FILEPATH", str(tmp_path / "tickets.jsonl"))
+	r = RouterAgent()
+	r.admission = AdmissionController(route_limits={"handoff": (0.001, 1)})
+	first, _ = run(r.handle("I want to talk to a human agent", "limited-user"))
+	second, text = run(r.handle("I want to talk to a human agent", "limited-user"))
+	assert first.startswith("handoff")
+	assert second == "admission:rate_limited"
+	assert text == admission.RATE_LIMITED_TEXT
+	with open(tmp_path / "tickets.jsonl", encoding="utf-8") as f:
+		assert len(f.readlines()) == 1
+
+
+def test_chat_rate_limits_per_user(monkeypatch):
+	from app.main import app
+
+	monkeypatch.setattr(admission, "_default", AdmissionController(user_rps=0.001, user_burst=2))
+	client = TestClient(app)
+	routes = [client.post("/chat", json={"message": "taxas da maquininha", "user_id": "flood"}) for _ in range(3)]
+	assert [r.json()["route"] for r in routes[:2]] == ["knowledge", "knowledge"]
+	assert routes[2].json()["route"] == "admission:rate_limited"
+	assert int(routes[2].headers["Retry-After"]) >= 1
+	# Another user is unaffected
+	assert client.post("/chat", json={"message": "taxas da maquininha", "user_id": "calm"}).json()["route"] == "knowledge"
+
+
+def test_chat_sheds_when_overloaded(monkeypatch):
+	from app.main import app
+
+	controller = AdmissionController(max_concurrency=1, max_queue=0)
+	controller.gate.active = 1  # another request holds the only slot
+	monkeypatch.setattr(admission, "_default", controller)
+	resp = TestClient(app).post("/chat", json={"message": "taxas da maquininha", "user_id": "u-shed"})
+	assert resp.json()["route"] == "admission:shed"
+	assert resp.headers["Retry-After"] == "1"
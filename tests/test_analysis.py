@@ -0,0 +1,44 @@
+from app.analysis import analyze, analyze_query, fold_accents, tokenize
+
+
+def test_accent_folding_merges_variants():
+	assert fold_accents("crédito cartão ação") == "credito cartao acao"
+	assert analyze("crédito") == analyze("credito")
+
+
+def test_light_stemmer_and_stopwords():
+	assert analyze("taxas") == analyze("taxa")
+	assert analyze("cartões") == analyze("cartão")
+	# Stopwords are dropped, numbers and short codes are kept
+	assert analyze("quais as taxas de 12x") == analyze("taxa 12x")
+
+
+def test_decomposed_input_is_normalized():
+	assert tokenize("cre\u0301dito") == ["credito"]
+
+
+def test_query_analysis_is_cached():
+	analyze_query.cache_clear()
+	first = analyze_query("Quais as taxas da maquininha?")
+	second = analyze_query("Quais as taxas da maquininha?")
+	assert first is second
+	assert analyze_query.cache_info().hits == 1
+
+
+def test_synonym_classes_apply_to_retrieval():
+	from app.agents.knowledge import BM25RAG
+	assert analyze("fees") == analyze("taxas") == analyze("tarifa")
+	rag = BM25RAG(["Cartão de crédito com cashback.", "Boleto sem tarifa de emissão."])
+	assert rag.search("credit card", k=1) == ["Cartão de crédito com cashback."]
+
+
+def test_custom_synonyms_file(tmp_path):
+	from app.analysis import DEFAULT_SYNONYMS, load_synonyms, set_synonyms
+	path = tmp_path / "syn.json"
+	path.write_text('{"rendimento": ["yield", "juros"]}', encoding="utf-8")
+	try:
+		set_synonyms(load_synonyms(str(path)))
+		assert analyze("yield") == analyze("rendimento") == analyze("juros")
+		assert analyze("fees") != analyze("taxas")
+	finally:
+		set_synonyms(DEFAULT_SYNONYMS)
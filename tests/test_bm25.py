@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from app import analysis
+from app.agents.knowledge import BM25RAG
+from app.analysis import analyze, analyze_query
+from app.bm25 import BM25Index, load_snapshot, read_header, source_fingerprint, write_snapshot
+
+DOCS = [
+	"Taxas da maquininha: débito 0,35% e crédito à vista 2,69%.",
+	"Pix parcelado em até 12x com taxa a partir de 1,79%.",
+	"Use o celular como maquininha com Tap to Pay no iPhone ou Android.",
+	"Boleto e link de pagamento direto na conta digital.",
+	"Conta PJ gratuita com rendimento diário.",
+]
+
+
+def _write_sources(tmp_path):
+	paths = []
+	for i, doc in enumerate(DOCS):
+		p = tmp_path / f"doc{i}.txt"
+		p.write_text(doc, encoding="utf-8")
+		paths.append(str(p))
+	return paths
+
+
+@pytest.mark.parametrize("query", ["taxas da maquininha", "pix 12x", "celular tap to pay", "conta", "zzz"])
+def test_scores_match_rank_bm25(query):
+	tokenized = [analyze(d) for d in DOCS]
+	terms = list(analyze_query(query))
+	assert np.array_equal(BM25Okapi(tokenized).get_scores(terms), BM25Index.from_corpus(tokenized).get_scores(terms))
+
+
+def test_snapshot_roundtrip_is_memory_mapped(tmp_path):
+	paths = _write_sources(tmp_path)
+	snap = str(tmp_path / "bm25.snap")
+	index = BM25Index.from_corpus([analyze(d) for d in DOCS])
+	write_snapshot(snap, DOCS, index, source_fingerprint(paths))
+	documents, loaded = load_snapshot(snap, source_fingerprint(paths))
+	assert list(documents) == DOCS
+	assert isinstance(documents.text.obj, np.memmap) and documents.lines(0) == DOCS[0].splitlines()
+	assert isinstance(loaded.post_doc.base, np.memmap) or isinstance(loaded.post_doc, np.memmap)
+	terms = list(analyze_query("taxa crédito"))
+	assert np.array_equal(loaded.get_scores(terms), index.get_scores(terms))
+
+
+def test_snapshot_staleness_and_corruption(tmp_path):
+	paths = _write_sources(tmp_path)
+	snap = str(tmp_path / "bm25.snap")
+	write_snapshot(snap, DOCS, BM25Index.from_corpus([analyze(d) for d in DOCS]), source_fingerprint(paths))
+	# Source edited after the build
+	with open(paths[0], "a", encoding="utf-8") as f:
+		f.write(" Nova taxa.")
+	assert load_snapshot(snap, source_fingerprint(paths)) is None
+	# Analyzer changed (synonyms are part of its fingerprint)
+	try:
+		analysis.set_synonyms([["taxa", "imposto"]])
+		assert load_snapshot(snap) is None
+	finally:
+		analysis.set_synonyms(analysis.DEFAULT_SYNONYMS)
+	assert load_snapshot(snap) is not None
+	with open(snap, "r+b") as f:
+		f.write(b"garbage!")
+	assert read_header(snap) is None and load_snapshot(snap) is None
+	assert load_snapshot(str(tmp_path / "missing.snap")) is None
+
+
+def test_rag_prefers_fresh_snapshot(tmp_path):
+	paths = _write_sources(tmp_path)
+	snap = str(tmp_path / "bm25.snap")
+	assert BM25RAG.from_snapshot(snap, str(tmp_path)) is None
+	write_snapshot(snap, DOCS, BM25Index.from_corpus([analyze(d) for d in DOCS]), source_fingerprint(paths))
+	rag = BM25RAG.from_snapshot(snap, str(tmp_path))
+	assert rag is not None
+	assert rag.search("taxas da maquininha", k=1) == BM25RAG(DOCS).search("taxas da maquininha", k=1)
@@ -0,0 +1,73 @@
+import hashlib
+import multiprocessing
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.capture import CaptureLog, CaptureMiddleware, pseudonym, read_capture
+
+
+def _client(log):
+	return TestClient(CaptureMiddleware(main.app, log))
+
+
+def test_capture_records_scrubbed_requests_with_route_and_stages(tmp_path):
+	log = CaptureLog(str(tmp_path / "capture.jsonl"))
+	client = _client(log)
+	resp = client.post("/chat", json={"message": "taxas da maquininha? me avise em ana@example.com", "user_id": "ana@example.com"})
+	assert resp.status_code == 200
+	client.post("/chat/batch", json={"items": [{"message": "mostrar extrato", "user_id": "u1"}]})
+	client.get("/healthz")
+	log.flush()
+	first, batch = read_capture(log.path)
+	assert first["path"] == "/chat" and first["status"] == 200 and first["route"] == resp.json()["route"]
+	assert "ana@example.com" not in first["message"] and "[redacted]" in first["message"]
+	assert first["user"] == pseudonym("ana@example.com") != "ana@example.com"
+	assert {"guardrails", "router", "finish", "agent.knowledge"} <= set(first["stages"])
+	assert first["ms"] >= first["stages"]["router"]
+	assert batch["items"] == [{"user": pseudonym("u1"), "message": "mostrar extrato", "route": "support"}]
+
+
+def test_capture_sampling_and_rotation(tmp_path):
+	path = str(tmp_path / "capture.jsonl")
+	client = _client(CaptureLog(path, sample=0.0))
+	client.post("/chat", json={"message": "mostrar extrato", "user_id": "u2"})
+	client.app.log.flush()
+	assert read_capture(path) == []
+	log = CaptureLog(path, max_bytes=600, backups=2)
+	for i in range(20):
+		log.write({"i": i, "pad": "x" * 100})
+	log.flush()
+	records = read_capture(path)
+	# The oldest records rolled off; what is left is contiguous and in order
+	assert [r["i"] for r in records] == list(range(20 - len(records), 20))
+	assert len(records) < 20
+	assert sorted(p.name for p in tmp_path.iterdir()) == ["capture.jsonl", "capture.jsonl.1", "capture.jsonl.2", "capture.jsonl.lock"]
+
+
+def test_pseudonyms_are_keyed():
+	assert pseudonym("u1") == pseudonym("u1") != pseudonym("u2")
+	assert pseudonym("u1", key=b"other secret") != pseudonym("u1")
+	assert hashlib.sha1(b"u1").hexdigest()[:12] not in pseudonym("u1")
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_forked_writers_rotate_without_losing_records(tmp_path):
+	log = CaptureLog(str(tmp_path / "capture.jsonl"), max_bytes=2000, backups=1000)
+
+	def writer(n: int) -> None:
+		for i in range(100):
+			log.write({"w": n, "i": i, "pad": "x" * 50})
+		log.flush()
+
+	ctx = multiprocessing.get_context("fork")
+	procs = [ctx.Process(target=writer, args=(n,)) for n in range(4)]
+	for p in procs:
+		p.start()
+	for p in procs:
+		p.join()
+	records = read_capture(log.path)
+	assert len(records) == 400
+	for n in range(4):
+		assert [r["i"] for r in records if r["w"] == n] == list(range(100))
@@ -0,0 +1,23 @@
+from app.context_packer import count_tokens, pack_context
+
+
+def test_packer_respects_budget_and_prefers_relevant_text():
+	filler = "\n".join(f"Linha institucional número {i} sobre a empresa." for i in range(200))
+	relevant = "A taxa no débito é 0,75%.\nNo crédito à vista a taxa é 2,69%."
+	packed = pack_context("Qual a taxa no débito?", [filler, relevant], budget_tokens=60)
+	assert packed.tokens <= 60
+	assert sum(count_tokens(c) for c in packed.chunks) == packed.tokens
+	assert "0,75%" in packed.chunks[0]
+	assert not any("institucional" in c for c in packed.chunks)
+
+
+def test_packer_drops_near_duplicate_chunks():
+	page = "Pix grátis e ilimitado.\nTaxa zero no Pix para vendas."
+	packed = pack_context("taxa do pix", [page, page], budget_tokens=500)
+	assert len(packed.chunks) == 1
+	assert packed.duplicates_dropped == 1
+
+
+def test_empty_documents():
+	packed = pack_context("pix", [], budget_tokens=100)
+	assert packed.chunks == [] and packed.tokens == 0
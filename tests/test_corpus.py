@@ -0,0 +1,32 @@
+from app.context_packer import pack_context, split_chunks
+from app.corpus import CorpusStore
+
+DOCS = [
+	"Maquininha Smart\nDébito: 1,37%\n\nCrédito à vista: 3,15%\n" + "Linha longa de texto sobre recebimentos. " * 30,
+	"",
+	"Pix sem taxa\r\nparcelado em até 12x último item",
+]
+
+
+def test_store_reads_documents_lines_and_chunks_back():
+	store = CorpusStore.from_documents(DOCS)
+	assert len(store) == 3 and list(store) == DOCS and store[-1] == DOCS[-1]
+	for i, doc in enumerate(DOCS):
+		assert store.lines(i) == doc.splitlines()
+		assert store.chunks(i) == split_chunks(doc)
+	assert store.nbytes >= sum(len(d.encode("utf-8")) for d in DOCS)
+
+
+def test_views_share_the_buffer():
+	store = CorpusStore.from_documents(DOCS)
+	view = store.view(2)
+	assert isinstance(view, memoryview) and view.obj is store.text.obj
+	assert bytes(view).decode("utf-8") == DOCS[2]
+	assert bytes(store.line_view(store.doc_lines[0] + 1)) == "Débito: 1,37%".encode("utf-8")
+
+
+def test_pack_context_accepts_precomputed_chunks():
+	store = CorpusStore.from_documents(DOCS)
+	by_text = pack_context("taxa débito", DOCS, budget_tokens=200)
+	by_chunks = pack_context("taxa débito", [store.chunks(i) for i in range(len(store))], budget_tokens=200)
+	assert by_chunks == by_text
@@ -0,0 +1,65 @@
+import asyncio
+
+from app.deadline import Deadline, current_deadline, deadline_scope
+from app.metrics import metrics
+from app.router import RouterAgent
+
+
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_deadline_child_takes_earliest_expiry():
+	parent = Deadline(50)
+	assert parent.child(10_000) is parent
+	assert parent.child(10).remaining() <= 0.01
+	assert Deadline().remaining() is None
+	assert Deadline().timeout(cap=5.0) == 5.0
+
+
+def test_slow_llm_degrades_to_knowledge_snippets():
+	r = RouterAgent()
+
+	class _SlowLLM:
+		async def handle(self, message, user_id):
+			await asyncio.sleep(5)
+			return ("llm", "too late")
+
+	r.llm = _SlowLLM()
+	r.route_deadlines_ms["llm"] = 50
+	before = metrics.get("deadline.degraded.llm")
+	route, answer = run(r.handle("Quais as taxas da maquininha?", "u1"))
+	assert route == "knowledge:degraded"
+	assert answer
+	assert metrics.get("deadline.degraded.llm") == before + 1
+
+
+def test_expired_request_deadline_skips_web_search():
+	r = RouterAgent()
+
+	async def scenario():
+		with deadline_scope(Deadline(1)):
+			await asyncio.sleep(0.01)
+			assert current_deadline().expired
+			return await r.handle("assunto aleatório sem intenção", "u1")
+
+	route, _ = run(scenario())
+	assert route == "router"
+
+
+def test_slow_handoff_degrades_to_a_retry_hint():
+	r = RouterAgent()
+
+	class _SlowAgent:
+		async def handle(self, message, user_id):
+			await asyncio.sleep(5)
+			return ("handoff", "too late")
+
+	r.handoff = _SlowAgent()
+	r.slack = _SlowAgent()
+	r.route_deadlines_ms["handoff"] = 50
+	r.route_deadlines_ms["slack"] = 50
+	route, answer = run(r.handle("quero falar com um atendente", "u1"))
+	assert (route, answer) == ("handoff:degraded", "Não consegui abrir seu chamado com um atendente agora. Pode tentar novamente em instantes?")
+	route, _ = run(r.handle("notificar equipe sobre o incidente", "u2"))
+	assert route == "slack:degraded"
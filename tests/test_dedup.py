@@ -0,0 +1,82 @@
+import numpy as np
+
+import app.bm25 as bm25
+from app.analysis import analyze
+from app.dedup import CorpusCleaner, LSHIndex, MinHasher, jaccard, shingles
+
+FOOTER = ["Compre agora sua Maquininha", "Perguntas frequentes", "Abrir conta grátis"]
+
+
+def _page(title, body):
+	return "\n".join([title] + body + FOOTER)
+
+
+def test_minhash_estimates_jaccard_and_lsh_finds_near_duplicates():
+	base = " ".join(f"palavra{i}" for i in range(200))
+	near = base.replace("palavra100", "outra")
+	far = " ".join(f"termo{i}" for i in range(200))
+	a, b, c = shingles(base), shingles(near), shingles(far)
+	assert jaccard(a, b) > 0.9 and jaccard(a, c) == 0.0
+	hasher = MinHasher(64)
+	sa, sb = hasher.signature(a), hasher.signature(b)
+	assert abs(np.mean(np.array(sa) == np.array(sb)) - jaccard(a, b)) < 0.15
+	lsh = LSHIndex(16, 4)
+	lsh.insert(0, sa)
+	assert lsh.candidates(sb) == {0}
+	assert lsh.candidates(hasher.signature(c)) == set()
+
+
+def test_near_duplicate_documents_collapse_into_the_first():
+	body = [f"A gestão de cobrança envia lembretes automáticos pelo WhatsApp, passo {i}." for i in range(30)]
+	copy = list(body)
+	copy[3] = "A gestão de cobrança ajuda a reduzir a inadimplência com lembretes automáticos."
+	docs = [_page("Gestão de cobrança", body), _page("Gestão de cobranças", copy), _page("Pix", ["Pix sem taxa para receber."])]
+	cleaned, report = CorpusCleaner(boilerplate_min_docs=10).clean(docs)
+	assert report.duplicate_docs == 1 and report.docs_out == 2
+	assert cleaned[0].startswith("Gestão de cobrança\n") and cleaned[1].startswith("Pix")
+
+
+def test_boilerplate_lines_are_stripped_but_fee_lines_kept():
+	docs = [
+		_page(f"Produto {i}", [f"Descrição exclusiva do produto {i} e seus benefícios.", "Débito: 0,35%", "12x de R$ 16,58"])
+		for i in range(6)
+	]
+	cleaned, report = CorpusCleaner(boilerplate_ratio=0.5, boilerplate_min_docs=4).clean(docs)
+	assert report.boilerplate_lines == len(FOOTER)
+	for i, doc in enumerate(cleaned):
+		assert "Compre agora" not in doc and "Perguntas frequentes" not in doc
+		assert f"produto {i}" in doc and "Débito: 0,35%" in doc and "R$ 16,58" in doc
+	assert report.lines_out < report.lines_in
+
+
+def test_repeated_chunks_are_dropped_except_fee_tables_of_other_pages():
+	promo = "\n".join(f"Linha promocional repetida número {i} com cashback e benefícios." for i in range(24))
+	table = "\n".join(f"Crédito em {i}x: {i},99%" for i in range(2, 14))
+	smart = "\n".join(f"A Maquininha Smart imprime o comprovante {i} e aceita chip e senha." for i in range(12))
+	tap = "\n".join(f"Com Tap to Pay o celular recebe por aproximação, etapa {i} do cadastro." for i in range(12))
+	docs = [
+		f"Maquininha Smart\n{smart}\n{promo}\n{table}",
+		f"Tap to Pay no celular\n{tap}\n{promo}\n{table}",
+	]
+	cleaned, report = CorpusCleaner(boilerplate_min_docs=10).clean(docs)
+	assert report.duplicate_chunks >= 1
+	# Content-defined chunk boundaries line up inside the shared passage
+	assert cleaned[0].count("promocional") == 24 and cleaned[1].count("promocional") < 12
+	assert "Crédito em 12x: 12,99%" in cleaned[1]
+
+
+def test_small_corpora_pass_through_unchanged():
+	docs = ["Maquininha Smart possui taxas competitivas.", "Tap to Pay transforma seu celular em maquininha."]
+	cleaned, report = CorpusCleaner().clean(docs)
+	assert cleaned == docs
+	assert report.duplicate_docs == report.boilerplate_lines == report.duplicate_chunks == 0
+
+
+def test_snapshot_goes_stale_when_cleaning_changes(tmp_path, monkeypatch):
+	docs = ["Taxas da maquininha: débito 0,35%.", "Pix parcelado em até 12x."]
+	snap = str(tmp_path / "bm25.snap")
+	bm25.write_snapshot(snap, docs, bm25.BM25Index.from_corpus([analyze(d) for d in docs]), "src", {"docs_in": 2})
+	assert bm25.read_header(snap)["cleaning_report"] == {"docs_in": 2}
+	assert bm25.load_snapshot(snap, "src") is not None
+	monkeypatch.setattr(bm25, "cleaning_fingerprint", lambda: "other")
+	assert bm25.load_snapshot(snap, "src") is None
@@ -0,0 +1,63 @@
+import asyncio
+
+import httpx
+
+from app.tools import enrich
+from app.tools.html_extract import html_to_text
+
+PAGE = """<html><head><title>x</title><style>.a{}</style></head><body>
+<nav>Menu Início Produtos</nav>
+<p>A maquininha Smart cobra taxa de 0,75% no débito para todos os clientes.</p>
+<script>var taxa = 99;</script>
+<p>Nosso blog traz novidades semanais sobre empreendedorismo e vendas.</p>
+</body></html>"""
+
+
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def _client(calls, slow_url=""):
+	async def handler(request: httpx.Request) -> httpx.Response:
+		calls.append(str(request.url))
+		if str(request.url) == slow_url:
+			await asyncio.sleep(1.0)
+		return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, text=PAGE)
+	return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_html_to_text_skips_scripts_and_styles():
+	text = html_to_text([PAGE[:60], PAGE[60:]])
+	assert "0,75%" in text
+	assert "var taxa" not in text and ".a{}" not in text
+
+
+def test_enrichment_summarizes_and_skips_slow_pages():
+	enrich.page_cache = enrich.PageCache()
+	calls = []
+	items = [("A", "https://a.example/"), ("B", "https://b.example/slow")]
+
+	async def scenario():
+		async with _client(calls, slow_url="https://b.example/slow") as client:
+			return await enrich.enrich_results("taxa no débito", items, page_timeout_ms=200, client=client)
+
+	summary = run(scenario())
+	assert "0,75%" in summary.splitlines()[0]
+	assert "Fontes: https://a.example/" in summary
+	assert "b.example" not in summary
+
+
+def test_pages_are_cached_and_byte_limited():
+	enrich.page_cache = enrich.PageCache()
+	calls = []
+
+	async def scenario():
+		async with _client(calls) as client:
+			first = await enrich.fetch_page_text(client, "https://a.example/", max_bytes=120)
+			await enrich.enrich_results("taxa", [("A", "https://a.example/")], client=client)
+			await enrich.enrich_results("taxa", [("A", "https://a.example/")], client=client)
+			return first
+
+	truncated = run(scenario())
+	assert "0,75%" not in truncated
+	assert calls.count("https://a.example/") == 2  # one direct fetch + one cached enrichment
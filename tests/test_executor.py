@@ -0,0 +1,115 @@
+import asyncio
+import gc
+import multiprocessing
+import time
+
+import pytest
+
+from app import executor
+from app.executor import ExecutorTimeout, CPUExecutor, register, unregister
+from app.metrics import metrics
+
+
+class _Slow:
+	def work(self, seconds: float) -> str:
+		time.sleep(seconds)
+		return "done"
+
+
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_thread_mode_runs_registered_target():
+	target = _Slow()
+	name = register("test:slow", target)
+	ex = CPUExecutor("thread", workers=1)
+	try:
+		assert run(ex.call(name, "work", 0.0)) == "done"
+	finally:
+		ex.shutdown()
+
+
+def test_timeout_raises_and_counts():
+	target = _Slow()
+	name = register("test:slow", target)
+	ex = CPUExecutor("thread", workers=1, timeout_ms=20)
+	before = metrics.get("executor.timeout")
+	try:
+		with pytest.raises(ExecutorTimeout):
+			run(ex.call(name, "work", 0.3))
+	finally:
+		ex.shutdown()
+	assert metrics.get("executor.timeout") == before + 1
+
+
+def test_knowledge_agent_degrades_when_over_budget():
+	from app.agents.knowledge import KnowledgeAgent
+
+	class _Overloaded(CPUExecutor):
+		async def call(self, name, method, *args, timeout_ms=None):
+			raise ExecutorTimeout("slow")
+
+	agent = KnowledgeAgent()
+	agent.executor = _Overloaded()
+	route, _ = run(agent.handle("Quais as taxas da maquininha?", "u1"))
+	assert route == "knowledge:fallback"
+
+
+def test_targets_are_held_weakly_and_reregistering_does_not_refork():
+	target = _Slow()
+	register("test:weak", target)
+	generation = executor._generation
+	register("test:weak", target)
+	assert executor._generation == generation
+	del target
+	gc.collect()
+	assert "test:weak" not in executor._TARGETS
+	other = _Slow()
+	register("test:other", other)
+	unregister("test:other")
+	assert "test:other" not in executor._TARGETS
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_process_timeout_kills_the_work_and_recycles_the_pool():
+	target = _Slow()
+	name = register("test:slow-process", target)
+	ex = CPUExecutor("process", workers=1, timeout_ms=100)
+	try:
+		run(ex.call(name, "work", 0.0))
+		pool = ex._pool
+		workers = list(pool._processes.values())
+		with pytest.raises(ExecutorTimeout):
+			run(ex.call(name, "work", 30.0))
+		assert ex._pool is None
+		for process in workers:
+			process.join(timeout=5)
+			assert not process.is_alive()
+		# The next call runs on a fresh pool
+		assert run(ex.call(name, "work", 0.0)) == "done"
+	finally:
+		ex.shutdown()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_refork_lets_queued_calls_on_the_old_pool_finish():
+	target = _Slow()
+	name = register("test:queued", target)
+	ex = CPUExecutor("process", workers=1)
+
+	async def scenario():
+		first = asyncio.ensure_future(ex.call(name, "work", 0.2))
+		# More than the pool pre-loads into its call queue, so some stay pending
+		queued = asyncio.gather(*(ex.call(name, "work", 0.0) for _ in range(4)))
+		await asyncio.sleep(0.05)
+		other = _Slow()
+		register("test:queued-other", other)
+		# This call re-forks the pool while `queued` still waits on the old one
+		fresh = await ex.call("test:queued-other", "work", 0.0)
+		return await first, await queued, fresh
+
+	try:
+		assert run(scenario()) == ("done", ["done"] * 4, "done")
+	finally:
+		ex.shutdown()
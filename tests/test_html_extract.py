@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from app.tools.html_extract import available_backends, decode_html, extract_links, html_to_text, visible_text
+from app.tools.websearch import _extract_results_from_html, _normalize_url
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _fixture(name: str) -> str:
+	with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+		return f.read()
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backends_agree_on_search_anchors(backend):
+	html = _fixture("ddg_results.html")
+	classes = ("result__a", "result__url", "result__title")
+	assert extract_links(html, classes, backend) == extract_links(html, classes, "stdlib")
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backends_agree_on_visible_text(backend):
+	html = _fixture("infinitepay_maquininha.html")
+	assert visible_text(html, backend).split() == visible_text(html, "stdlib").split()
+
+
+def test_search_results_match_beautifulsoup():
+	bs4 = pytest.importorskip("bs4")
+	html = _fixture("ddg_results.html")
+	soup = bs4.BeautifulSoup(html, "html.parser")
+	legacy_urls = []
+	for a in soup.select("a.result__a, a.result__url, a.result__title"):
+		url = _normalize_url(a.get("href") or "")
+		if url and url not in legacy_urls:
+			legacy_urls.append(url)
+	results = _extract_results_from_html(html)
+	assert [u for _, u in results] == legacy_urls
+	assert results[1][0] == "InfiniteTap: transforme seu celular em maquininha"
+
+
+def test_page_text_matches_beautifulsoup_body():
+	bs4 = pytest.importorskip("bs4")
+	html = _fixture("infinitepay_maquininha.html")
+	soup = bs4.BeautifulSoup(html, "html.parser")
+	for tag in soup(["noscript", "svg"]):
+		tag.decompose()
+	expected = soup.body.get_text(separator=" ").split()
+	assert visible_text(html).split() == expected
+	assert "0,75%" in visible_text(html).splitlines()
+
+
+def test_streaming_chunks_and_charset_detection():
+	raw = _fixture("infinitepay_maquininha.html").encode("utf-8")
+	text = decode_html(raw)
+	chunks = [text[i:i + 1000] for i in range(0, len(text), 1000)]
+	assert html_to_text(chunks).split() == visible_text(text, "stdlib").split()
+	assert decode_html("<meta charset=latin-1>Crédito".encode("latin-1")).endswith("Crédito")
@@ -0,0 +1,139 @@
+import asyncio
+import sys
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.intent as intent
+from app.intent import EVAL_PATH, TRAIN_PATH, IntentModel, load_labelled, train
+from app.router import RouterAgent, keyword_intent
+
+
+def run(coro):
+	import asyncio
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+@pytest.fixture(scope="module")
+def model():
+	return train(*load_labelled(TRAIN_PATH))
+
+
+def test_model_beats_keywords_on_paraphrases(model):
+	messages, labels = load_labelled(EVAL_PATH)
+	keywords = [keyword_intent(m.lower()) or "other" for m in messages]
+	predicted = [label for label, _ in model.predict(messages)]
+	kw_acc = np.mean([a == b for a, b in zip(keywords, labels)])
+	model_acc = np.mean([a == b for a, b in zip(predicted, labels)])
+	assert model_acc >= 0.8 and model_acc > kw_acc
+
+
+def test_batch_prediction_matches_single(model):
+	messages, _ = load_labelled(EVAL_PATH)
+	batch = model.predict(messages)
+	single = [model.predict([m])[0] for m in messages]
+	assert [label for label, _ in batch] == [label for label, _ in single]
+	assert np.allclose([p for _, p in batch], [p for _, p in single], atol=1e-5)
+
+
+def test_save_load_roundtrip_and_staleness(model, tmp_path, monkeypatch):
+	path = str(tmp_path / "intent.npz")
+	model.save(path)
+	loaded = IntentModel.load(path)
+	messages = ["quero falar com uma pessoa", "qual a taxa do débito?"]
+	assert loaded.predict(messages) == pytest.approx(model.predict(messages))
+	assert IntentModel.load(str(tmp_path / "missing.npz")) is None
+	monkeypatch.setattr(intent, "FEATURE_VERSION", intent.FEATURE_VERSION + 1)
+	assert IntentModel.load(path) is None
+
+
+def test_router_classifier_mode_with_keyword_fallback(model):
+	r = RouterAgent()
+	message = "não consigo entrar no app"
+	assert r.classify([message]) == ["other"]
+	r.intent_model = model
+	assert r.classify([message]) == ["support"]
+	route, _ = run(r.handle(message, "u-intent"))
+	assert route == "support"
+	# Below the confidence threshold the keyword rules decide
+	r.intent_confidence = 1.01
+	assert r.classify([message, "Quais as taxas da maquininha?"]) == ["other", "knowledge"]
+
+
+def test_handle_batch_routes_each_item(model):
+	r = RouterAgent()
+	r.intent_model = model
+	results = run(r.handle_batch([
+		("Qual o status da minha transferência?", "u-b1"),
+		("Quais as taxas da maquininha?", "u-b2"),
+	]))
+	assert [route for route, _ in results] == ["support", "knowledge"]
+
+
+def test_handle_batch_isolates_failures_and_orders_each_user():
+	r = RouterAgent()
+	r.llm = None
+	order = []
+
+	class _Support:
+		async def handle(self, message, user_id):
+			if "quebrado" in message:
+				raise RuntimeError("boom")
+			await asyncio.sleep(0.02 if message.endswith("1") else 0)
+			order.append((user_id, message))
+			return ("support", "ok")
+
+	r.support = _Support()
+	results = run(r.handle_batch([
+		("mostrar extrato 1", "u-o1"),
+		("mostrar extrato quebrado", "u-o2"),
+		("mostrar extrato 2", "u-o1"),
+	]))
+	assert results[0] == results[2] == ("support", "ok")
+	assert results[1][0] == "router:error"
+	assert [m for u, m in order if u == "u-o1"] == ["mostrar extrato 1", "mostrar extrato 2"]
+	# The second message was handled after the first one was recorded
+	assert len(r.memory.recent("u-o1")) == 2
+
+
+def test_chat_batch_endpoint(monkeypatch):
+	import app.main as main
+
+	client = TestClient(main.app)
+	resp = client.post("/chat/batch", json={"items": [
+		{"message": "Quais as taxas da maquininha?", "user_id": "batch-1"},
+		{"message": "I can't sign in to my account.", "user_id": "batch-2"},
+		{"message": "how to hack the bank system", "user_id": "batch-3"},
+	]})
+	assert resp.status_code == 200
+	routes = [r["route"] for r in resp.json()["results"]]
+	assert routes[0] == "knowledge" and routes[1] == "support" and routes[2] == "guardrails:unsafe_intent"
+	monkeypatch.setattr(main, "CHAT_BATCH_MAX", 2)
+	too_many = {"items": [{"message": "oi", "user_id": f"b{i}"} for i in range(3)]}
+	assert client.post("/chat/batch", json=too_many).status_code == 413
+
+
+def test_numpy_trainer_without_scikit_learn(monkeypatch):
+	# None in sys.modules makes the import raise ImportError
+	monkeypatch.setitem(sys.modules, "sklearn.linear_model", None)
+	messages, labels = load_labelled(TRAIN_PATH)
+	fallback = train(messages, labels)
+	eval_messages, eval_labels = load_labelled(EVAL_PATH)
+	predicted = [label for label, _ in fallback.predict(eval_messages)]
+	assert np.mean([a == b for a, b in zip(predicted, eval_labels)]) >= 0.8
+
+
+def test_handle_batch_corrects_each_message_once():
+	r = RouterAgent()
+	r.llm = None
+	seen = []
+	correct = r.correct
+
+	def counting(message):
+		seen.append(message)
+		return correct(message)
+
+	r.correct = counting
+	run(r.handle_batch([("Quais as taxas da maquininha?", "u-c1"), ("mostrar extrato", "u-c2")]))
+	assert sorted(seen) == ["Quais as taxas da maquininha?", "mostrar extrato"]
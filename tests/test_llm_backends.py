@@ -0,0 +1,90 @@
+import asyncio
+from typing import List
+
+from app.llm_backends import LocalBackend, LocalModel
+
+
+class _EchoModel(LocalModel):
+	def __init__(self) -> None:
+		self.calls: List[int] = []
+
+	def generate(self, prompts, max_tokens, temperature):
+		self.calls.append(len(prompts))
+		return [f"resposta {i}" for i in range(len(prompts))]
+
+
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def _prompt_count() -> float:
+	from app.metrics import metrics
+	return metrics.snapshot()["observations"].get("llm.prompt_tokens", {}).get("count", 0.0)
+
+
+def test_concurrent_prompts_share_one_forward_pass():
+	model = _EchoModel()
+	backend = LocalBackend(model, max_batch=8, max_wait_ms=50)
+
+	async def scenario():
+		return await asyncio.gather(*(
+			backend.complete("sys", f"pergunta {i}", max_tokens=16, temperature=0.0) for i in range(5)
+		))
+
+	answers = run(scenario())
+	assert len(answers) == 5
+	assert model.calls == [5]
+	assert backend.batcher.prompts == 5
+
+
+def test_batches_are_capped_at_max_size():
+	model = _EchoModel()
+	backend = LocalBackend(model, max_batch=2, max_wait_ms=50)
+
+	async def scenario():
+		await asyncio.gather(*(
+			backend.complete("sys", str(i), max_tokens=16, temperature=0.0) for i in range(5)
+		))
+
+	run(scenario())
+	assert max(model.calls) <= 2
+	assert sum(model.calls) == 5
+
+
+def test_llm_agent_uses_local_backend():
+	from app.agents.llm import LLMAgent
+	agent = LLMAgent(backend=LocalBackend(_EchoModel(), max_wait_ms=1))
+	route, answer = run(agent.handle("Quais as taxas da maquininha?", "u1"))
+	assert route == "llm"
+	assert answer.startswith("resposta")
+
+
+def test_identical_inflight_prompts_are_coalesced():
+	from app.agents.llm import LLMAgent
+	from app.llm_backends import LLMBackend
+	from app.prompts import SYSTEM_PROMPT
+
+	class _SlowBackend(LLMBackend):
+		calls = 0
+
+		async def complete(self, system_prompt, user_prompt, *, max_tokens, temperature, timeout=None):
+			assert system_prompt is SYSTEM_PROMPT
+			_SlowBackend.calls += 1
+			await asyncio.sleep(0.05)
+			return "ok"
+
+	agent = LLMAgent(backend=_SlowBackend())
+	sent_before = _prompt_count()
+
+	async def scenario():
+		return await asyncio.gather(*(agent.handle("Quais as taxas do pix?", f"u{i}") for i in range(3)))
+
+	results = run(scenario())
+	assert [r for r in results] == [("llm", "ok")] * 3
+	assert _SlowBackend.calls == 1
+	assert agent.coalescer.coalesced == 2
+	# Prompt stats are logged once per completion sent, and never without a backend
+	assert _prompt_count() == sent_before + 1
+	agent.backend = None
+	assert run(agent.handle("Quais as taxas do pix?", "u1"))[0] == "llm:fallback"
+	assert _prompt_count() == sent_before + 1
@@ -0,0 +1,93 @@
+import asyncio
+
+from app.memory import ConversationStore, SQLiteConversationBackend
+from app.router import RouterAgent
+
+
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_ring_buffer_keeps_recent_turns():
+	store = ConversationStore(max_turns=2)
+	for i in range(3):
+		store.append("u", f"m{i}", "knowledge", f"a{i}")
+	assert [t.message for t in store.recent("u")] == ["m1", "m2"]
+	assert store.last("u").answer == "a2"
+	assert store.chars == sum(t.chars for t in store.recent("u"))
+
+
+def test_global_cap_evicts_least_recently_used():
+	store = ConversationStore(max_conversations=2)
+	store.append("a", "hi", "router", "x")
+	store.append("b", "hi", "router", "x")
+	store.last("a")  # touch a; b is now least recently used
+	store.append("c", "hi", "router", "x")
+	assert store.last("b") is None
+	assert store.last("a") is not None and store.last("c") is not None
+
+
+def test_char_cap_and_answer_truncation():
+	store = ConversationStore(max_chars=100, max_answer_chars=40)
+	turn = store.append("a", "q", "knowledge", "y" * 500)
+	assert len(turn.answer) == 40
+	store.append("b", "q", "knowledge", "y" * 500)
+	store.append("c", "q", "knowledge", "y" * 500)
+	assert store.chars <= 100
+	assert len(store) == 2
+
+
+def test_sqlite_backend_reloads_evicted_conversations(tmp_path):
+	backend = SQLiteConversationBackend(str(tmp_path / "memory.db"))
+	store = ConversationStore(max_turns=3, max_conversations=1, backend=backend)
+	store.append("a", "taxas?", "knowledge", "0,35%", (1, 2))
+	store.append("b", "oi", "router", "?")  # evicts a from memory
+	assert list(store._convs) == ["b"]
+	turn = store.last("a")
+	assert (turn.message, turn.doc_ids) == ("taxas?", (1, 2))
+	# A fresh process sees the same history
+	reopened = ConversationStore(backend=SQLiteConversationBackend(str(tmp_path / "memory.db")))
+	assert [t.message for t in reopened.recent("b")] == ["oi"]
+
+
+def test_followup_reuses_previous_knowledge_documents():
+	r = RouterAgent()
+	route, first = run(r.handle("Quais as taxas da maquininha?", "fu1"))
+	assert route == "knowledge"
+	searched = []
+	original = r.knowledge.rag.search_ids
+	r.knowledge.rag.search_ids = lambda q, k=5: searched.append(q) or original(q, k)
+	route, answer = run(r.handle("e no crédito 12x?", "fu1"))
+	assert route == "knowledge"
+	assert "12x" in answer
+	assert searched == []  # answered from the previous turn's documents
+	assert r.memory.last("fu1").doc_ids == r.memory.recent("fu1")[0].doc_ids
+
+
+def test_standalone_messages_are_not_followups():
+	r = RouterAgent()
+	run(r.handle("Quais as taxas da maquininha?", "fu2"))
+	route, _ = run(r.handle("I want to talk to a human agent", "fu2"))
+	assert route.startswith("handoff")
+	# Without a recent knowledge turn nothing is resolved as a follow-up
+	assert not r._is_followup("e no crédito 12x?", None)
+
+
+def test_memory_keeps_no_pii():
+	r = RouterAgent()
+	r.llm = None
+	run(r.handle("Quais as taxas da maquininha? meu email é ana@example.com, tel 11 99876-5432", "fu3"))
+	turn = r.memory.last("fu3")
+	assert "ana@example.com" not in turn.message and "99876" not in turn.message
+	assert "[redacted]" in turn.message
+
+
+def test_acknowledgements_are_not_followups():
+	r = RouterAgent()
+	r.llm = None
+	run(r.handle("Quais as taxas da maquininha?", "fu4"))
+	previous = r.memory.last("fu4")
+	for reply in ("obrigado", "ok valeu", "Valeu!", "thanks"):
+		assert not r._is_followup(reply, previous), reply
+	assert r._is_followup("12x?", previous)
+	assert r._is_followup("e no débito?", previous)
@@ -0,0 +1,82 @@
+import asyncio
+
+from app.router import RouterAgent
+
+
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def _delayed(route: str, answer: str, delay: float):
+	async def handle(message: str, user_id: str):
+		await asyncio.sleep(delay)
+		return (route, answer)
+	return handle
+
+
+def _fanout_router(**agents) -> RouterAgent:
+	r = RouterAgent()
+	r.mode = "fanout"
+	r.fanout_timeout_ms = 500
+	r.knowledge.handle = agents["knowledge"]
+	r._web_answer = agents["websearch"]
+	return r
+
+
+def test_fanout_fast_confident_answer_cancels_slow_candidates():
+	slow = {"finished": False, "cancelled": False}
+
+	async def slow_websearch(message: str, user_id: str):
+		try:
+			await asyncio.sleep(5)
+		except asyncio.CancelledError:
+			slow["cancelled"] = True
+			raise
+		slow["finished"] = True
+		return ("websearch", "Resultados relacionados: empresa")
+
+	r = _fanout_router(knowledge=_delayed("knowledge", "Abertura de empresa gratuita", 0.0), websearch=slow_websearch)
+	(route, answer), report = run(r._race("abertura de empresa gratuita", "u1"))
+	assert route == "knowledge"
+	assert report.winner == "knowledge"
+	assert report.cancelled == ["websearch"]
+	# The slow candidate was cancelled, not awaited to completion
+	assert slow == {"finished": False, "cancelled": True}
+
+
+def test_fanout_deadline_drops_slow_agent_and_reports_savings():
+	r = _fanout_router(
+		knowledge=_delayed("knowledge", "Abertura de empresa gratuita", 2.0),
+		websearch=_delayed("websearch", "Resultados relacionados: abertura de empresa gratuita", 0.05),
+	)
+	(route, _), report = run(r._race("abertura de empresa gratuita", "u1"))
+	assert route == "websearch"
+	# Sequential fallback would have waited for knowledge (timed out) before web search
+	assert report.saved_ms > 0
+
+
+def test_fanout_without_confident_answer_asks_for_clarification():
+	r = _fanout_router(
+		knowledge=_delayed("knowledge", "", 0.0),
+		websearch=_delayed("websearch", "", 0.0),
+	)
+	route, _ = run(r.handle("???", "u1"))
+	assert route == "router"
+
+
+def test_fanout_respects_route_limits():
+	from app.admission import AdmissionController
+
+	calls = []
+
+	async def websearch(message, user_id):
+		calls.append(user_id)
+		return ("websearch", "Resultados relacionados: abertura de empresa gratuita")
+
+	r = _fanout_router(knowledge=_delayed("knowledge", "", 0.0), websearch=websearch)
+	r.admission = AdmissionController(route_limits={"websearch": (0.001, 1), "knowledge": (0.001, 1)})
+	assert run(r.handle("abertura de empresa gratuita", "u-limited"))[0] == "websearch"
+	# Both candidates are over their limit now: nothing runs
+	route, _ = run(r.handle("abertura de empresa gratuita", "u-limited"))
+	assert route == "admission:rate_limited"
+	assert calls == ["u-limited"]
@@ -0,0 +1,42 @@
+import sys
+
+from fastapi.testclient import TestClient
+
+from app import health
+from app.main import app, warm_up
+from app.serve import bind_socket
+
+client = TestClient(app)
+
+
+def test_healthz_always_ok():
+	resp = client.get("/healthz")
+	assert resp.status_code == 200
+	assert resp.json()["ok"] is True
+
+
+def test_readyz_tracks_warm_up_state():
+	warm_up()
+	assert client.get("/readyz").status_code == 200
+	health.mark_not_ready()
+	try:
+		resp = client.get("/readyz")
+		assert resp.status_code == 503
+		assert resp.json()["ready"] is False
+	finally:
+		health.mark_ready()
+
+
+def test_process_memory_reports_rss():
+	mem = health.process_memory()
+	if sys.platform.startswith("linux"):
+		assert mem["rss_kb"] > 0
+
+
+def test_bound_socket_is_inherited_by_workers():
+	sock = bind_socket("127.0.0.1", 0)
+	try:
+		assert sock.get_inheritable()
+		assert sock.getsockname()[1] > 0
+	finally:
+		sock.close()
@@ -0,0 +1,73 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from app.agents.knowledge import BM25RAG, load_knowledge_docs
+from app.analysis import analyze_query
+from app.bm25 import source_fingerprint, top_k
+from app.sharding import ShardedRAG, build_shards, shard_paths, shard_ranges
+
+QUERIES = ["taxas da maquininha", "pix parcelado 12x", "celular tap to pay", "conta digital rendimento", "zzz"]
+
+
+@pytest.fixture(scope="module")
+def docs():
+	return load_knowledge_docs()
+
+
+def test_top_k_matches_a_stable_sort():
+	scores = np.array([1.0, 3.0, 3.0, 0.0, 2.0, 3.0, 0.0])
+	for k in range(len(scores) + 2):
+		expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+		assert top_k(scores, k).tolist() == expected
+	assert shard_ranges(10, 3) == [(0, 3), (3, 6), (6, 10)]
+
+
+@pytest.mark.parametrize("n_shards", [2, 5])
+def test_sharded_scores_equal_one_index(docs, n_shards):
+	single = BM25RAG(docs)
+	sharded = ShardedRAG.from_documents(docs, n_shards, mode="thread")
+	try:
+		for query in QUERIES:
+			expected = single.bm25.get_scores(list(analyze_query(query)))
+			ids, scores = sharded.search_scored(query, k=8)
+			assert ids.tolist() == single.search_ids(query, k=8)
+			assert np.allclose(scores, expected[ids], rtol=1e-12, atol=0)
+		assert sharded.search_chunks("taxas da maquininha", k=2) == single.search_chunks("taxas da maquininha", k=2)
+	finally:
+		sharded.close()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_shard_processes_over_snapshots(docs, tmp_path, monkeypatch):
+	import app.bm25 as bm25
+
+	base = str(tmp_path / "bm25.snap")
+	paths = build_shards(3, out=base)
+	assert paths == shard_paths(base, 3)
+	sharded = ShardedRAG.from_snapshots(base, 3, mode="process")
+	assert sharded is not None and len(sharded.documents) == len(docs)
+	single = BM25RAG(docs)
+	try:
+		for query in QUERIES:
+			assert sharded.search_ids(query, k=5) == single.search_ids(query, k=5)
+		top = sharded.search_ids("pix parcelado", k=1)[0]
+		assert sharded.documents[top] == docs[top]
+	finally:
+		sharded.close()
+	# Knowledge files changed after the build: the shard snapshots are stale
+	monkeypatch.setattr("app.sharding.source_fingerprint", lambda paths: source_fingerprint(paths) + "x")
+	assert ShardedRAG.from_snapshots(base, 3) is None
+	assert bm25.load_corpus(paths[0]) is not None
+
+
+def test_start_all_and_close_all_manage_shards(docs):
+	from app.sharding import close_all, start_all
+
+	sharded = ShardedRAG.from_documents(docs, 2, mode="thread")
+	assert sharded._pools == []
+	start_all()
+	assert len(sharded._pools) == 2
+	close_all()
+	assert sharded._pools == []
@@ -0,0 +1,114 @@
+import asyncio
+import random
+
+from app.metrics import metrics
+from app.router import RouterAgent
+from app.slo import RouteStats, SLORouter
+
+
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_route_stats_p95_follows_the_recent_window():
+	rng = random.Random(0)
+	stats = RouteStats(alpha=0.05, window=200)
+	for _ in range(2000):
+		stats.observe(rng.uniform(0, 1000))
+	assert 850 < stats.p95_ms < 1000
+	assert 300 < stats.mean_ms < 700
+	for _ in range(200):
+		stats.observe(10)
+	assert stats.p95_ms == 10
+	assert stats.error_rate == 0.0
+
+
+def test_shed_fraction_rises_keeps_probing_and_recovers():
+	slo = SLORouter({"llm": 100}, probe=0.1, step=0.2, rng=random.Random(1))
+	for _ in range(50):
+		slo.observe("llm", 400)
+	assert slo.shed["llm"] == 0.9
+	admitted = sum(slo.admit("llm") for _ in range(1000))
+	assert 50 < admitted < 200
+	assert metrics.snapshot()["gauges"]["slo.shed_fraction.llm"] == 0.9
+	for _ in range(400):
+		slo.observe("llm", 20)
+	assert slo.shed["llm"] == 0.0
+	assert all(slo.admit("llm") for _ in range(100))
+
+
+def test_errors_break_the_slo_and_unbudgeted_routes_are_only_tracked():
+	slo = SLORouter({"llm": 1000}, max_error_rate=0.2)
+	for _ in range(20):
+		slo.observe("llm", 10, error=True)
+		slo.observe("knowledge", 5000)
+	assert slo.shed["llm"] > 0
+	assert "knowledge" not in slo.shed
+	assert slo.report()["knowledge"]["samples"] == 20
+
+
+def test_router_shifts_llm_traffic_to_knowledge():
+	r = RouterAgent()
+	r.slo = SLORouter({"llm": 10}, probe=0.0, step=0.5, min_samples=2, rng=random.Random(0))
+
+	class _SlowLLM:
+		calls = 0
+
+		async def handle(self, message, user_id):
+			self.calls += 1
+			await asyncio.sleep(0.05)
+			return ("llm", "resposta lenta")
+
+	r.llm = _SlowLLM()
+	routes = [run(r.handle("Quais as taxas da maquininha?", f"u{i}"))[0] for i in range(6)]
+	assert routes[:2] == ["llm", "llm"]
+	assert routes[-1] == "knowledge"
+	assert r.llm.calls < 6
+	assert metrics.get("slo.shifted.llm") >= 1
+	assert metrics.snapshot()["gauges"]["slo.p95_ms.llm"] > 10
+
+
+def test_llm_backend_errors_count_against_the_slo():
+	from app.agents.llm import LLMAgent
+	from app.llm_backends import LLMBackend
+
+	class _BrokenBackend(LLMBackend):
+		name = "broken"
+
+		async def complete(self, system_prompt, user_prompt, *, max_tokens, temperature, timeout=None) -> str:
+			raise RuntimeError("backend down")
+
+	r = RouterAgent()
+	r.llm = LLMAgent(backend=_BrokenBackend(), knowledge=r.knowledge)
+	r.slo = SLORouter({"llm": 10_000}, probe=0.0, step=0.5, min_samples=2, rng=random.Random(0))
+	routes = [run(r.handle("Quais as taxas da maquininha?", f"e{i}"))[0] for i in range(6)]
+	assert routes[0] == "llm:fallback"
+	assert r.slo.report()["llm"]["error_rate"] > 0.2
+	assert routes[-1] == "knowledge"
+
+
+def test_fanout_sheds_the_llm_and_feeds_the_slo_stats():
+	r = RouterAgent()
+	r.mode = "fanout"
+	r.slo = SLORouter({"llm": 10}, probe=0.0, rng=random.Random(0))
+
+	class _LLM:
+		calls = 0
+
+		async def handle(self, message, user_id):
+			self.calls += 1
+			return ("llm:fallback", "")
+
+	async def web(message, user_id):
+		return ("websearch", "")
+
+	r.llm = _LLM()
+	r._web_answer = web
+	run(r.handle("assunto qualquer sem intenção", "f1"))
+	assert r.llm.calls == 1
+	report = r.slo.report()
+	assert report["llm"]["error_rate"] > 0 and "websearch" in report and "knowledge" in report
+	# Fully shed: fan-out no longer races the LLM
+	r.slo.shed["llm"] = 1.0
+	run(r.handle("assunto qualquer sem intenção", "f2"))
+	assert r.llm.calls == 1
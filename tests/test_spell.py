@@ -0,0 +1,65 @@
+from app.router import RouterAgent
+from app.spell import QueryCorrector, SymSpell, build_speller, edit_distance
+
+
+def run(coro):
+	import asyncio
+
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_edit_distance_counts_swaps_once_and_stops_at_the_limit():
+	assert edit_distance("maquininha", "maquininha", 2) == 0
+	assert edit_distance("tranferencia", "transferencia", 2) == 1
+	assert edit_distance("ectrato", "extrato", 2) == 1
+	assert edit_distance("etxrato", "extrato", 2) == 1
+	assert edit_distance("abc", "xyz", 1) == 2
+
+
+def test_symspell_lookup_prefers_closest_then_most_frequent():
+	speller = SymSpell(max_distance=2)
+	speller.add("maquininha", 50)
+	speller.add("pix", 10)
+	speller.add("fix", 1)
+	assert speller.lookup("maquinina") == ("maquininha", 1)
+	assert speller.lookup("pixx") == ("pix", 1)
+	assert speller.lookup("maquininha") == ("maquininha", 0)
+	assert speller.lookup("zzzzzz") is None
+	assert speller.lookup("pixx", min_count=100) is None
+
+
+def test_corrector_keeps_short_known_and_unrelated_words():
+	corrector = QueryCorrector(build_speller(["pix", "transferencia", "maquininha"], ["receber com pix na maquininha", "dolo"]))
+	assert corrector.correct("tranferência do pixx") == "transferencia do pix"
+	assert corrector.correct("maquinina") == "maquininha"
+	# "bolo" is one edit from the corpus word "dolo" but is only corrected to keywords
+	assert corrector.correct("receita de bolo 2023") == "receita de bolo 2023"
+	assert corrector.correct("what is this") == "what is this"
+
+
+def test_router_routes_misspelled_messages():
+	router = RouterAgent()
+	router.llm = None  # answer from the knowledge agent even if USE_LLM was reloaded on
+	route, answer = run(router.handle("quais as taxas da maquinina?", "spell-1"))
+	assert route == "knowledge"
+	assert "%" in answer
+	route, _ = run(router.handle("minha tranferencia nao caiu", "spell-2"))
+	assert route == "support"
+	route, _ = run(router.handle("quero falar com um atendete", "spell-3"))
+	assert route.startswith("handoff")
+
+
+def test_agents_and_memory_get_the_users_own_words():
+	router = RouterAgent()
+	seen = []
+
+	async def handoff(message, user_id):
+		seen.append(message)
+		return ("handoff", "ok")
+
+	router.handoff.handle = handoff
+	route, _ = run(router.handle("quero falar com um atendete, sou o Fernando", "spell-4"))
+	assert route == "handoff"
+	assert seen == ["quero falar com um atendete, sou o Fernando"]
+	assert router.memory.last("spell-4").message == seen[0]
+	assert router.correct("Quero falar com o Fernando") == "Quero falar com o Fernando"
@@ -0,0 +1,70 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous defaults so slow CI boxes pass; tighten locally via the env vars
+IMPORT_BUDGET_MS = float(os.environ.get("STARTUP_IMPORT_BUDGET_MS", "1500"))
+APP_SELF_BUDGET_MS = float(os.environ.get("STARTUP_APP_SELF_BUDGET_MS", "150"))
+READY_BUDGET_MS = float(os.environ.get("STARTUP_READY_BUDGET_MS", "5000"))
+
+HEAVY = ("numpy", "rank_bm25", "httpx", "requests", "openai", "bs4", "lxml", "selectolax", "tiktoken", "transformers")
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+	return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def test_import_defers_heavy_dependencies():
+	code = "import json, sys, app.main; print(json.dumps(sorted(m for m in %r if m in sys.modules)))" % (HEAVY,)
+	loaded = json.loads(_python("-c", code).stdout)
+	assert loaded == []
+
+
+def test_import_time_within_budget():
+	err = _python("-X", "importtime", "-c", "import app.main").stderr
+	cumulative_us = {}
+	app_self_us = 0
+	for m in _IMPORTTIME_RE.finditer(err):
+		self_us, cum_us, name = int(m.group(1)), int(m.group(2)), m.group(4)
+		cumulative_us[name] = cum_us
+		if name == "app" or name.startswith("app."):
+			app_self_us += self_us
+	assert cumulative_us["app.main"] / 1000.0 < IMPORT_BUDGET_MS
+	# Our own module bodies, excluding fastapi/pydantic: catches work creeping back into import time
+	assert app_self_us / 1000.0 < APP_SELF_BUDGET_MS
+
+
+def test_cold_start_to_ready_within_budget():
+	timings = json.loads(_python("-m", "bench.startup", "--rounds", "1", "--json").stdout)
+	assert timings["startup_ms"] <= timings["ready_ms"] <= timings["first_chat_ms"]
+	assert timings["ready_ms"] < READY_BUDGET_MS
+
+
+def test_background_warm_up_failure_is_logged(caplog):
+	import asyncio
+
+	import app.main as main
+
+	def broken() -> None:
+		raise RuntimeError("index missing")
+
+	async def scenario():
+		task = asyncio.create_task(asyncio.to_thread(broken))
+		task.add_done_callback(main._warm_up_done)
+		await asyncio.wait([task])
+		await asyncio.sleep(0)
+
+	loop = asyncio.new_event_loop()
+	try:
+		with caplog.at_level("ERROR", logger="app.main"):
+			loop.run_until_complete(scenario())
+	finally:
+		loop.close()
+	assert "warm-up failed" in caplog.text
+	assert "index missing" in caplog.text
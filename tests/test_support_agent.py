@@ -1,7 +1,8 @@
 import asyncio
+import time
 import pytest
 
-from app.agents.support import CustomerSupportAgent
+from app.agents.support import _FAKE_DB, UNAVAILABLE_TEXT, CustomerSupportAgent, SupportBackend, Tool, ToolSet, _ensure_user
 
 
 @pytest.mark.asyncio
@@ -29,4 +30,66 @@ async def test_recent_transactions_intent():
 	assert "Últimas transações" in answer
 
 
+class _RecordingBackend(SupportBackend):
+	"""Logs when each call starts and ends, to check overlap without wall-clock asserts."""
 
+	def __init__(self, latency_ms: float = 0.0) -> None:
+		super().__init__(latency_ms)
+		self.events = []
+
+	async def _fetch(self, call, user_id):
+		self.events.append(("start", call))
+		try:
+			return await super()._fetch(call, user_id)
+		finally:
+			self.events.append(("end", call))
+
+
+@pytest.mark.asyncio
+async def test_independent_tools_run_concurrently_once_each():
+	backend = _RecordingBackend(latency_ms=20)
+	agent = CustomerSupportAgent(backend=backend)
+	route, answer = await agent.handle("status da transferência", user_id="u-tools-1")
+	assert route == "support" and "Transfer" in answer
+	assert dict(backend.calls) == {"account": 1, "limits": 1, "transfers": 1}
+	# All three calls are in flight before any of them returns
+	assert [kind for kind, _ in backend.events] == ["start"] * 3 + ["end"] * 3
+
+
+@pytest.mark.asyncio
+async def test_dependent_tool_reuses_the_memoized_account_lookup():
+	_ensure_user("u-tools-2")["failed_signins"] = 2
+	backend = SupportBackend()
+	route, answer = await CustomerSupportAgent(backend=backend).handle("login failed", user_id="u-tools-2")
+	assert "failed sign-ins: 2" in answer and "Password reset link" in answer
+	assert dict(backend.calls) == {"account": 1, "reset_password": 1}
+	_FAKE_DB["u-tools-2"]["failed_signins"] = 0
+	backend = SupportBackend()
+	route, answer = await CustomerSupportAgent(backend=backend).handle("login failed", user_id="u-tools-2")
+	assert "reset" not in answer and "reset_password" not in backend.calls
+
+
+@pytest.mark.asyncio
+async def test_tool_timeouts_degrade_the_answer():
+	class SlowTransfers(SupportBackend):
+		async def transfers(self, user_id):
+			await asyncio.sleep(1.0)
+			return []
+
+	class SlowAccount(SupportBackend):
+		async def account(self, user_id):
+			await asyncio.sleep(1.0)
+			return {}
+
+	_ensure_user("u-tools-3")["status"] = "blocked"
+	started = time.perf_counter()
+	_, answer = await CustomerSupportAgent(backend=SlowTransfers(), tool_timeout_ms=50).handle("transfer", "u-tools-3")
+	assert answer == UNAVAILABLE_TEXT
+	_, answer = await CustomerSupportAgent(backend=SlowAccount(), tool_timeout_ms=50).handle("transfer", "u-tools-3")
+	assert answer.startswith("Transferência") and "bloqueada" not in answer
+	assert time.perf_counter() - started < 0.5
+
+
+def test_toolset_requires_dependencies_first():
+	with pytest.raises(ValueError):
+		ToolSet([Tool("reset", lambda backend, user_id, account: None, deps=("account",))])
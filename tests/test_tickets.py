@@ -0,0 +1,82 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.agents.handoff as handoff
+from app.tickets import TicketStore, idempotency_scope
+
+
+def test_store_indexes_by_ticket_and_user(tmp_path):
+	store = TicketStore(str(tmp_path / "tickets.jsonl"))
+	a = store.create("u1", "primeiro", "handoff")
+	store.create("u2", "outro usuário", "handoff")
+	b = store.create("u1", "segundo", "handoff")
+	assert store.get(a["ticket_id"]) == a
+	assert store.get("T-MISSING") is None
+	tickets, cursor = store.list_for_user("u1", limit=10)
+	assert [t["ticket_id"] for t in tickets] == [b["ticket_id"], a["ticket_id"]]
+	assert cursor is None
+	# The log keeps its one-JSON-record-per-line format
+	with open(tmp_path / "tickets.jsonl", encoding="utf-8") as f:
+		assert [json.loads(line)["message"] for line in f] == ["primeiro", "outro usuário", "segundo"]
+
+
+def test_pagination_walks_every_ticket_once(tmp_path):
+	store = TicketStore(str(tmp_path / "tickets.jsonl"))
+	created = [store.create("u", f"m{i}", "handoff")["ticket_id"] for i in range(7)]
+	seen, cursor = [], None
+	while True:
+		page, cursor = store.list_for_user("u", limit=3, cursor=cursor)
+		seen += [t["ticket_id"] for t in page]
+		if cursor is None:
+			break
+	assert sorted(seen) == sorted(created) and len(seen) == 7
+	with pytest.raises(ValueError):
+		store.list_for_user("u", cursor="not-a-cursor")
+
+
+def test_idempotent_creation(tmp_path):
+	store = TicketStore(str(tmp_path / "tickets.jsonl"))
+	first = store.create("u", "ajuda", "handoff", idempotency_key="k1")
+	assert store.create("u", "ajuda", "handoff", idempotency_key="k1") == first
+	# Keys are scoped per user
+	assert store.create("other", "ajuda", "handoff", idempotency_key="k1")["ticket_id"] != first["ticket_id"]
+	assert len(store.list_for_user("u")[0]) == 1
+
+
+def test_existing_log_is_indexed_on_open(tmp_path):
+	log = tmp_path / "tickets.jsonl"
+	legacy = {"ticket_id": "T-LEGACY01", "user_id": "old", "message": "m", "route_hint": "handoff", "created_at": "2024-01-01T00:00:00Z"}
+	log.write_text(json.dumps(legacy) + "\n" + '{"torn": ', encoding="utf-8")
+	store = TicketStore(str(log))
+	assert store.get("T-LEGACY01") == legacy
+	store.close()
+	# Reopening does not index twice
+	reopened = TicketStore(str(log))
+	assert len(reopened.list_for_user("old")[0]) == 1
+
+
+def test_tickets_endpoint_and_idempotency_header(tmp_path, monkeypatch):
+	from app.main import app
+
+	monkeypatch.setattr(handoff, "TICKETS_FILEPATH", str(tmp_path / "tickets.jsonl"))
+	client = TestClient(app)
+	headers = {"Idempotency-Key": "retry-1"}
+	r1 = client.post("/test/force_redirect/api-user", headers=headers).json()
+	r2 = client.post("/test/force_redirect/api-user", headers=headers).json()
+	assert r1["message"] == r2["message"]
+	client.post("/test/force_redirect/api-user")
+	page = client.get("/support/tickets/api-user", params={"limit": 1}).json()
+	assert len(page["tickets"]) == 1 and page["next_cursor"]
+	rest = client.get("/support/tickets/api-user", params={"limit": 5, "cursor": page["next_cursor"]}).json()
+	assert len(rest["tickets"]) == 1 and rest["next_cursor"] is None
+	assert client.get("/support/tickets/api-user", params={"cursor": "bogus"}).status_code == 400
+
+
+def test_idempotency_scope_reaches_create_support_ticket(tmp_path, monkeypatch):
+	monkeypatch.setattr(handoff, "TICKETS_FILEPATH", str(tmp_path / "tickets.jsonl"))
+	with idempotency_scope("same"):
+		a = handoff.create_support_ticket("u", "m", "handoff")
+		b = handoff.create_support_ticket("u", "m", "handoff")
+	assert a["ticket_id"] == b["ticket_id"]
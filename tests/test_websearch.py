@@ -1,6 +1,9 @@
+import asyncio
+
 import pytest
 import httpx
-from app.tools.websearch import _extract_results_from_html, _normalize_url
+from app.metrics import metrics
+from app.tools.websearch import HedgedSearch, StubProvider, _extract_results_from_html, _normalize_url
 
 
 def test_normalize_url_unwraps_duckduckgo_redirect():
@@ -20,4 +23,44 @@ def test_extract_results_from_html_basic():
 	assert all(u.startswith("http") for _, u in items)
 
 
+def run(coro):
+	return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_hedged_search_secondary_wins_when_primary_is_slow():
+	slow = StubProvider("slow", [("A", "https://a.example")], latency_ms=2000)
+	fast = StubProvider("fast", [("B", "https://b.example")], latency_ms=10)
+	hedged = HedgedSearch([slow, fast], hedge_ms=50)
+	cancelled = metrics.get("websearch.cancelled.slow")
+	items, winner = run(hedged.search(None, "q"))
+	assert (items, winner) == ([("B", "https://b.example")], "fast")
+	assert metrics.get("websearch.cancelled.slow") == cancelled + 1
+	assert hedged.stats["fast"].samples == 1 and hedged.stats["slow"].samples == 0
+	# The primary answering within the hedge delay means the secondary is never sent
+	quick = StubProvider("quick", [("C", "https://c.example")], latency_ms=5)
+	backup = StubProvider("backup", [("D", "https://d.example")])
+	assert run(HedgedSearch([quick, backup], hedge_ms=200).search(None, "q"))[1] == "quick"
+	assert backup.calls == 0
+
 
+def test_failed_or_empty_provider_starts_the_next_at_once():
+	broken = StubProvider("broken", fail=True)
+	empty = StubProvider("empty", [])
+	last = StubProvider("last", [("E", "https://e.example")])
+	spare = StubProvider("spare", [("G", "https://g.example")])
+	hedged = HedgedSearch([broken, empty, last, spare], hedge_ms=5000)
+	items, winner = run(hedged.search(None, "q"))
+	assert winner == "last"
+	assert (broken.calls, empty.calls, last.calls, spare.calls) == (1, 1, 1, 0)
+	assert hedged.report()["broken"]["error_rate"] > 0
+	# All at once: the losers still in flight are cancelled, not awaited
+	hang = StubProvider("hang", [("H", "https://h.example")], latency_ms=60_000)
+	cancelled = metrics.get("websearch.cancelled.hang")
+	assert run(HedgedSearch([hang, last], hedge_ms=0).search(None, "q"))[1] == "last"
+	assert hang.calls == 1 and metrics.get("websearch.cancelled.hang") == cancelled + 1
+	# Sequential fallback (no time-based hedging) and all-at-once
+	slow = StubProvider("slow", [("F", "https://f.example")], latency_ms=30)
+	assert run(HedgedSearch([slow, last], hedge_ms=None).search(None, "q"))[1] == "slow"
+	assert run(HedgedSearch([broken, last], hedge_ms=None).search(None, "q"))[1] == "last"
+	nothing = run(HedgedSearch([broken, empty], hedge_ms=0).search(None, "q"))
+	assert nothing == ([], None)